@@ -0,0 +1,95 @@
+"""
+Import-time budget check for the agent helpers and entry points.
+
+Imports each module in a fresh interpreter with `python -X importtime`, prints
+the slowest imports it triggers, and exits non-zero when a module exceeds its
+budget or pulls in a module it must not load at import time (IPython,
+google.generativeai, the A2A server stack for CLI runs).
+
+Each module is measured `--repeat` times and the fastest run is used, so disk
+cache / CPU noise does not fail the check.
+
+    uv run python check_import_time.py
+    uv run python check_import_time.py --budget ocrAgent=6500 --repeat 5
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent
+
+# Budgets in ms. The helper must not import ADK at all; the OCR agent needs ADK
+# (which imports litellm, ~5 s on a cold container), so its budget is ADK + slack.
+BUDGETS_MS = {
+    "utils.run_agent_query": 300,
+    "ocrAgent": 7500,
+}
+
+FORBIDDEN = {
+    "utils.run_agent_query": ["IPython", "google.generativeai", "google.adk", "litellm"],
+    "ocrAgent": ["IPython", "google.generativeai", "a2a.server", "google.adk.a2a"],
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def measure(module: str) -> tuple[float, list[tuple[int, int, str]]]:
+    """
+    Import `module` in a fresh interpreter.
+
+    Returns the total in ms and the `(cumulative us, depth, name)` rows of the
+    imports it triggered. `-X importtime` lists children before their parent,
+    so that is the run of deeper rows right above the module's own row.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(AGENTS_DIR), str(AGENTS_DIR / "ocrAgent"), env.get("PYTHONPATH", "")])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=AGENTS_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = [(int(m[2]), len(m[3]) // 2, m[4]) for m in map(LINE.match, proc.stderr.splitlines()) if m]
+    index = max(i for i, (_, _, name) in enumerate(rows) if name == module)
+    total, depth, _ = rows[index]
+    start = index
+    while start > 0 and rows[start - 1][1] > depth:
+        start -= 1
+    return total / 1000, rows[start:index]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", action="append", default=[], help="module=ms (overrides the default budget)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="Slowest direct imports to show")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition("=")
+        budgets[module] = float(ms)
+
+    failed = False
+    for module, budget in budgets.items():
+        total, rows = min((measure(module) for _ in range(max(1, args.repeat))), key=lambda result: result[0])
+        names = {name for _, _, name in rows}
+        loaded = [bad for bad in FORBIDDEN.get(module, []) if any(n == bad or n.startswith(bad + ".") for n in names)]
+        ok = total <= budget and not loaded
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {module}: {total:.0f} ms (budget {budget:.0f} ms)")
+        if loaded:
+            print(f"   imports at startup: {', '.join(loaded)}")
+        # Direct imports of the module, slowest first
+        depth = min((d for _, d, _ in rows), default=0)
+        top = sorted(((c, name) for c, d, name in rows if d == depth), reverse=True)[: args.top]
+        for cumulative, name in top:
+            print(f"   {cumulative / 1000:>8.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,13 @@
-# --- Import all necessary libraries for our entire adventure ---
+# --- Import only what this example uses (see check_import_time.py) ---
 import os
-import re
 import asyncio
 from dotenv import load_dotenv
-from IPython.display import display, Markdown
-import google.generativeai as genai
-from google.adk.agents import Agent, SequentialAgent, LoopAgent, ParallelAgent, LlmAgent
-from google.adk.tools import google_search, ToolContext
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from google.adk.agents import LlmAgent
 from google.adk.models.lite_llm import LiteLlm
-from google.adk.sessions import InMemorySessionService, Session
-from google.genai.types import Content, Part
-from getpass import getpass
+from google.adk.sessions import InMemorySessionService
 from utils.run_agent_query import run_agent_query
 
 load_dotenv()
@@ -0,0 +1,87 @@
+"""
+Host every agent in one process.
+
+Each agent is mounted under its own prefix with its own agent card:
+
+    GET  /agents                              -> hosted agents
+    GET  /ocr/.well-known/agent-card.json     -> OCR agent card
+    POST /ocr/                                -> OCR agent JSON-RPC (message/send, message/stream)
+
+    uv run python host.py --port 8700
+
+Single process on purpose. Running the host under several uvicorn workers
+was considered and deliberately left out, because its state cannot be shared
+across worker processes:
+
+- sessions: `BoundedSessionService` caches sessions in memory, allocates row
+  ids in memory and batches its writes, so it allows one process per sqlite
+  file (`SESSION_DB`);
+- A2A tasks: the task store is in memory, so `tasks/get` and resubscribe
+  must reach the worker that ran the task;
+- MCP connections: each worker would open its own toolset and pools, which
+  multiplies the connections to the MCP servers.
+
+To scale out, run several hosts, each with its own `SESSION_DB`, and route a
+client to the same host for a whole conversation (sticky on `contextId`).
+"""
+import argparse
+import contextlib
+import os
+import sys
+from pathlib import Path
+
+if str(Path(__file__).resolve().parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent))
+if str(Path(__file__).resolve().parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import uvicorn
+
+HOST_PUBLIC_URL = os.environ.get("HOST_PUBLIC_URL", "http://localhost:8700")
+
+
+def create_app():
+    """App factory: the agents, their MCP connection and the session store."""
+    sys.path.append(str(Path(__file__).resolve().parent / "ocrAgent"))
+    import ocrAgent
+    from shared.a2a_wrapper import AgentMount, a2a_host_app
+    from shared.session_store import BoundedSessionService, create_session_service
+
+    ocr_toolset = ocrAgent.new_mcp_toolset()
+
+    async def ocr_agent():
+        tools = await ocr_toolset.get_tools()
+        print(f"📦 Loaded {len(tools)} tools from OCR MCP server")
+        return ocrAgent.build_pipeline(tools, ocrAgent.direct_ocr_enabled(default=False))
+
+    sessions = create_session_service(default="sqlite")
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        try:
+            yield
+        finally:
+            await ocr_toolset.close()
+            if isinstance(sessions, BoundedSessionService):
+                sessions.close()
+            print("🔌 MCP connection closed")
+
+    return a2a_host_app(
+        [AgentMount(ocr_agent, path="/ocr", session_service=sessions)],
+        public_url=HOST_PUBLIC_URL,
+        lifespan=lifespan,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8700)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SESSION_DB", "sessions.db")
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Compare the two-LLM ocr_md_gen_agent pipeline with the direct-tool OCR step.
+
+Runs both pipelines against a stub OpenAI-compatible endpoint (no GPU/vLLM
+needed) and a fake `ocr` tool, and reports LLM calls, tokens and latency per
+image. The stub simulates generation time per output token, including the
+reasoning tokens a model like gpt-oss spends before emitting a tool call.
+
+    uv run python ocrAgent/bench_pipeline.py --images 10 --reasoning-tokens 200 --ms-per-token 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+OCR_TEXT = "## OCR Result\n\n**Markdown Output:**\n" + "\n".join(f"| row {i} | value {i} |" for i in range(40))
+
+stub = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "reasoning_tokens": 0}
+settings = {"reasoning_tokens": 200, "ms_per_token": 2.0}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def chat_completions(request: Request):
+    """Stub model: emits an ocr tool call when tools are offered and not yet used, otherwise text."""
+    body = await request.json()
+    messages = body["messages"]
+    prompt_tokens = len(json.dumps(messages, ensure_ascii=False)) // 4
+    wants_tool = body.get("tools") and not any(m["role"] == "tool" for m in messages)
+
+    if wants_tool:
+        path = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:8]}",
+                "type": "function",
+                "function": {"name": "ocr", "arguments": json.dumps({"image_path": path.split("：")[-1]})},
+            }],
+        }
+        reasoning, output = settings["reasoning_tokens"], 30
+        finish_reason = "tool_calls"
+    else:
+        message = {"role": "assistant", "content": OCR_TEXT}
+        reasoning, output = settings["reasoning_tokens"] // 4, len(OCR_TEXT) // 4
+        finish_reason = "stop"
+
+    completion_tokens = reasoning + output
+    await asyncio.sleep(completion_tokens * settings["ms_per_token"] / 1000)
+    stub["calls"] += 1
+    stub["prompt_tokens"] += prompt_tokens
+    stub["completion_tokens"] += completion_tokens
+    stub["reasoning_tokens"] += reasoning
+    return JSONResponse({
+        "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "completion_tokens_details": {"reasoning_tokens": reasoning},
+        },
+    })
+
+
+stub_app = Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+
+
+async def fake_ocr(image_path: str) -> str:
+    """Perform OCR on an image file."""
+    await asyncio.sleep(0.05)
+    return OCR_TEXT
+
+
+async def run_pipeline(oa, agent, image_path: str) -> float:
+    from google.adk.runners import Runner
+    from google.genai.types import Content, Part
+
+    session = await oa.session_service.create_session(
+        app_name=agent.name, user_id=oa.my_user_id, state={"image_path": image_path}
+    )
+    runner = Runner(agent=agent, session_service=oa.session_service, app_name=agent.name)
+    query = f"請使用 ocr tool 對這個圖片進行 OCR 辨識，圖片路徑是：{image_path}"
+    start = time.perf_counter()
+    async for _ in runner.run_async(
+        user_id=oa.my_user_id, session_id=session.id, new_message=Content(parts=[Part(text=query)], role="user")
+    ):
+        pass
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--reasoning-tokens", type=int, default=200, help="Reasoning tokens before a tool call")
+    parser.add_argument("--ms-per-token", type=float, default=2.0, help="Simulated decode time per output token")
+    args = parser.parse_args()
+    settings.update(reasoning_tokens=args.reasoning_tokens, ms_per_token=args.ms_per_token)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(stub_app, host="127.0.0.1", port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    # ocrAgent reads the endpoint at import time
+    os.environ["VLLM_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import ocrAgent as oa
+    from google.adk.tools import FunctionTool
+
+    tools = [FunctionTool(fake_ocr)]
+    tools[0].name = "ocr"
+
+    print(f"{'pipeline':>10} {'LLM calls':>10} {'prompt tok':>11} {'output tok':>11} {'reasoning':>10} {'p50 ms':>8} {'mean ms':>8}")
+    for name, direct in (("two-LLM", False), ("direct", True)):
+        agent = oa.build_pipeline(tools, direct_ocr=direct)
+        for key in stub:
+            stub[key] = 0
+        latencies = [await run_pipeline(oa, agent, f"/tmp/image_{i}.png") for i in range(args.images)]
+        n = args.images
+        print(
+            f"{name:>10} {stub['calls'] / n:>10.1f} {stub['prompt_tokens'] / n:>11.0f} "
+            f"{stub['completion_tokens'] / n:>11.0f} {stub['reasoning_tokens'] / n:>10.0f} "
+            f"{statistics.median(latencies) * 1000:>8.0f} {statistics.mean(latencies) * 1000:>8.0f}"
+        )
+
+    server.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
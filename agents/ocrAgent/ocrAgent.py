@@ -1,19 +1,27 @@
 import os
 import sys
+import json
 import asyncio
 from pathlib import Path
+from urllib.parse import unquote, urlsplit
 
 # Add root to sys.path for shared utils as we moved to a subdirectory
 if str(Path(__file__).resolve().parent.parent.parent) not in sys.path:
     sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
 from dotenv import load_dotenv
+
+# litellm (imported by ADK) downloads its model cost map from GitHub at import time;
+# the bundled copy is enough for a local vLLM endpoint and saves a network round trip per process
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
 from google.adk.agents import LlmAgent, SequentialAgent
-from google.adk.tools.mcp_tool.mcp_toolset import McpToolset, StdioServerParameters
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
 from google.adk.models.lite_llm import LiteLlm
-from google.adk.sessions import InMemorySessionService
 from utils.run_agent_query import run_agent_query
-from shared.a2a_wrapper import serve_agent
+from utils.mcp_pool import McpToolsetPool
+from utils.direct_tool_agent import DirectToolAgent, find_tool
+from shared.session_store import BoundedSessionService, create_session_service
 
 load_dotenv()
 print("✅ All libraries are ready to go!")
@@ -23,8 +31,18 @@ VLLM_API_BASE = os.environ.get("VLLM_API_BASE", "http://localhost:8000/v1")
 VLLM_MODEL = "openai/gpt-oss-20b"
 
 OCR_MCP_PATH = os.path.join(os.path.dirname(__file__), "..", "tools", "ocr_tool_mcp")
+OCR_MCP_URL = os.environ.get("OCR_MCP_URL", "http://localhost:8888/sse")
+# 常駐的 MCP 連線數 (= 同時進行的 OCR 數)，以及閒置多久後使用前要重新檢查連線
+OCR_AGENT_POOL_SIZE = int(os.environ.get("OCR_AGENT_POOL_SIZE", "4"))
+OCR_AGENT_HEALTH_INTERVAL = float(os.environ.get("OCR_AGENT_HEALTH_INTERVAL", "30"))
+# OCR 步驟直接呼叫 ocr tool (不經過 LLM)；1 / 0 強制開關，未設定時 CLI 預設開、A2A server 預設關 (見 direct_ocr_enabled)
+OCR_DIRECT_TOOL = os.environ.get("OCR_DIRECT_TOOL")
+# OCR server 的 fair scheduler 以此區分呼叫者：有 API key 用 key 對應的 tenant，否則用 X-OCR-Tenant
+OCR_MCP_TENANT = os.environ.get("OCR_MCP_TENANT", "ocr_md_gen_agent")
+OCR_MCP_API_KEY = os.environ.get("OCR_MCP_API_KEY")
 
-session_service = InMemorySessionService()
+# SESSION_BACKEND=memory|sqlite (CLI 預設 memory，--server 預設 sqlite，見 serve_a2a)
+session_service = create_session_service()
 my_user_id = "user_12345"
 
 # Use vLLM as OpenAI-compatible endpoint
@@ -37,6 +55,7 @@ base_model = LiteLlm(
 )
 
 # Run MCP server via stdio
+# from google.adk.tools.mcp_tool.mcp_toolset import StdioServerParameters
 # async def create_mcp_toolset():
 #     """Create MCP toolset for OCR."""
 #     ocr_toolset = McpToolset(
@@ -49,24 +68,55 @@ base_model = LiteLlm(
 
 # Run MCP server via SSE
 from google.adk.tools.mcp_tool.mcp_toolset import McpToolset, SseConnectionParams
-async def create_mcp_toolset():
+def new_mcp_toolset():
     """Create MCP toolset for OCR - connect to running server."""
-    ocr_toolset = McpToolset(
+    headers = {"X-OCR-Tenant": OCR_MCP_TENANT}
+    if OCR_MCP_API_KEY:
+        headers["X-API-Key"] = OCR_MCP_API_KEY
+    return McpToolset(
         connection_params=SseConnectionParams(
-            url="http://localhost:8888/sse",
+            url=OCR_MCP_URL,
+            headers=headers,
         )
     )
-    return ocr_toolset
 
-async def create_agents():
-    """Create agents with MCP tools. Returns (agent, toolset) tuple."""
-    ocr_toolset = await create_mcp_toolset()
-    tools = await ocr_toolset.get_tools()
-    print(f"📦 Loaded {len(tools)} tools from OCR MCP server")
+async def create_mcp_toolset():
+    return new_mcp_toolset()
 
-    # Create agent with OCR tools
-    ocr_agent = LlmAgent(
-        name="ocr_agent",
+def direct_ocr_enabled(default: bool) -> bool:
+    """OCR_DIRECT_TOOL when set, else `default` (CLI: True, A2A server: False)."""
+    if OCR_DIRECT_TOOL is None:
+        return default
+    return OCR_DIRECT_TOOL == "1"
+
+def part_image_path(part):
+    """Image path carried by a structured message part: A2A data part `{"image_path": ...}` or a file:// file part."""
+    if part.file_data and (part.file_data.file_uri or "").startswith("file://"):
+        return unquote(urlsplit(part.file_data.file_uri).path)
+    # ADK 把 A2A data part 轉成 JSON 文字
+    if part.text and part.text.lstrip().startswith("{"):
+        try:
+            data = json.loads(part.text)
+        except ValueError:
+            return None
+        if isinstance(data, dict) and isinstance(data.get("image_path"), str):
+            return data["image_path"]
+    return None
+
+def ocr_args(ctx):
+    """
+    Arguments of the direct ocr call: `image_path` from session state (set by
+    `run_ocr`) or from a structured part of the user message. None when
+    neither has one; the LLM agent then reads the path from the text.
+    """
+    image_path = ctx.session.state.get("image_path")
+    if not image_path and ctx.user_content:
+        image_path = next(filter(None, map(part_image_path, ctx.user_content.parts or [])), None)
+    return {"image_path": image_path} if image_path else None
+
+def llm_ocr_agent(tools, name: str = "ocr_agent"):
+    return LlmAgent(
+        name=name,
         model=base_model,
         tools=tools,
         instruction="""你是一個 OCR 助手。當用戶提供圖片路徑時：
@@ -76,6 +126,33 @@ async def create_agents():
         output_key="ocr_result"
     )
 
+def build_pipeline(tools, direct_ocr: bool = True):
+    """
+    Build the OCR -> refine pipeline around already-loaded MCP tools.
+
+    With `direct_ocr` the OCR step calls the `ocr` tool itself instead of
+    asking the LLM to emit the call, saving a full generation per image.
+    Requests without a structured image path (see `ocr_args`) still go
+    through the LLM OCR agent.
+    """
+    if direct_ocr:
+        ocr_tool = find_tool(tools, "ocr")
+        if ocr_tool is None:
+            raise ValueError("OCR MCP server does not provide an 'ocr' tool")
+        ocr_agent = DirectToolAgent(
+            name="ocr_agent",
+            description="Calls the ocr tool with the image path.",
+            tool=ocr_tool,
+            build_args=ocr_args,
+            output_key="ocr_result",
+            fallback=llm_ocr_agent(tools, name="ocr_llm_agent"),
+        )
+        return build_sequence(ocr_agent)
+
+    # Create agent with OCR tools
+    return build_sequence(llm_ocr_agent(tools))
+
+def build_sequence(ocr_agent):
     refine_agent = LlmAgent(
         name="refine_agent",
         model=base_model,
@@ -89,12 +166,29 @@ async def create_agents():
         sub_agents=[ocr_agent, refine_agent],
         description="An agent that performs OCR and then refines the output into markdown format."
     )
-    return ocr_md_gen_agent, ocr_toolset
+    return ocr_md_gen_agent
+
+async def create_agents(direct_ocr: bool = True):
+    """Create agents with MCP tools. Returns (agent, toolset) tuple."""
+    ocr_toolset = await create_mcp_toolset()
+    tools = await ocr_toolset.get_tools()
+    print(f"📦 Loaded {len(tools)} tools from OCR MCP server")
+    return build_pipeline(tools, direct_ocr), ocr_toolset
+
+
+# 常駐的 MCP 連線 + agent pipeline，所有 run_ocr / run_ocr_many 共用
+ocr_pool = McpToolsetPool(
+    new_mcp_toolset,
+    lambda tools: build_pipeline(tools, direct_ocr_enabled(default=True)),
+    size=OCR_AGENT_POOL_SIZE,
+    health_interval=OCR_AGENT_HEALTH_INTERVAL,
+)
 
 
-async def run_ocr(image_path: str):
-    """Run OCR on an image file."""
-    print("🚀 Starting OCR Agent...")
+async def run_ocr(image_path: str, quiet: bool = False):
+    """Run OCR on an image file, using a pooled MCP connection and pipeline. Raises if the run fails."""
+    if not quiet:
+        print("🚀 Starting OCR Agent...")
 
     # 確認圖片存在
     path = Path(image_path)
@@ -103,44 +197,72 @@ async def run_ocr(image_path: str):
     
     # 轉換成絕對路徑
     absolute_path = str(path.resolve())
-    print(f"📷 Image path: {absolute_path}")
+    if not quiet:
+        print(f"📷 Image path: {absolute_path}")
 
-    # Create agent with MCP tools
-    ocr_md_gen_agent, ocr_toolset = await create_agents()
+    async with ocr_pool.acquire() as member:
+        ocr_md_gen_agent = member.agent
 
-    try:
         # Create session
         session = await session_service.create_session(
             app_name=ocr_md_gen_agent.name,
-            user_id=my_user_id
+            user_id=my_user_id,
+            state={"image_path": absolute_path},
         )
 
         # ✅ 只傳檔案路徑，非常短
         query = f"請使用 ocr tool 對這個圖片進行 OCR 辨識，圖片路徑是：{absolute_path}"
-        print(f"🗣️ Sending OCR request to agent...")
+        if not quiet:
+            print(f"🗣️ Sending OCR request to agent...")
 
-        result = await run_agent_query(ocr_md_gen_agent, query, session, my_user_id, session_service)
-        return result
+        # 錯誤要往外拋，ocr_pool 才會把這條連線標記為不健康並在下次使用前重連
+        return await run_agent_query(
+            ocr_md_gen_agent, query, session, my_user_id, session_service, is_router=quiet, raise_errors=True
+        )
 
-    finally:
-        await ocr_toolset.close()
-        print("🔌 MCP connection closed")
+
+async def run_ocr_many(image_paths: list[str], concurrency: int = OCR_AGENT_POOL_SIZE) -> list:
+    """
+    Run OCR on many images, reusing the pooled MCP connections and pipelines.
+
+    At most `concurrency` images are processed at once (also bounded by the
+    pool size). Returns results in input order; an image that failed has its
+    exception in place of the result.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(image_path: str):
+        async with semaphore:
+            return await run_ocr(image_path, quiet=True)
+
+    results = await asyncio.gather(*(one(p) for p in image_paths), return_exceptions=True)
+    print(f"✅ OCR finished: {sum(not isinstance(r, BaseException) for r in results)}/{len(results)} images, pool {ocr_pool.stats()}")
+    return results
 
 
 async def serve_a2a():
     """Start the OCR agent as an A2A server."""
     print("🌐 Starting A2A Server mode...")
-    ocr_md_gen_agent, ocr_toolset = await create_agents()
+    # A2A SDK / Starlette are only needed in server mode
+    from shared.a2a_wrapper import serve_agent
+
+    # A2A 客戶端不一定提供結構化的圖片路徑，預設走 LLM OCR agent
+    ocr_md_gen_agent, ocr_toolset = await create_agents(direct_ocr_enabled(default=False))
     
     # Path to the Agent Card
     card_path = os.path.join(os.path.dirname(__file__), "ocrAgent.json")
+
+    # Server mode: bounded, persistent sessions instead of one dict growing forever
+    server_sessions = create_session_service(default="sqlite")
     
     try:
         # Pass the card_path to the wrapper
-        server = serve_agent(ocr_md_gen_agent, port=8701, agent_card=card_path)
+        server = serve_agent(ocr_md_gen_agent, port=8701, agent_card=card_path, session_service=server_sessions)
         await server.serve()
     finally:
         await ocr_toolset.close()
+        if isinstance(server_sessions, BoundedSessionService):
+            server_sessions.close()
         print("🔌 MCP connection closed")
 
 
@@ -151,7 +273,15 @@ def main():
         return
 
     image_path = "/home/os-theo.hsiung/projects/ai-agent-tools/asset/example_slide.png"
-    result = asyncio.run(run_ocr(image_path))
+
+    async def run_once():
+        try:
+            return await run_ocr(image_path)
+        finally:
+            await ocr_pool.close()
+            print("🔌 MCP connection closed")
+
+    result = asyncio.run(run_once())
     print("\n📝 Final OCR Markdown Output:\n")
     # print(result)
 
@@ -0,0 +1,73 @@
+import time
+from typing import Any, AsyncGenerator, Callable, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from pydantic import ConfigDict
+
+
+def tool_result_text(result: Any) -> str:
+    """Flatten a tool result (MCP `CallToolResult` dump, dict or str) into text."""
+    if isinstance(result, dict) and isinstance(result.get("content"), list):
+        return "\n".join(part.get("text", "") for part in result["content"] if part.get("type") == "text")
+    if isinstance(result, dict) and "result" in result:
+        return str(result["result"])
+    return str(result)
+
+
+class DirectToolAgent(BaseAgent):
+    """
+    Pipeline step that calls one tool directly, without an LLM turn.
+
+    For steps whose tool call is fully determined by the input (e.g. "OCR
+    this path"), an `LlmAgent` spends a whole generation just to emit the
+    call. This agent builds the arguments with `build_args`, runs the tool
+    and writes its text output to `output_key` in session state, where the
+    next agent's instruction can reference it (`{ocr_result}`).
+
+    Args:
+        tool: Tool to run (e.g. an `McpTool` from `McpToolset.get_tools()`).
+        build_args: Returns the tool arguments for the current invocation, or
+            None when the input does not determine them.
+        output_key: Session state key for the tool output.
+        fallback: Agent that runs instead when `build_args` returns None
+            (e.g. an `LlmAgent` with the same tool and `output_key`).
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    tool: BaseTool
+    build_args: Callable[[InvocationContext], dict]
+    output_key: str
+    fallback: Optional[BaseAgent] = None
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        args = self.build_args(ctx)
+        if args is None:
+            if self.fallback is None:
+                raise ValueError(f"{self.name}: no arguments for the {self.tool.name} tool in this request")
+            async for event in self.fallback.run_async(ctx):
+                yield event
+            return
+
+        actions = EventActions()
+        start = time.perf_counter()
+        result = await self.tool.run_async(
+            args=args,
+            tool_context=ToolContext(ctx, event_actions=actions),
+        )
+        actions.state_delta[self.output_key] = tool_result_text(result)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=actions,
+            custom_metadata={"tool": self.tool.name, "tool_ms": round((time.perf_counter() - start) * 1000, 3)},
+        )
+
+
+def find_tool(tools: list[BaseTool], name: str) -> Optional[BaseTool]:
+    return next((tool for tool in tools if tool.name == name), None)
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from google.adk.agents import BaseAgent
+from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
+
+logger = logging.getLogger(__name__)
+
+
+class McpConnection:
+    """
+    One `McpToolset`, driven by a task of its own from connect to close.
+
+    The MCP client enters anyio cancel scopes when it connects, and they must
+    be exited by the task that entered them ("Attempted to exit cancel scope
+    in a different task" otherwise). So the handshake, the health checks and
+    the close all run in this task; other tasks send it requests.
+
+    Args:
+        toolset: A new (not yet connected) `McpToolset`.
+        timeout: Timeout of each request (`get_tools`, i.e. handshake or health check).
+    """
+
+    def __init__(self, toolset: McpToolset, timeout: float = 10.0):
+        self.toolset = toolset
+        self.timeout = timeout
+        self._requests: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._serve())
+
+    async def _serve(self):
+        future = None
+        try:
+            while True:
+                call, future = await self._requests.get()
+                if call is None:
+                    return
+                if future.done():  # the caller gave up
+                    continue
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        result = await call()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            try:
+                await self.toolset.close()
+            except Exception as e:
+                logger.debug("Error closing MCP toolset: %s", e)
+            # Requests still waiting (or interrupted, if this task was cancelled) will not be served
+            pending = [future] + [self._requests.get_nowait()[1] for _ in range(self._requests.qsize())]
+            for waiter in pending:
+                if waiter is not None and not waiter.done():
+                    waiter.set_exception(ConnectionError("MCP connection closed"))
+
+    async def get_tools(self) -> list:
+        """Connect if needed and list the tools, in the connection's task."""
+        future = asyncio.get_running_loop().create_future()
+        self._requests.put_nowait((self.toolset.get_tools, future))
+        return await future
+
+    async def close(self):
+        """Close the toolset once the requests already sent are served."""
+        self._requests.put_nowait((None, None))
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+@dataclass
+class PoolMember:
+    connection: McpConnection
+    tools: list
+    agent: BaseAgent
+    last_checked: float = field(default_factory=time.monotonic)
+    healthy: bool = True
+    uses: int = 0
+
+    @property
+    def toolset(self) -> McpToolset:
+        return self.connection.toolset
+
+
+class McpToolsetPool:
+    """
+    Long-lived pool of MCP connections, each with its agent pipeline built once.
+
+    Creating an `McpToolset` per run means an SSE handshake, `list_tools` and
+    rebuilding every agent, which costs more than a short tool call. Members
+    are created once and handed out one run at a time. A member idle for more
+    than `health_interval` seconds is checked with a `list_tools` round trip
+    before use; a failed check, or a run that raised, replaces its connection
+    (so runs must let errors propagate, e.g. `run_agent_query(..., raise_errors=True)`).
+    Each connection is opened and closed by its own task (see `McpConnection`).
+
+    Args:
+        toolset_factory: Returns a new (not yet connected) `McpToolset`.
+        agent_factory: Builds the agent pipeline from the toolset's tools.
+        size: Number of MCP connections (= concurrent runs).
+        health_interval: Seconds a member may sit idle before it is re-checked.
+        health_timeout: Timeout of the health check / reconnect handshake.
+    """
+
+    def __init__(
+        self,
+        toolset_factory: Callable[[], McpToolset],
+        agent_factory: Callable[[list], BaseAgent],
+        size: int = 4,
+        health_interval: float = 30.0,
+        health_timeout: float = 10.0,
+    ):
+        self.toolset_factory = toolset_factory
+        self.agent_factory = agent_factory
+        self.size = max(1, size)
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._members: list[PoolMember] = []
+        self._idle: asyncio.Queue[PoolMember] = asyncio.Queue()
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+        self.health_checks = 0
+        self.reconnects = 0
+        self.failed_reconnects = 0
+
+    async def _connect(self) -> tuple[McpConnection, list, BaseAgent]:
+        connection = McpConnection(self.toolset_factory(), self.health_timeout)
+        try:
+            tools = await connection.get_tools()
+            return connection, tools, self.agent_factory(tools)
+        except BaseException:
+            await connection.close()
+            raise
+
+    async def start(self):
+        """Open all connections (idempotent)."""
+        async with self._start_lock:
+            if self._started:
+                return
+            connected = await asyncio.gather(*(self._connect() for _ in range(self.size)), return_exceptions=True)
+            errors = [result for result in connected if isinstance(result, BaseException)]
+            if errors:
+                await asyncio.gather(*(result[0].close() for result in connected if not isinstance(result, BaseException)))
+                raise errors[0]
+            for connection, tools, agent in connected:
+                member = PoolMember(connection=connection, tools=tools, agent=agent)
+                self._members.append(member)
+                self._idle.put_nowait(member)
+            self._started = True
+            print(f"📦 MCP pool ready: {self.size} connections, {len(self._members[0].tools)} tools")
+
+    async def _check(self, member: PoolMember):
+        self.health_checks += 1
+        try:
+            await member.connection.get_tools()
+            member.healthy = True
+        except Exception as e:
+            logger.info("MCP health check failed: %s", e)
+            member.healthy = False
+        member.last_checked = time.monotonic()
+
+    async def _reconnect(self, member: PoolMember):
+        """Replace a member's connection and pipeline; keeps it unhealthy if the server is still down."""
+        await member.connection.close()
+        try:
+            member.connection, member.tools, member.agent = await self._connect()
+        except Exception as e:
+            self.failed_reconnects += 1
+            member.healthy = False
+            raise ConnectionError(f"MCP reconnect failed: {e}") from e
+        self.reconnects += 1
+        member.healthy = True
+        member.last_checked = time.monotonic()
+        print("🔌 MCP connection re-established")
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PoolMember]:
+        """Borrow a healthy member for one run."""
+        await self.start()
+        member = await self._idle.get()
+        try:
+            if member.healthy and time.monotonic() - member.last_checked > self.health_interval:
+                await self._check(member)
+            if not member.healthy:
+                await self._reconnect(member)
+            member.uses += 1
+            try:
+                yield member
+            except Exception:
+                member.healthy = False
+                raise
+            member.last_checked = time.monotonic()
+        finally:
+            self._idle.put_nowait(member)
+
+    async def close(self):
+        await asyncio.gather(*(member.connection.close() for member in self._members))
+        self._members.clear()
+        self._idle = asyncio.Queue()
+        self._started = False
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "healthy": sum(member.healthy for member in self._members),
+            "uses": sum(member.uses for member in self._members),
+            "health_checks": self.health_checks,
+            "reconnects": self.reconnects,
+            "failed_reconnects": self.failed_reconnects,
+        }
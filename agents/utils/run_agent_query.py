@@ -1,23 +1,142 @@
-import re
-import asyncio
-from IPython.display import display, Markdown
-import google.generativeai as genai
-from google.adk.agents import Agent, SequentialAgent, LoopAgent, ParallelAgent
-from google.adk.tools import google_search, ToolContext
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService, Session
-from google.genai.types import Content, Part
-from getpass import getpass
-import os
-from dotenv import load_dotenv
-load_dotenv()
- 
+# ADK (and litellm, which it imports) takes seconds to import, so only the type
+# hints are imported at module level; the runtime imports happen on first use.
+# IPython is loaded only when rendering inside Jupyter. Entry points call
+# load_dotenv() themselves. Checked by check_import_time.py.
+from __future__ import annotations
+
 import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+    from google.adk.agents.run_config import RunConfig
+    from google.adk.events import Event
+    from google.adk.sessions import Session
+
+logger = logging.getLogger(__name__)
+#============================================================================================================================================================
+def response_text(event: Event) -> str:
+    """Answer text of an event: the first non-thought text part, else the first text part."""
+    if not event.content or not event.content.parts:
+        return ""
+    # 遍歷所有 parts，找到非 thought 的實際回答
+    # thought=True 的是思考過程，我們要跳過它
+    for part in event.content.parts:
+        if getattr(part, 'thought', False):
+            continue
+        if part.text:
+            return part.text
+    # 如果沒找到非 thought 的回答，fallback 到第一個有 text 的 part
+    for part in event.content.parts:
+        if part.text:
+            return part.text
+    return ""
+
+
+@dataclass
+class StreamEvent:
+    """
+    One item of `stream_agent_query`.
+
+    type:
+        "delta"        partial answer text as the model generates it
+        "tool_call"    the agent requested a tool (`name`, `args`)
+        "tool_result"  a tool returned (`name`, `result`)
+        "final"        complete answer of one agent (`text`)
+        "error"        the run failed (`text` is the message)
+    """
+    type: str
+    author: str = ""
+    text: str = ""
+    name: str = ""
+    args: dict = field(default_factory=dict)
+    result: Any = None
+    timestamp: float = field(default_factory=time.time)
+    elapsed_ms: float = 0.0
+
+
+async def stream_agent_query(
+    agent: Agent,
+    query: str,
+    session: Session,
+    user_id: str,
+    session_service,
+    run_config: Optional[RunConfig] = None,
+) -> AsyncIterator[StreamEvent]:
+    """
+    Run a query and yield text deltas and tool events as they happen.
+
+    Unlike `run_agent_query`, which returns only after generation finishes,
+    the runner is switched to SSE streaming (`LiteLlm(stream=True)` alone does
+    not stream: the runner decides per call), so the first token reaches the
+    caller as soon as the model emits it. Every item carries a wall-clock
+    `timestamp` and `elapsed_ms` since the query started.
+
+        async for item in stream_agent_query(agent, query, session, user_id, session_service):
+            if item.type == "delta":
+                print(item.text, end="", flush=True)
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.adk.runners import Runner
+    from google.genai.types import Content, Part
+
+    runner = Runner(agent=agent, session_service=session_service, app_name=agent.name)
+    run_config = run_config or RunConfig(streaming_mode=StreamingMode.SSE)
+    start = time.perf_counter()
+
+    def item(type: str, event: Event, **kwargs) -> StreamEvent:
+        return StreamEvent(type=type, author=event.author, elapsed_ms=round((time.perf_counter() - start) * 1000, 3), **kwargs)
+
+    try:
+        async for event in runner.run_async(
+            user_id=user_id,
+            session_id=session.id,
+            new_message=Content(parts=[Part(text=query)], role="user"),
+            run_config=run_config,
+        ):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("EVENT: %s", event)
+            if event.partial:
+                # Partial events carry only the newly generated text; the aggregated
+                # non-partial event that follows repeats it in full
+                for part in (event.content.parts if event.content else []):
+                    if part.text and not getattr(part, 'thought', False):
+                        yield item("delta", event, text=part.text)
+                continue
+            for call in event.get_function_calls():
+                yield item("tool_call", event, name=call.name, args=dict(call.args or {}))
+            for response in event.get_function_responses():
+                yield item("tool_result", event, name=response.name, result=response.response)
+            if event.is_final_response() and (text := response_text(event)):
+                yield item("final", event, text=text)
+    except Exception as e:
+        yield StreamEvent(type="error", text=f"An error occurred: {e}", elapsed_ms=round((time.perf_counter() - start) * 1000, 3))
+
+
 #============================================================================================================================================================
 # --- A Helper Function to Run Our Agents ---
 # We'll use this function throughout the notebook to make running queries easy.
-async def run_agent_query(agent: Agent, query: str, session: Session, user_id: str, session_service, is_router: bool = False):
-    """Initializes a runner and executes a query for a given agent and session."""
+async def run_agent_query(
+    agent: Agent,
+    query: str,
+    session: Session,
+    user_id: str,
+    session_service,
+    is_router: bool = False,
+    raise_errors: bool = False,
+):
+    """
+    Initializes a runner and executes a query for a given agent and session.
+
+    A failed run returns "An error occurred: ..." as the response, or raises
+    with `raise_errors` (e.g. so a connection pool can tell the run failed).
+    """
+    from google.adk.runners import Runner
+    from google.genai.types import Content, Part
+
     print(f"\n🚀 Running query for agent: '{agent.name}' in session: '{session.id}'...")
     # Compute the module-derived app name for diagnostics, but use `agent.name`
     # as the runner app_name so it matches sessions created with that name.
@@ -27,12 +146,12 @@ async def run_agent_query(agent: Agent, query: str, session: Session, user_id: s
     except Exception:
         module_app_name_short = None
  
-    logging.debug(f"agent.name='{agent.name}', module_app_name='{module_app_name_short}'")
+    logger.debug("agent.name='%s', module_app_name='%s'", agent.name, module_app_name_short)
  
     if module_app_name_short and module_app_name_short != agent.name:
-        logging.debug(
-            "App name mismatch diagnostic: agent.name='%s', module suggests '%s'."
-            % (agent.name, module_app_name_short)
+        logger.debug(
+            "App name mismatch diagnostic: agent.name='%s', module suggests '%s'.",
+            agent.name, module_app_name_short,
         )
  
     # Use the explicit agent.name for the runner so it can locate sessions
@@ -49,27 +168,14 @@ async def run_agent_query(agent: Agent, query: str, session: Session, user_id: s
             session_id=session.id,
             new_message=Content(parts=[Part(text=query)], role="user")
         ):
-            if not is_router:
-                # Let's see what the agent is thinking!
-                print(f"EVENT: {event}")
+            # Let's see what the agent is thinking! (DEBUG only: formatting event reprs is expensive)
+            if not is_router and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("EVENT: %s", event)
             if event.is_final_response():
-                # 遍歷所有 parts，找到非 thought 的實際回答
-                # thought=True 的是思考過程，我們要跳過它
-                for part in event.content.parts:
-                    # 檢查是否有 thought 屬性且為 True，如果是就跳過
-                    if hasattr(part, 'thought') and part.thought:
-                        continue
-                    # 檢查是否有 text 屬性
-                    if hasattr(part, 'text') and part.text:
-                        final_response = part.text
-                        break
-                # 如果沒找到非 thought 的回答，fallback 到第一個有 text 的 part
-                if not final_response:
-                    for part in event.content.parts:
-                        if hasattr(part, 'text') and part.text:
-                            final_response = part.text
-                            break
+                final_response = response_text(event) or final_response
     except Exception as e:
+        if raise_errors:
+            raise
         final_response = f"An error occurred: {e}"
  
     if not is_router:
@@ -78,6 +184,9 @@ async def run_agent_query(agent: Agent, query: str, session: Session, user_id: s
         # Detect if we're running inside a Jupyter environment. If so, render Markdown;
         # otherwise print plain text so terminals show the response instead of a Markdown object.
         def _running_in_jupyter() -> bool:
+            # A Jupyter kernel has always imported IPython already; don't pay for it otherwise
+            if "IPython" not in sys.modules:
+                return False
             try:
                 from IPython import get_ipython
                 ip = get_ipython()
@@ -88,6 +197,7 @@ async def run_agent_query(agent: Agent, query: str, session: Session, user_id: s
                 return False
  
         if _running_in_jupyter():
+            from IPython.display import display, Markdown
             display(Markdown(final_response))
         else:
             print(final_response)
@@ -0,0 +1,105 @@
+"""
+Tests of the MCP connection pool against a stub toolset that, like the MCP
+client, holds an anyio cancel scope from connect to close:
+
+    uv run pytest utils/test_mcp_pool.py
+"""
+import asyncio
+from contextlib import AsyncExitStack
+
+import anyio
+import pytest
+
+pytest.importorskip("google.adk")
+
+from utils.mcp_pool import McpToolsetPool  # noqa: E402
+
+
+class StubToolset:
+    """Connects on the first `get_tools`; `fail` makes the next call raise."""
+
+    instances = []
+
+    def __init__(self):
+        self.stack = AsyncExitStack()
+        self.connected = False
+        self.closed = False
+        self.fail = False
+        self.tasks = set()
+        StubToolset.instances.append(self)
+
+    async def get_tools(self):
+        self.tasks.add(asyncio.current_task())
+        if self.fail:
+            raise RuntimeError("server down")
+        if not self.connected:
+            # Exiting it from another task raises "Attempted to exit cancel scope in a different task"
+            self.stack.enter_context(anyio.CancelScope())
+            self.connected = True
+        await asyncio.sleep(0)
+        return ["ocr"]
+
+    async def close(self):
+        self.tasks.add(asyncio.current_task())
+        await self.stack.aclose()
+        self.closed = True
+
+
+def make_pool(size: int = 3, **kwargs) -> McpToolsetPool:
+    StubToolset.instances.clear()
+    return McpToolsetPool(StubToolset, lambda tools: object(), size=size, **kwargs)
+
+
+def test_each_connection_is_opened_and_closed_by_one_task():
+    async def main():
+        pool = make_pool()
+        async with pool.acquire() as member:
+            assert member.tools == ["ocr"]
+        await pool.close()
+
+    asyncio.run(main())
+    assert len(StubToolset.instances) == 3
+    assert all(toolset.closed and len(toolset.tasks) == 1 for toolset in StubToolset.instances)
+    assert len({task for toolset in StubToolset.instances for task in toolset.tasks}) == 3
+
+
+def test_a_failed_run_reconnects_in_a_new_task():
+    async def main():
+        pool = make_pool(size=1, health_interval=0)
+        with pytest.raises(ValueError):
+            async with pool.acquire():
+                raise ValueError("run failed")
+        async with pool.acquire() as member:
+            assert member.toolset is StubToolset.instances[1]
+        # Idle longer than health_interval: checked (as on the first acquire) by the task that owns the connection
+        async with pool.acquire():
+            pass
+        stats = pool.stats()
+        await pool.close()
+        return stats
+
+    stats = asyncio.run(main())
+    assert (stats["reconnects"], stats["health_checks"], stats["healthy"]) == (1, 2, 1)
+    first, second = StubToolset.instances
+    assert first.closed and second.closed
+    assert len(first.tasks) == len(second.tasks) == 1 and first.tasks != second.tasks
+
+
+def test_a_failed_start_closes_the_connections_it_opened():
+    async def main():
+        pool = make_pool()
+        original = StubToolset.__init__
+
+        def init(self):
+            original(self)
+            self.fail = len(StubToolset.instances) == 2
+
+        StubToolset.__init__ = init
+        try:
+            with pytest.raises(RuntimeError, match="server down"):
+                await pool.start()
+        finally:
+            StubToolset.__init__ = original
+
+    asyncio.run(main())
+    assert all(toolset.closed for toolset in StubToolset.instances)
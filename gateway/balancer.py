@@ -0,0 +1,161 @@
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import httpx
+
+from health import ToolHealth
+
+STRATEGIES = ("least_outstanding", "p2c")
+
+
+class NoReplicaAvailable(Exception):
+    """Raised when a tool has no replicas configured."""
+
+
+@dataclass
+class Replica:
+    url: str
+    client: httpx.AsyncClient
+    health: ToolHealth = field(default_factory=ToolHealth)
+    inflight: int = 0
+    routed: int = 0
+    errors: int = 0
+    consecutive_errors: int = 0
+    ejected_until: float = 0.0
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    @property
+    def healthy(self) -> bool:
+        return self.health.available and not self.ejected
+
+
+class ReplicaPool:
+    """
+    Route calls for one tool across several replica endpoints.
+
+    Picks the healthy replica with the fewest in-flight requests
+    (`least_outstanding`) or the better of two random ones (`p2c`). A replica
+    is ejected for `eject_seconds` after `eject_after` consecutive request
+    failures (transport errors or 5xx answers), and re-admitted as soon as a
+    health probe succeeds again. If no
+    replica is healthy, all of them are tried rather than failing outright.
+
+    Args:
+        name: Tool name.
+        replicas: Replicas with their pooled clients.
+        strategy: `least_outstanding` or `p2c`.
+        eject_after: Consecutive request failures before ejection.
+        eject_seconds: How long an ejected replica is skipped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        replicas: list[Replica],
+        strategy: str = "least_outstanding",
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown balancing strategy '{strategy}', expected one of {STRATEGIES}")
+        self.name = name
+        self.replicas = replicas
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.panic_routed = 0
+
+    def pick(self) -> Replica:
+        if not self.replicas:
+            raise NoReplicaAvailable(f"Tool '{self.name}' has no replicas")
+
+        candidates = [r for r in self.replicas if r.healthy]
+        if not candidates:
+            # Health data may be stale (e.g. before the first probe): try everything
+            candidates = self.replicas
+            self.panic_routed += 1
+
+        if self.strategy == "p2c" and len(candidates) > 2:
+            candidates = random.sample(candidates, 2)
+        lowest = min(r.inflight for r in candidates)
+        return random.choice([r for r in candidates if r.inflight == lowest])
+
+    def start(self, replica: Replica):
+        replica.inflight += 1
+        replica.routed += 1
+
+    def finish(self, replica: Replica, failed: bool = False):
+        replica.inflight -= 1
+        if not failed:
+            replica.consecutive_errors = 0
+            return
+        replica.errors += 1
+        replica.consecutive_errors += 1
+        if replica.consecutive_errors >= self.eject_after:
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def readmit(self, replica: Replica):
+        """Called after a successful health probe."""
+        replica.ejected_until = 0.0
+        replica.consecutive_errors = 0
+
+    async def request(self, method: str, url: str, **kwargs) -> tuple[httpx.Response, Replica]:
+        """
+        Send a request to a picked replica; returns the response and the replica.
+
+        Transport errors and 5xx answers count as failures of the replica.
+        """
+        replica = self.pick()
+        self.start(replica)
+        failed = False
+        try:
+            resp = await replica.client.request(method, url, **kwargs)
+            failed = resp.status_code >= 500
+            return resp, replica
+        except httpx.TransportError:
+            failed = True
+            raise
+        finally:
+            self.finish(replica, failed)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Pick a replica and track the call; transport errors count as failures."""
+        replica = self.pick()
+        self.start(replica)
+        failed = False
+        try:
+            yield replica
+        except httpx.TransportError:
+            failed = True
+            raise
+        finally:
+            self.finish(replica, failed)
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "panic_routed": self.panic_routed,
+            "replicas": [
+                {
+                    "url": r.url,
+                    "healthy": r.healthy,
+                    "ejected": r.ejected,
+                    "inflight": r.inflight,
+                    "routed": r.routed,
+                    "errors": r.errors,
+                    "latency_ms": r.health.latency_ms,
+                    "consecutive_failures": r.health.consecutive_failures,
+                }
+                for r in self.replicas
+            ],
+        }
+
+    async def aclose(self):
+        for replica in self.replicas:
+            await replica.client.aclose()
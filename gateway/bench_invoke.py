@@ -0,0 +1,108 @@
+"""
+Benchmark requests/sec through POST /invoke against a local stub tool.
+
+Compares the gateway (one pooled client per backend) with a baseline route
+that opens a new httpx.AsyncClient per call, as the gateway used to.
+
+    uv run python bench_invoke.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+import main as gateway
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+stub_tool = FastAPI()
+
+
+@stub_tool.post("/echo")
+async def echo(params: dict):
+    return {"echo": params}
+
+
+@stub_tool.get("/health")
+async def stub_health():
+    return {"status": "ok"}
+
+
+baseline = FastAPI()
+
+
+@baseline.post("/invoke")
+async def baseline_invoke(request: gateway.ToolRequest):
+    """Previous behaviour: a fresh client (and TCP connection) per call."""
+    url = f"{gateway.TOOL_REGISTRY[request.tool]}/{request.method}"
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        resp = await client.post(url, json=request.params)
+        return resp.json()
+
+
+async def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def run_load(url: str, total: int, concurrency: int) -> float:
+    payload = {"tool": "stub_tool", "method": "echo", "params": {"text": "hello"}}
+    remaining = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        async def worker():
+            for _ in remaining:
+                resp = await client.post(url, json=payload)
+                resp.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    tool_port, gateway_port, baseline_port = free_port(), free_port(), free_port()
+    gateway.TOOL_REGISTRY["stub_tool"] = f"http://127.0.0.1:{tool_port}"
+
+    servers = [
+        await start_server(stub_tool, tool_port),
+        await start_server(gateway.app, gateway_port),
+        await start_server(baseline, baseline_port),
+    ]
+
+    # Warm up both paths before measuring
+    await run_load(f"http://127.0.0.1:{baseline_port}/invoke", 100, 10)
+    await run_load(f"http://127.0.0.1:{gateway_port}/invoke", 100, 10)
+
+    before = await run_load(f"http://127.0.0.1:{baseline_port}/invoke", args.requests, args.concurrency)
+    after = await run_load(f"http://127.0.0.1:{gateway_port}/invoke", args.requests, args.concurrency)
+
+    print(f"requests={args.requests} concurrency={args.concurrency}")
+    print(f"client per request : {before:8.1f} req/s")
+    print(f"pooled client      : {after:8.1f} req/s ({after / before:.2f}x)")
+
+    for server in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
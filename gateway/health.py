@@ -0,0 +1,93 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class ToolHealth:
+    available: bool = False
+    latency_ms: Optional[float] = None
+    consecutive_failures: int = 0
+    last_checked: Optional[float] = None
+    last_seen: Optional[float] = None
+    error: Optional[str] = None
+
+
+class HealthMonitor:
+    """
+    Probe every tool replica concurrently on an interval and keep a snapshot.
+
+    `/tools` reads each replica's `health` instead of probing on every call,
+    so the endpoint no longer takes `health_timeout * N` seconds when N tools
+    are down. A successful probe re-admits a replica ejected by its pool.
+
+    Args:
+        pools: Tool name -> `ReplicaPool`.
+        timeout_for: Returns the probe timeout for a tool name.
+        interval: Seconds between probe rounds.
+    """
+
+    def __init__(self, pools: dict, timeout_for: Callable[[str], float], interval: float = 10.0):
+        self.pools = pools
+        self.timeout_for = timeout_for
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def probe(self, pool, replica):
+        """Probe one replica and update its health."""
+        start = time.perf_counter()
+        try:
+            resp = await replica.client.get("/health", timeout=self.timeout_for(pool.name))
+            error = None if resp.status_code == 200 else f"HTTP {resp.status_code}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        self._record(replica.health, error, (time.perf_counter() - start) * 1000)
+        if error is None:
+            pool.readmit(replica)
+
+    @staticmethod
+    def _record(status: ToolHealth, error: Optional[str], latency_ms: Optional[float] = None):
+        status.last_checked = time.time()
+        if error is None:
+            status.available = True
+            status.latency_ms = round(latency_ms, 3)
+            status.consecutive_failures = 0
+            status.last_seen = status.last_checked
+            status.error = None
+        else:
+            status.available = False
+            status.consecutive_failures += 1
+            status.error = error
+
+    async def probe_all(self, deadline: Optional[float] = None):
+        """Probe all replicas in parallel; those not done within `deadline` seconds count as failed."""
+        tasks = {
+            asyncio.create_task(self.probe(pool, replica)): replica
+            for pool in self.pools.values()
+            for replica in pool.replicas
+        }
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+            self._record(tasks[task].health, "Deadline exceeded")
+
+    async def _run(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,118 +1,474 @@
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Literal, Optional
+
 import httpx
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-# Tool registry - maps tool names to their endpoints
-TOOL_REGISTRY = {
+from balancer import STRATEGIES, NoReplicaAvailable, Replica, ReplicaPool
+from health import HealthMonitor
+
+# Add repo root to sys.path for shared utils
+if str(Path(__file__).resolve().parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from shared.job_queue import JobQueue, JobRetry
+
+# Tool registry - maps tool names to their endpoint, or a list of replica endpoints
+TOOL_REGISTRY: dict[str, str | list[str]] = {
     "ocr_tool": "http://localhost:8001",
     "tts_tool": "http://localhost:8002",
     "embedding_tool": "http://localhost:8003",
 }
 
 
+class ToolConfig(BaseModel):
+    timeout: float = Field(default=60.0, description="Timeout for /invoke and /proxy calls (seconds)")
+    health_timeout: float = Field(default=2.0, description="Timeout for health probes (seconds)")
+    spec_timeout: float = Field(default=5.0, description="Timeout for spec requests (seconds)")
+    max_connections: int = Field(default=100, description="Max open connections to the tool")
+    max_keepalive_connections: int = Field(default=20, description="Max idle keep-alive connections")
+    keepalive_expiry: float = Field(default=30.0, description="Idle keep-alive expiry (seconds)")
+    http2: bool = Field(default=False, description="Use HTTP/2 (requires httpx[http2])")
+    balancing: str = Field(default="least_outstanding", description=f"Replica selection: {', '.join(STRATEGIES)}")
+    eject_after: int = Field(default=3, description="Consecutive failed calls before a replica is ejected")
+    eject_seconds: float = Field(default=30.0, description="How long an ejected replica is skipped (seconds)")
+    batch_concurrency: int = Field(default=4, description="Concurrent calls per tool within one /invoke/batch")
+    job_timeout: float = Field(default=3600.0, description="Timeout for calls run as /jobs (seconds)")
+
+
+# Per-tool connection settings; tools without an entry use DEFAULT_TOOL_CONFIG
+DEFAULT_TOOL_CONFIG = ToolConfig()
+TOOL_CONFIG: dict[str, ToolConfig] = {}
+
+
+def load_config(path: str):
+    """
+    Merge a JSON config file into TOOL_REGISTRY / TOOL_CONFIG.
+
+    Format:
+        {
+            "defaults": {"max_connections": 200},
+            "tools": {"ocr_tool": {"endpoint": ["http://gpu0:8001", "http://gpu1:8001"], "timeout": 120}}
+        }
+    """
+    global DEFAULT_TOOL_CONFIG
+    with open(path) as f:
+        config = json.load(f)
+
+    DEFAULT_TOOL_CONFIG = ToolConfig(**config.get("defaults", {}))
+    for name, tool in config.get("tools", {}).items():
+        tool = dict(tool)
+        if "endpoint" in tool:
+            TOOL_REGISTRY[name] = tool.pop("endpoint")
+        TOOL_CONFIG[name] = DEFAULT_TOOL_CONFIG.model_copy(update=tool)
+
+
+def get_tool_config(tool_name: str) -> ToolConfig:
+    return TOOL_CONFIG.get(tool_name, DEFAULT_TOOL_CONFIG)
+
+
+def get_replica_urls(tool_name: str) -> list[str]:
+    endpoints = TOOL_REGISTRY[tool_name]
+    return [endpoints] if isinstance(endpoints, str) else list(endpoints)
+
+
+if os.environ.get("GATEWAY_CONFIG"):
+    load_config(os.environ["GATEWAY_CONFIG"])
+
+# Connection-specific headers that must not be forwarded by a proxy
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Background health probing: interval between rounds and deadline for /tools?fresh=true
+HEALTH_INTERVAL = float(os.environ.get("GATEWAY_HEALTH_INTERVAL", "10"))
+HEALTH_FRESH_DEADLINE = float(os.environ.get("GATEWAY_HEALTH_DEADLINE", "3"))
+
+# Maximum number of calls accepted by one /invoke/batch request
+BATCH_MAX_ITEMS = int(os.environ.get("GATEWAY_BATCH_MAX_ITEMS", "256"))
+# Characters of a non-JSON tool response kept as the item's error
+BATCH_ERROR_CHARS = 500
+
+# Async jobs (/jobs): durable sqlite queue, calls run with the tool's job_timeout
+JOBS_DB = os.environ.get("GATEWAY_JOBS_DB", "gateway_jobs.db")
+JOB_CONCURRENCY = int(os.environ.get("GATEWAY_JOB_CONCURRENCY", "8"))
+JOB_RETENTION_HOURS = float(os.environ.get("GATEWAY_JOB_RETENTION_HOURS", "24"))
+JOB_MAX_WAIT = float(os.environ.get("GATEWAY_JOB_MAX_WAIT", "60"))
+# Comma-separated webhook hosts jobs may POST to (e.g. "hooks.internal,*.example.com"; unset: any public http(s) host)
+WEBHOOK_HOSTS = os.environ.get("GATEWAY_WEBHOOK_HOSTS", "").split(",")
+
+# One replica pool per tool, with a long-lived client per replica so calls reuse keep-alive connections
+pools: dict[str, ReplicaPool] = {}
+health_monitor = HealthMonitor(pools, lambda name: get_tool_config(name).health_timeout, HEALTH_INTERVAL)
+jobs: Optional[JobQueue] = None
+
+
+def create_client(tool_name: str, endpoint: str) -> httpx.AsyncClient:
+    config = get_tool_config(tool_name)
+    return httpx.AsyncClient(
+        base_url=endpoint,
+        timeout=config.timeout,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        http2=config.http2,
+    )
+
+
+def create_pool(tool_name: str) -> ReplicaPool:
+    config = get_tool_config(tool_name)
+    return ReplicaPool(
+        tool_name,
+        [Replica(url=url, client=create_client(tool_name, url)) for url in get_replica_urls(tool_name)],
+        strategy=config.balancing,
+        eject_after=config.eject_after,
+        eject_seconds=config.eject_seconds,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global jobs
+    for name in TOOL_REGISTRY:
+        pools[name] = create_pool(name)
+    health_monitor.start()
+    jobs = JobQueue(
+        JOBS_DB, concurrency=JOB_CONCURRENCY, retention=JOB_RETENTION_HOURS * 3600, webhook_hosts=WEBHOOK_HOSTS
+    )
+    await jobs.start(run_job)
+    yield
+    await jobs.stop()
+    jobs.close()
+    await health_monitor.stop()
+    for pool in pools.values():
+        await pool.aclose()
+    pools.clear()
+
+
 class ToolRequest(BaseModel):
     tool: str = Field(..., description="Tool name (e.g., 'ocr_tool')")
     method: str = Field(..., description="Method name (e.g., 'ocr')")
     params: dict = Field(default_factory=dict, description="Method parameters")
 
 
+class JobRequest(ToolRequest):
+    priority: Literal["high", "normal", "low"] = Field(default="normal", description="Priority class")
+    webhook_url: Optional[str] = Field(default=None, description="URL that receives the finished job as a JSON POST")
+
+
+class BatchInvokeRequest(BaseModel):
+    requests: list[ToolRequest] = Field(..., description="Tool calls to run")
+    stream: bool = Field(default=False, description="Stream results as NDJSON in completion order")
+    timeout: Optional[float] = Field(default=None, description="Per-call timeout (seconds), defaults to the tool's timeout")
+
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the call in the batch")
+    tool: str
+    status_code: int = Field(..., description="Tool HTTP status, or 404/503/504 for gateway-side errors")
+    result: Any = Field(default=None, description="Tool response body")
+    error: Optional[str] = Field(default=None, description="Error message if the call failed")
+
+
 class ToolInfo(BaseModel):
     name: str
     endpoint: str
+    replicas: list[str] = Field(default_factory=list, description="All replica endpoints")
     available: bool
+    latency_ms: Optional[float] = Field(default=None, description="Latency of the last successful probe")
+    consecutive_failures: int = Field(default=0, description="Failed probes since the last success")
+    last_checked: Optional[float] = Field(default=None, description="Unix time of the last probe")
+    last_seen: Optional[float] = Field(default=None, description="Unix time of the last successful probe")
 
 
 app = FastAPI(
     title="AI Agent Tools Gateway",
     description="Unified API gateway for AI Agent tools",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
 @app.get("/tools")
-async def list_tools() -> list[ToolInfo]:
-    """List all registered tools and their availability."""
+async def list_tools(fresh: bool = False) -> list[ToolInfo]:
+    """
+    List all registered tools and their availability.
+
+    Served from the background health monitor's snapshot; `?fresh=true`
+    probes all tools in parallel first, bounded by one overall deadline.
+    A tool is available when at least one of its replicas is healthy.
+    """
+    if fresh:
+        await health_monitor.probe_all(deadline=HEALTH_FRESH_DEADLINE)
+
     tools = []
-    async with httpx.AsyncClient(timeout=2.0) as client:
-        for name, endpoint in TOOL_REGISTRY.items():
-            available = False
-            try:
-                resp = await client.get(f"{endpoint}/health")
-                available = resp.status_code == 200
-            except Exception:
-                pass
-            tools.append(ToolInfo(name=name, endpoint=endpoint, available=available))
+    for name, pool in pools.items():
+        health = [r.health for r in pool.replicas]
+        latencies = [h.latency_ms for h in health if h.available and h.latency_ms is not None]
+        checked = [h.last_checked for h in health if h.last_checked is not None]
+        seen = [h.last_seen for h in health if h.last_seen is not None]
+        tools.append(ToolInfo(
+            name=name,
+            endpoint=pool.replicas[0].url if pool.replicas else "",
+            replicas=[r.url for r in pool.replicas],
+            available=any(r.healthy for r in pool.replicas),
+            latency_ms=min(latencies, default=None),
+            consecutive_failures=min((h.consecutive_failures for h in health), default=0),
+            last_checked=max(checked, default=None),
+            last_seen=max(seen, default=None),
+        ))
     return tools
 
 
+@app.get("/routing")
+async def routing_stats():
+    """Per-tool balancing strategy and per-replica health, in-flight and routed counts."""
+    return {name: pool.stats() for name, pool in pools.items()}
+
+
 @app.get("/tools/{tool_name}/spec")
 async def get_tool_spec(tool_name: str):
     """Get tool specification (tool_spec.json)."""
     if tool_name not in TOOL_REGISTRY:
         raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found")
 
-    endpoint = TOOL_REGISTRY[tool_name]
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        try:
-            # Try to get openapi.json from the tool
-            resp = await client.get(f"{endpoint}/openapi.json")
-            if resp.status_code == 200:
-                return resp.json()
-        except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Tool '{tool_name}' is not available: {e}")
+    try:
+        # Try to get openapi.json from the tool
+        resp, _ = await pools[tool_name].request(
+            "GET", "/openapi.json", timeout=get_tool_config(tool_name).spec_timeout
+        )
+        if resp.status_code == 200:
+            return resp.json()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Tool '{tool_name}' is not available: {e}")
 
     raise HTTPException(status_code=503, detail=f"Could not get spec from '{tool_name}'")
 
 
+async def forward_invoke(request: ToolRequest, timeout: Optional[float] = None) -> tuple[httpx.Response, Replica]:
+    """POST the call to a replica of the tool; returns the response and the replica used."""
+    return await pools[request.tool].request(
+        "POST",
+        f"/{request.method}",
+        json=request.params,
+        timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+    )
+
+
 @app.post("/invoke")
 async def invoke_tool(request: ToolRequest):
     """Invoke a tool method with parameters."""
     if request.tool not in TOOL_REGISTRY:
         raise HTTPException(status_code=404, detail=f"Tool '{request.tool}' not found")
 
-    endpoint = TOOL_REGISTRY[request.tool]
-    url = f"{endpoint}/{request.method}"
+    try:
+        resp, replica = await forward_invoke(request)
+        return JSONResponse(
+            content=resp.json(),
+            status_code=resp.status_code,
+            headers={"X-Gateway-Replica": replica.url},
+        )
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Tool request timed out")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Tool error: {e}")
+
+
+@app.post("/invoke/batch", response_model=None)
+async def invoke_batch(batch: BatchInvokeRequest) -> list[BatchItemResult] | StreamingResponse:
+    """
+    Invoke several tool calls concurrently (e.g. one per document page).
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    Calls fan out with at most `batch_concurrency` in flight per tool. Errors
+    and timeouts are reported per item, so one failing call does not fail
+    the rest; a non-JSON answer keeps its status code, with the start of
+    its body as `error`. Results come back in request order, or with
+    `stream: true` as NDJSON lines in completion order.
+    """
+    if len(batch.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} calls")
+
+    semaphores = {
+        tool: asyncio.Semaphore(max(1, get_tool_config(tool).batch_concurrency))
+        for tool in {r.tool for r in batch.requests if r.tool in TOOL_REGISTRY}
+    }
+
+    async def run_item(index: int, request: ToolRequest) -> BatchItemResult:
+        if request.tool not in TOOL_REGISTRY:
+            return BatchItemResult(
+                index=index, tool=request.tool, status_code=404, error=f"Tool '{request.tool}' not found"
+            )
+        timeout = batch.timeout or get_tool_config(request.tool).timeout
         try:
-            resp = await client.post(url, json=request.params)
-            return JSONResponse(content=resp.json(), status_code=resp.status_code)
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="Tool request timed out")
+            async with semaphores[request.tool]:
+                resp, _ = await asyncio.wait_for(forward_invoke(request), timeout=timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            return BatchItemResult(index=index, tool=request.tool, status_code=504, error="Tool request timed out")
         except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Tool error: {e}")
+            return BatchItemResult(index=index, tool=request.tool, status_code=503, error=f"Tool error: {e}")
+        try:
+            return BatchItemResult(index=index, tool=request.tool, status_code=resp.status_code, result=resp.json())
+        except ValueError:
+            # e.g. a proxy's HTML error page
+            error = resp.text[:BATCH_ERROR_CHARS] or "Empty non-JSON response"
+            return BatchItemResult(index=index, tool=request.tool, status_code=resp.status_code, error=error)
+
+    tasks = [asyncio.create_task(run_item(i, r)) for i, r in enumerate(batch.requests)]
+
+    if not batch.stream:
+        return list(await asyncio.gather(*tasks))
+
+    async def stream_results():
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield (await task).model_dump_json() + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+async def run_job(kind: str, payload: dict) -> dict:
+    """Job handler: run a queued tool call with the tool's `job_timeout` instead of `timeout`."""
+    request = ToolRequest(**payload)
+    if request.tool not in TOOL_REGISTRY:
+        raise ValueError(f"Tool '{request.tool}' not found")
+    try:
+        resp, replica = await forward_invoke(request, timeout=get_tool_config(request.tool).job_timeout)
+    except httpx.TimeoutException:
+        raise TimeoutError("Tool request timed out")
+    if resp.status_code in (429, 503):
+        # Tool is busy: run the job again later instead of failing it
+        retry_after = resp.headers.get("retry-after", "")
+        raise JobRetry(f"Tool busy ({resp.status_code})", delay=float(retry_after) if retry_after.isdigit() else 5.0)
+    if resp.status_code >= 400:
+        raise RuntimeError(f"Tool returned {resp.status_code}: {resp.text[:500]}")
+    return {"status_code": resp.status_code, "replica": replica.url, "result": resp.json()}
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    """
+    Queue a tool call and return the job at once (`202`, `Location: /jobs/{id}`).
+
+    For calls that may run longer than the tool's `/invoke` timeout (e.g. OCR
+    of large documents): the job survives gateway restarts, and its result is
+    read from `GET /jobs/{id}` or POSTed to `webhook_url`.
+    """
+    if request.tool not in TOOL_REGISTRY:
+        raise HTTPException(status_code=404, detail=f"Tool '{request.tool}' not found")
+    try:
+        job = await jobs.submit(
+            "invoke",
+            request.model_dump(include={"tool", "method", "params"}),
+            priority=request.priority,
+            webhook_url=request.webhook_url,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status and, once finished, its result; `?wait=30` long-polls until the job finishes."""
+    job = await jobs.wait(job_id, min(max(wait, 0), JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job (running jobs are not interrupted)."""
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.to_dict()
 
 
 @app.api_route("/proxy/{tool_name}/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def proxy_request(tool_name: str, path: str, request: Request):
-    """Proxy requests directly to tools."""
+    """
+    Proxy requests directly to tools.
+
+    Request and response bodies are streamed through chunk by chunk, with the
+    upstream status, headers and content type preserved, so memory stays flat
+    for large payloads and non-JSON / SSE responses pass through untouched.
+    """
     if tool_name not in TOOL_REGISTRY:
         raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found")
 
-    endpoint = TOOL_REGISTRY[tool_name]
-    url = f"{endpoint}/{path}"
+    pool = pools[tool_name]
+    try:
+        replica = pool.pick()
+    except NoReplicaAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    upstream_request = replica.client.build_request(
+        method=request.method,
+        url=f"/{path}",
+        params=request.query_params.multi_items(),
+        headers=[
+            (k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS | {"host"}
+        ],
+        content=request.stream() if has_body else None,
+    )
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    pool.start(replica)
+    try:
+        resp = await replica.client.send(upstream_request, stream=True)
+    except httpx.TimeoutException:
+        pool.finish(replica, failed=True)
+        raise HTTPException(status_code=504, detail="Tool request timed out")
+    except Exception as e:
+        pool.finish(replica, failed=True)
+        raise HTTPException(status_code=503, detail=f"Proxy error: {e}")
+
+    async def stream_body():
+        # Closing in `finally` returns the connection to the pool even if the client disconnects
+        failed = False
         try:
-            body = await request.body()
-            resp = await client.request(
-                method=request.method,
-                url=url,
-                headers={k: v for k, v in request.headers.items() if k.lower() not in ["host", "content-length"]},
-                content=body if body else None,
-            )
-            return JSONResponse(content=resp.json(), status_code=resp.status_code)
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="Tool request timed out")
-        except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Proxy error: {e}")
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        except httpx.TransportError:
+            failed = True
+            raise
+        finally:
+            await resp.aclose()
+            pool.finish(replica, failed or resp.status_code >= 500)
+
+    response = StreamingResponse(stream_body(), status_code=resp.status_code)
+    response.raw_headers = [
+        (k, v) for k, v in resp.headers.raw if k.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+    ]
+    response.raw_headers.append((b"x-gateway-replica", replica.url.encode()))
+    return response
 
 
 @app.get("/health")
 async def health():
     """Gateway health check."""
-    return {"status": "ok", "tools_registered": len(TOOL_REGISTRY)}
+    job_stats = await asyncio.to_thread(jobs.stats) if jobs else None
+    return {"status": "ok", "tools_registered": len(TOOL_REGISTRY), "jobs": job_stats}
 
 
 if __name__ == "__main__":
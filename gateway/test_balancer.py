@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+import pytest
+
+from balancer import NoReplicaAvailable, Replica, ReplicaPool
+from health import HealthMonitor
+
+
+def replica(url: str, healthy: bool = True, handler=None) -> Replica:
+    client = httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(handler or (lambda r: httpx.Response(200))))
+    r = Replica(url=url, client=client)
+    r.health.available = healthy
+    return r
+
+
+def test_least_outstanding_picks_the_least_busy_replica():
+    a, b, c = replica("http://a"), replica("http://b"), replica("http://c")
+    pool = ReplicaPool("ocr", [a, b, c])
+    a.inflight, b.inflight, c.inflight = 3, 1, 2
+    assert pool.pick() is b
+
+    # Ties are spread across replicas
+    a.inflight = b.inflight = c.inflight = 0
+    assert {pool.pick().url for _ in range(200)} == {"http://a", "http://b", "http://c"}
+
+
+def test_concurrent_calls_are_spread_evenly():
+    replicas = [replica(f"http://r{i}") for i in range(3)]
+    pool = ReplicaPool("ocr", replicas)
+    routed = Counter()
+
+    async def call():
+        async with pool.acquire() as r:
+            routed[r.url] += 1
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(30)))
+
+    asyncio.run(main())
+    assert sorted(routed.values()) == [10, 10, 10]
+    assert all(r.inflight == 0 and r.routed == 10 for r in replicas)
+
+
+def test_p2c_prefers_the_less_busy_of_two():
+    replicas = [replica(f"http://r{i}") for i in range(4)]
+    pool = ReplicaPool("ocr", replicas, strategy="p2c")
+    replicas[0].inflight = 100
+    for r in replicas[1:]:
+        r.inflight = 1
+    # Whichever pair is sampled, r0 is the busier of the two
+    assert all(pool.pick() is not replicas[0] for _ in range(200))
+
+
+def test_unknown_strategy_and_empty_pool():
+    with pytest.raises(ValueError):
+        ReplicaPool("ocr", [], strategy="round_robin")
+    with pytest.raises(NoReplicaAvailable):
+        ReplicaPool("ocr", []).pick()
+
+
+def test_unhealthy_replicas_are_skipped_unless_all_are_down():
+    up, down = replica("http://up"), replica("http://down", healthy=False)
+    pool = ReplicaPool("ocr", [up, down])
+    assert all(pool.pick() is up for _ in range(50))
+
+    up.health.available = False
+    assert {pool.pick().url for _ in range(100)} == {"http://up", "http://down"}
+    assert pool.panic_routed == 100
+
+
+def test_transport_errors_eject_and_a_probe_readmits():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    bad, good = replica("http://bad", handler=refuse), replica("http://good")
+    pool = ReplicaPool("ocr", [bad, good], eject_after=2, eject_seconds=60)
+
+    async def call_bad():
+        with pytest.raises(httpx.ConnectError):
+            async with pool.acquire() as r:
+                assert r is bad
+                await r.client.post("/ocr")
+
+    async def main():
+        good.inflight = 10  # make the pool pick `bad` while it is still healthy
+        for _ in range(2):
+            await call_bad()
+        good.inflight = 0
+        assert bad.ejected and not bad.healthy and bad.errors == 2
+        assert all(pool.pick() is good for _ in range(20))
+
+        # A successful health probe re-admits it
+        bad.client = httpx.AsyncClient(base_url=bad.url, transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+        await HealthMonitor({"ocr": pool}, timeout_for=lambda name: 1.0).probe(pool, bad)
+        assert bad.healthy and bad.consecutive_errors == 0
+
+    asyncio.run(main())
+
+
+def test_a_success_resets_the_error_streak():
+    r = replica("http://r")
+    pool = ReplicaPool("ocr", [r], eject_after=2)
+    pool.start(r)
+    pool.finish(r, failed=True)
+    pool.start(r)
+    pool.finish(r)
+    pool.start(r)
+    pool.finish(r, failed=True)
+    assert not r.ejected and r.errors == 2 and r.consecutive_errors == 1
+
+
+def test_5xx_answers_count_as_failures():
+    statuses = iter([500, 503, 404, 200])
+    r = replica("http://r", handler=lambda request: httpx.Response(next(statuses)))
+    pool = ReplicaPool("ocr", [r], eject_after=3)
+
+    async def main():
+        return [(await pool.request("POST", "/ocr"))[0].status_code for _ in range(4)]
+
+    assert asyncio.run(main()) == [500, 503, 404, 200]
+    # 404 is the caller's error, not the replica's: it ends the streak like a success
+    assert r.errors == 2 and r.consecutive_errors == 0 and r.inflight == 0
+
+
+def slow_handler(seconds: float):
+    async def handler(request):
+        await asyncio.sleep(seconds)
+        return httpx.Response(200)
+
+    return handler
+
+
+def test_probe_deadline_marks_slow_replicas_unhealthy():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    fast = replica("http://fast")
+    slow = replica("http://slow", handler=slow_handler(5))
+    down = replica("http://down", handler=refuse)
+    pool = ReplicaPool("ocr", [fast, slow, down])
+    monitor = HealthMonitor({"ocr": pool}, timeout_for=lambda name: 10.0)
+
+    start = time.perf_counter()
+    asyncio.run(monitor.probe_all(deadline=0.2))
+    assert time.perf_counter() - start < 1.0
+    assert fast.health.available and fast.health.error is None
+    assert not slow.health.available and slow.health.error == "Deadline exceeded"
+    assert slow.health.consecutive_failures == 1
+    assert not down.health.available and "refused" in down.health.error
+
+
+def test_replicas_are_probed_concurrently():
+    replicas = [replica(f"http://r{i}", healthy=False, handler=slow_handler(0.2)) for i in range(5)]
+    pools = {"ocr": ReplicaPool("ocr", replicas[:3]), "tts": ReplicaPool("tts", replicas[3:])}
+    start = time.perf_counter()
+    asyncio.run(HealthMonitor(pools, timeout_for=lambda name: 1.0).probe_all())
+    # One round takes as long as the slowest probe, not the sum
+    assert time.perf_counter() - start < 0.6
+    assert all(r.health.available for r in replicas)
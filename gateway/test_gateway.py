@@ -0,0 +1,217 @@
+"""
+End-to-end tests of the gateway app against stub tool replicas (FastAPI apps
+served over `httpx.ASGITransport`, no network): routing through `/invoke` and
+`/proxy`, ejection of a failing replica and re-admission by a health probe,
+and `/invoke/batch`:
+
+    uv run pytest test_gateway.py
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+
+import main
+from main import ToolConfig
+
+REPLICAS = ["http://r0", "http://r1", "http://r2"]
+BATCH_CONCURRENCY = 2
+
+# Calls of `/slow` running right now, and the most seen at once, across all replicas
+active = {"now": 0, "max": 0}
+
+
+def stub_tool(name: str) -> FastAPI:
+    """A tool replica; set `app.state.status` to make its calls fail, `health_delay` to slow its probes."""
+    app = FastAPI()
+    app.state.status = 200
+
+    app.state.health_delay = 0.0
+
+    @app.get("/health")
+    async def health():
+        await asyncio.sleep(app.state.health_delay)
+        return {"status": "ok"}
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        if app.state.status != 200:
+            return JSONResponse({"detail": "boom"}, status_code=app.state.status)
+        return {"replica": name, "params": await request.json()}
+
+    @app.post("/slow")
+    async def slow(request: Request):
+        params = await request.json()
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        try:
+            await asyncio.sleep(params.get("delay", 0))
+        finally:
+            active["now"] -= 1
+        return {"n": params["n"]}
+
+    @app.post("/html")
+    async def html():
+        return HTMLResponse("<html><body>502 Bad Gateway</body></html>", status_code=502)
+
+    @app.get("/files/{path}")
+    async def files(path: str):
+        if app.state.status != 200:
+            return PlainTextResponse("boom", status_code=app.state.status)
+        return PlainTextResponse(f"{name}:{path}")
+
+    return app
+
+
+@pytest.fixture
+def gateway(monkeypatch, tmp_path):
+    """TestClient of the gateway with tool `echo` on three stub replicas; yields (client, stubs by URL)."""
+    stubs = {url: stub_tool(url.removeprefix("http://")) for url in REPLICAS}
+
+    def create_client(tool_name, endpoint):
+        return httpx.AsyncClient(base_url=endpoint, transport=httpx.ASGITransport(app=stubs[endpoint]))
+
+    monkeypatch.setattr(main, "TOOL_REGISTRY", {"echo": REPLICAS})
+    config = ToolConfig(eject_after=2, eject_seconds=600, batch_concurrency=BATCH_CONCURRENCY)
+    monkeypatch.setattr(main, "TOOL_CONFIG", {"echo": config})
+    active.update(now=0, max=0)
+    monkeypatch.setattr(main, "create_client", create_client)
+    monkeypatch.setattr(main, "JOBS_DB", str(tmp_path / "jobs.db"))
+    # Probes only run at startup and for /tools?fresh=true
+    monkeypatch.setattr(main.health_monitor, "interval", 3600)
+    with TestClient(main.app) as client:
+        yield client, stubs
+
+
+def invoke(client: TestClient, n: int = 0) -> httpx.Response:
+    return client.post("/invoke", json={"tool": "echo", "method": "echo", "params": {"n": n}})
+
+
+def replicas(client: TestClient) -> dict[str, dict]:
+    return {r["url"]: r for r in client.get("/routing").json()["echo"]["replicas"]}
+
+
+def test_invoke_and_proxy_are_spread_across_replicas(gateway):
+    client, _ = gateway
+    seen = set()
+    for n in range(60):
+        resp = invoke(client, n)
+        assert resp.status_code == 200
+        replica = resp.headers["x-gateway-replica"]
+        assert resp.json() == {"replica": replica.removeprefix("http://"), "params": {"n": n}}
+        seen.add(replica)
+    assert seen == set(REPLICAS)
+
+    seen = set()
+    for _ in range(60):
+        resp = client.get("/proxy/echo/files/report.pdf")
+        assert resp.status_code == 200
+        assert resp.text == f"{resp.headers['x-gateway-replica'].removeprefix('http://')}:report.pdf"
+        seen.add(resp.headers["x-gateway-replica"])
+    assert seen == set(REPLICAS)
+    assert all(r["inflight"] == 0 for r in replicas(client).values())
+
+
+def test_a_replica_answering_5xx_is_ejected_and_readmitted(gateway):
+    client, stubs = gateway
+    stubs["http://r1"].state.status = 500
+
+    failures = 0
+    for n in range(200):
+        resp = invoke(client, n)
+        if resp.headers["x-gateway-replica"] == "http://r1":
+            assert resp.status_code == 500
+            failures += 1
+        if failures == 2:
+            break
+    routing = replicas(client)
+    assert routing["http://r1"]["ejected"] and not routing["http://r1"]["healthy"]
+    assert routing["http://r1"]["errors"] == 2
+
+    # Ejected: neither /invoke nor /proxy routes to it
+    for n in range(30):
+        assert invoke(client, n).headers["x-gateway-replica"] != "http://r1"
+        assert client.get("/proxy/echo/files/a").headers["x-gateway-replica"] != "http://r1"
+
+    # The replica recovers; the next successful probe re-admits it
+    stubs["http://r1"].state.status = 200
+    tools = client.get("/tools", params={"fresh": True}).json()
+    assert tools[0]["available"]
+    assert not replicas(client)["http://r1"]["ejected"]
+    assert "http://r1" in {invoke(client, n).headers["x-gateway-replica"] for n in range(60)}
+
+
+def test_proxied_5xx_answers_count_as_failures(gateway):
+    client, stubs = gateway
+    stubs["http://r2"].state.status = 503
+    for _ in range(200):
+        if replicas(client)["http://r2"]["ejected"]:
+            break
+        resp = client.get("/proxy/echo/files/a")
+        if resp.headers["x-gateway-replica"] == "http://r2":
+            assert resp.status_code == 503 and resp.text == "boom"
+    assert replicas(client)["http://r2"]["ejected"]
+
+
+def batch(client: TestClient, calls: list[tuple[str, str, dict]], **options) -> httpx.Response:
+    requests = [{"tool": tool, "method": method, "params": params} for tool, method, params in calls]
+    return client.post("/invoke/batch", json={"requests": requests, **options})
+
+
+def test_batch_limits_concurrency_per_tool(gateway):
+    client, _ = gateway
+    resp = batch(client, [("echo", "slow", {"n": n, "delay": 0.05}) for n in range(8)])
+    assert resp.status_code == 200
+    assert [item["result"] for item in resp.json()] == [{"n": n} for n in range(8)]
+    assert active["max"] == BATCH_CONCURRENCY
+
+
+def test_batch_stream_yields_results_in_completion_order(gateway):
+    client, _ = gateway
+    # Two run at once: n=1 finishes first and frees its slot for n=2, which beats n=0
+    calls = [("echo", "slow", {"n": 0, "delay": 0.4}), ("echo", "slow", {"n": 1, "delay": 0}),
+             ("echo", "slow", {"n": 2, "delay": 0.1})]
+    resp = batch(client, calls, stream=True)
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["index"] for line in lines] == [1, 2, 0]
+    assert [line["result"] for line in lines] == [{"n": 1}, {"n": 2}, {"n": 0}]
+
+    # Without streaming, the same calls come back in request order
+    assert [item["index"] for item in batch(client, calls).json()] == [0, 1, 2]
+
+
+def test_batch_reports_failing_items_without_failing_the_rest(gateway):
+    client, _ = gateway
+    resp = batch(client, [
+        ("echo", "slow", {"n": 0}),
+        ("echo", "html", {}),
+        ("missing", "ocr", {}),
+        ("echo", "slow", {"n": 3}),
+    ])
+    assert resp.status_code == 200
+    items = resp.json()
+    assert [item["status_code"] for item in items] == [200, 502, 404, 200]
+    assert items[0]["result"] == {"n": 0} and items[3]["result"] == {"n": 3}
+    # A non-JSON answer keeps its status and the start of its body
+    assert items[1]["result"] is None and "502 Bad Gateway" in items[1]["error"]
+    assert items[2]["error"] == "Tool 'missing' not found"
+
+
+def test_fresh_tools_listing_is_bounded_by_the_deadline(gateway, monkeypatch):
+    client, stubs = gateway
+    monkeypatch.setattr(main, "HEALTH_FRESH_DEADLINE", 0.3)
+    stubs["http://r2"].state.health_delay = 5
+
+    resp = client.get("/tools", params={"fresh": True})
+    assert resp.elapsed.total_seconds() < 2
+    [tool] = resp.json()
+    assert tool["available"]
+    routing = replicas(client)
+    assert not routing["http://r2"]["healthy"] and routing["http://r0"]["healthy"]
+    # An unhealthy replica gets no traffic
+    assert "http://r2" not in {invoke(client, n).headers["x-gateway-replica"] for n in range(30)}
@@ -1,40 +1,227 @@
+import contextlib
 import logging
 import uvicorn
-from typing import Optional
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Sequence, Union
+from urllib.parse import urlsplit
 from google.adk.agents.base_agent import BaseAgent
-from google.adk.a2a.utils.agent_to_a2a import to_a2a
+from google.adk.sessions import BaseSessionService
+from google.adk.agents.run_config import StreamingMode
+
+# An agent, or a zero-argument coroutine function returning one (resolved at startup,
+# e.g. after an MCP toolset has listed its tools)
+AgentSource = Union[BaseAgent, Callable[[], Awaitable[BaseAgent]]]
+
+
+def streaming_request_converter(request, part_converter):
+    """A2A request -> ADK run request with SSE streaming, so partial text is forwarded as it is generated."""
+    from google.adk.a2a.converters.request_converter import convert_a2a_request_to_agent_run_request
+
+    run_request = convert_a2a_request_to_agent_run_request(request, part_converter)
+    run_request.run_config.streaming_mode = StreamingMode.SSE
+    return run_request
+
+
+def build_runner(agent: BaseAgent, session_service: Optional[BaseSessionService] = None):
+    """Runner with the same in-memory services as `to_a2a`, except for the session backend."""
+    from google.adk.artifacts import InMemoryArtifactService
+    from google.adk.auth.credential_service.in_memory_credential_service import InMemoryCredentialService
+    from google.adk.memory import InMemoryMemoryService
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    return Runner(
+        app_name=agent.name or "adk_agent",
+        agent=agent,
+        artifact_service=InMemoryArtifactService(),
+        session_service=session_service or InMemorySessionService(),
+        memory_service=InMemoryMemoryService(),
+        credential_service=InMemoryCredentialService(),
+    )
+
+
+def a2a_app(
+    agent: AgentSource,
+    rpc_url: str,
+    agent_card: Optional[str] = None,
+    session_service: Optional[BaseSessionService] = None,
+    streaming: bool = True,
+):
+    """
+    A2A Starlette app for one agent (what ADK's `to_a2a` builds, plus options).
+
+    With `streaming` the executor runs the agent in SSE streaming mode:
+    `message/stream` clients receive each text delta as a `working` status
+    update, and the aggregated answer is still sent as the final artifact.
+    `agent` may be a coroutine function; it is awaited once, at startup.
+    Routes are added in the app's lifespan, so a host mounting this app must
+    run that lifespan (see `a2a_host_app`). A2A tasks are kept in memory, in
+    this process: serve the app from one process (not several workers).
+    """
+    from a2a.server.apps import A2AStarletteApplication
+    from a2a.server.request_handlers import DefaultRequestHandler
+    from a2a.server.tasks import InMemoryTaskStore
+    from a2a.types import AgentCapabilities
+    from google.adk.a2a.converters.request_converter import convert_a2a_request_to_agent_run_request
+    from google.adk.a2a.executor.a2a_agent_executor import A2aAgentExecutor, A2aAgentExecutorConfig
+    from google.adk.a2a.utils.agent_card_builder import AgentCardBuilder
+    from google.adk.a2a.utils.agent_to_a2a import _load_agent_card
+    from starlette.applications import Starlette
+
+    resolved: list[BaseAgent] = []
+
+    async def resolve_agent() -> BaseAgent:
+        if not resolved:
+            resolved.append(agent if isinstance(agent, BaseAgent) else await agent())
+        return resolved[0]
+
+    async def create_runner():
+        return build_runner(await resolve_agent(), session_service)
+
+    converter = streaming_request_converter if streaming else convert_a2a_request_to_agent_run_request
+    executor = A2aAgentExecutor(runner=create_runner, config=A2aAgentExecutorConfig(request_converter=converter))
+    request_handler = DefaultRequestHandler(agent_executor=executor, task_store=InMemoryTaskStore())
+    provided_agent_card = _load_agent_card(agent_card)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        if provided_agent_card is not None:
+            card = provided_agent_card
+            card.capabilities.streaming = streaming
+        else:
+            card = await AgentCardBuilder(
+                agent=await resolve_agent(),
+                rpc_url=rpc_url,
+                capabilities=AgentCapabilities(streaming=streaming),
+            ).build()
+            # The builder drops the trailing slash; "/ocr" would get a redirect from a mounted app
+            card.url = rpc_url
+        A2AStarletteApplication(agent_card=card, http_handler=request_handler).add_routes_to_app(app)
+        app.state.agent_card = card
+        yield
+
+    return Starlette(lifespan=lifespan)
+
 
 def serve_agent(
     agent: BaseAgent,
     host: str = "0.0.0.0",
     port: int = 8000,
     protocol: str = "http",
-    agent_card: Optional[str] = None
+    agent_card: Optional[str] = None,
+    streaming: bool = True,
+    session_service: Optional[BaseSessionService] = None,
 ):
     """
     Universally wrap any ADK agent as an A2A server using Starlette and Uvicorn.
-    
+
     Args:
         agent: The BaseAgent instance to serve.
         host: Host interface to bind to.
         port: Port to listen on.
         protocol: Protocol (http/https).
         agent_card: Optional path to a custom agent card JSON file.
+        streaming: Stream text deltas to `message/stream` clients (see `a2a_app`).
+        session_service: Session backend (default: in-memory, unbounded). Long-running
+            servers should pass a `shared.session_store.BoundedSessionService`.
     """
     logging.info(f"🚀 Wrapping agent '{agent.name}' as A2A server on {protocol}://{host}:{port}")
-    
-    # Use the official ADK to_a2a utility
-    app = to_a2a(
-        agent=agent,
-        host=host,
-        port=port,
-        protocol=protocol,
-        agent_card=agent_card
+
+    app = a2a_app(
+        agent,
+        rpc_url=f"{protocol}://{host}:{port}/",
+        agent_card=agent_card,
+        session_service=session_service,
+        streaming=streaming,
     )
-    
+
     # Start the Uvicorn server
     config = uvicorn.Config(app, host=host, port=port, log_level="info")
     server = uvicorn.Server(config)
-    
+
     # Since this is usually called in an async context or at the end of a script
     return server
+
+
+@dataclass
+class AgentMount:
+    """
+    One agent of a multi-agent host.
+
+    Args:
+        agent: The agent, or a coroutine function building it at startup.
+        path: URL prefix (e.g. "/ocr"); the agent card is then at
+            `/ocr/.well-known/agent-card.json` and JSON-RPC at `POST /ocr/`.
+        host: Virtual host instead of a prefix (e.g. "ocr.agents.local").
+        agent_card: Optional path to a custom agent card JSON file.
+        session_service: Session backend of this agent (default: in-memory).
+    """
+
+    agent: AgentSource
+    path: str = ""
+    host: Optional[str] = None
+    agent_card: Optional[str] = None
+    session_service: Optional[BaseSessionService] = None
+
+
+def a2a_host_app(
+    mounts: Sequence[AgentMount],
+    public_url: str = "http://localhost:8000",
+    streaming: bool = True,
+    lifespan: Optional[Callable] = None,
+):
+    """
+    One ASGI app serving several A2A agents, each under its own prefix or virtual host.
+
+    Hosted agents share the process: imports, the LiteLLM client pool (litellm
+    caches one HTTP client per endpoint / key) and MCP connections are paid
+    for once instead of once per agent server. `GET /agents` lists the hosted
+    agents and their card URLs.
+
+    Args:
+        mounts: The agents to host.
+        public_url: Base URL clients use; agent card RPC URLs are derived from it.
+        streaming: See `a2a_app`.
+        lifespan: Optional app-wide lifespan (e.g. opening MCP toolsets), entered
+            before the agents are resolved and their routes added.
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Host, Mount, Route
+
+    base = urlsplit(public_url)
+    routes = []
+    apps = []
+    listing = []
+    for mount in mounts:
+        if mount.host:
+            port = f":{base.port}" if base.port else ""
+            rpc_url = f"{base.scheme}://{mount.host}{port}/"
+        else:
+            if not mount.path.startswith("/") or mount.path == "/":
+                raise ValueError(f"Agent mount path must be a non-root prefix like '/ocr', got {mount.path!r}")
+            rpc_url = f"{public_url.rstrip('/')}{mount.path.rstrip('/')}/"
+        app = a2a_app(mount.agent, rpc_url, mount.agent_card, mount.session_service, streaming)
+        apps.append(app)
+        listing.append({"rpc_url": rpc_url, "agent_card": f"{rpc_url}.well-known/agent-card.json", "app": app})
+        routes.append(Host(mount.host, app=app) if mount.host else Mount(mount.path.rstrip("/"), app=app))
+
+    async def agents(request):
+        return JSONResponse([
+            {"name": item["app"].state.agent_card.name, "rpc_url": item["rpc_url"], "agent_card": item["agent_card"]}
+            for item in listing
+        ])
+
+    @contextlib.asynccontextmanager
+    async def host_lifespan(app):
+        async with contextlib.AsyncExitStack() as stack:
+            if lifespan is not None:
+                await stack.enter_async_context(lifespan(app))
+            # Starlette does not run the lifespan of mounted apps; run each one here
+            for sub_app in apps:
+                await stack.enter_async_context(sub_app.router.lifespan_context(sub_app))
+            logging.info(f"🚀 Hosting {len(apps)} A2A agents: {[item['rpc_url'] for item in listing]}")
+            yield
+
+    # /agents goes first so a catch-all virtual host cannot shadow it
+    return Starlette(routes=[Route("/agents", agents), *routes], lifespan=host_lifespan)
@@ -0,0 +1,128 @@
+"""
+Compare OCR inference backends: load time, pages/sec, batch latency and peak memory.
+
+Each backend runs in a fresh subprocess, so its peak RSS (and peak GPU
+memory) is measured on its own. Pages go through the same preprocessing as
+the OCR servers (OCR_MAX_PIXELS, OCR_TILE, ...); a warm-up batch is run
+before timing. A backend is `name[,field=value...]` with fields of
+`BackendConfig`, on top of the OCR_* environment:
+
+    python shared/bench_ocr_backends.py --backend hf,device=cuda \\
+        --backend hf,device=cpu,threads=16 --backend hf,device=cpu,quantize=int8 \\
+        --backend openai,base_url=http://vllm:8000/v1 --pages 16 --batch-size 4
+    python shared/bench_ocr_backends.py --backend fake --input scan.pdf
+"""
+import argparse
+import dataclasses
+import json
+import subprocess
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+if str(Path(__file__).resolve().parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from shared.ocr_backends import BackendConfig, create_backend
+from shared.ocr_documents import batched, iter_pages
+from shared.ocr_model import parse_sizes, warmup_image
+from shared.ocr_preprocess import PreprocessConfig, preprocess
+
+
+def parse_backend(spec: str) -> BackendConfig:
+    """"hf,device=cpu,threads=8" -> BackendConfig from the environment with those fields replaced."""
+    name, *fields = spec.split(",")
+    types = {field.name: field.type for field in dataclasses.fields(BackendConfig)}
+    overrides = {"backend": name}
+    for item in fields:
+        key, _, value = item.partition("=")
+        if key not in types:
+            raise SystemExit(f"Unknown backend field {key!r}, expected one of {', '.join(types)}")
+        overrides[key] = types[key](value) if types[key] in (int, float) else value
+    return dataclasses.replace(BackendConfig.from_env(), **overrides)
+
+
+def load_pages(args) -> list:
+    if args.input:
+        # Only the pages benchmarked are rasterised
+        pages = [page.convert("RGB") for page in islice(iter_pages(args.input), args.pages)]
+    else:
+        pages = [warmup_image(parse_sizes(args.size)[0]) for _ in range(args.pages)]
+    config = PreprocessConfig.from_env()
+    return [tile for page in pages for tile in preprocess(page, config).tiles]
+
+
+def run_case(spec: str, args):
+    from chandra.model.schema import BatchInputItem
+
+    config = parse_backend(spec)
+    start = time.perf_counter()
+    backend = create_backend(config)
+    load_s = time.perf_counter() - start
+
+    images = load_pages(args)
+    batches = [
+        [BatchInputItem(image=image, prompt_type="ocr_layout") for image in batch]
+        for batch in batched(images, args.batch_size)
+    ]
+    backend.generate(batches[0])
+
+    latencies, tokens, errors = [], 0, 0
+    start = time.perf_counter()
+    for batch in batches:
+        batch_start = time.perf_counter()
+        results = backend.generate(batch)
+        latencies.append((time.perf_counter() - batch_start) * 1000)
+        tokens += sum(result.token_count for result in results)
+        errors += sum(1 for result in results if result.error)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    print(json.dumps({
+        **backend.info(),
+        **backend.memory(),
+        "load_s": load_s,
+        "images": len(images),
+        "pages_per_s": len(images) / elapsed,
+        "tokens_per_s": tokens / elapsed,
+        "p50_batch_ms": latencies[len(latencies) // 2],
+        "errors": errors,
+    }))
+    backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", help="Backend spec (repeatable, default: OCR_BACKEND)")
+    parser.add_argument("--pages", type=int, default=8, help="Pages to OCR")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per generate call")
+    parser.add_argument("--input", help="PDF / TIFF / image to take pages from (default: synthetic pages)")
+    parser.add_argument("--size", default="1240x1754", help="Synthetic page size (A4 at 150 DPI)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case, args)
+        return
+
+    specs = args.backend or [BackendConfig.from_env().backend]
+    width = max(len("backend"), *map(len, specs))
+    print(f"{'backend':<{width}} {'load s':>7} {'pages/s':>8} {'tok/s':>8} {'p50 batch ms':>13} "
+          f"{'peak RSS MB':>12} {'peak GPU MB':>12} {'errors':>7}")
+    for spec in specs:
+        out = subprocess.run(
+            [sys.executable, __file__, "--case", spec, *sys.argv[1:]],
+            capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(f"{spec:<{width}} failed: {(out.stderr.strip().splitlines() or ['?'])[-1]}")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        gpu = f"{result['peak_gpu_mb']:.0f}" if "peak_gpu_mb" in result else "-"
+        print(f"{spec:<{width}} {result['load_s']:>7.1f} {result['pages_per_s']:>8.2f} {result['tokens_per_s']:>8.1f} "
+              f"{result['p50_batch_ms']:>13.0f} {result['peak_rss_mb']:>12.0f} {gpu:>12} {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Soak test: RSS while creating many agent sessions.
+
+Each session gets the events of one OCR pipeline run (user message, tool
+call, tool response with OCR text, final markdown answer) and is read back
+once, like `serve_a2a` handling one request per session. Prints RSS every
+10% of the run for ADK's `InMemorySessionService` and `BoundedSessionService`.
+
+    python shared/bench_session_service.py --sessions 100000 --backend sqlite
+    python shared/bench_session_service.py --sessions 20000 --backend memory
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if str(Path(__file__).resolve().parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import InMemorySessionService
+from google.genai.types import Content, FunctionCall, FunctionResponse, Part
+
+from shared.session_store import BoundedSessionService
+
+OCR_TEXT = "\n".join(f"| item {i} | {i * 3.5:.2f} | note {i} |" for i in range(40))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def pipeline_events(invocation_id: str, image_path: str) -> list[Event]:
+    return [
+        Event(invocation_id=invocation_id, author="user",
+              content=Content(role="user", parts=[Part(text=f"請使用 ocr tool 對這個圖片進行 OCR 辨識，圖片路徑是：{image_path}")])),
+        Event(invocation_id=invocation_id, author="ocr_agent",
+              content=Content(role="model", parts=[Part(function_call=FunctionCall(name="ocr", args={"image_path": image_path}))])),
+        Event(invocation_id=invocation_id, author="ocr_agent",
+              content=Content(role="user", parts=[Part(function_response=FunctionResponse(name="ocr", response={"result": OCR_TEXT}))]),
+              actions=EventActions(state_delta={"ocr_result": OCR_TEXT})),
+        Event(invocation_id=invocation_id, author="refine_agent",
+              content=Content(role="model", parts=[Part(text="# Result\n\n" + OCR_TEXT)])),
+    ]
+
+
+async def soak(service, sessions: int, users: int):
+    start = time.perf_counter()
+    step = max(1, sessions // 10)
+    print(f"{'sessions':>9} {'RSS MB':>8} {'sessions/s':>11}")
+    for i in range(sessions):
+        session = await service.create_session(
+            app_name="ocr_md_gen_agent", user_id=f"user_{i % users}", state={"image_path": f"/data/{i}.png"}
+        )
+        for event in pipeline_events(f"e-{i}", f"/data/{i}.png"):
+            await service.append_event(session, event)
+        await service.get_session(app_name="ocr_md_gen_agent", user_id=session.user_id, session_id=session.id)
+        if (i + 1) % step == 0:
+            print(f"{i + 1:>9} {rss_mb():>8.1f} {(i + 1) / (time.perf_counter() - start):>11.0f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="BoundedSessionService size cap")
+    parser.add_argument("--db", help="sqlite file (default: a temporary file)")
+    args = parser.parse_args()
+
+    print(f"backend={args.backend} start RSS {rss_mb():.1f} MB")
+    if args.backend == "memory":
+        await soak(InMemorySessionService(), args.sessions, args.users)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "sessions.db")
+        # sweep_interval=0: enforce the size cap on every flush so the run shows the steady state
+        service = BoundedSessionService(path, max_sessions=args.max_sessions, sweep_interval=0)
+        await soak(service, args.sessions, args.users)
+        service.close()
+        print(f"stats {service.stats()}, db {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,350 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
+
+from shared.inference_executor import InferenceQueueFull
+
+LANES = ("interactive", "bulk")
+ANONYMOUS = "anonymous"
+
+
+class TenantQueueFull(InferenceQueueFull):
+    """Raised when one tenant has too many requests waiting (other tenants are still admitted)."""
+
+
+@dataclass
+class TenantPolicy:
+    weight: float = 1.0
+    max_concurrency: int = 0  # cost units in flight (0 = unlimited)
+    max_queue: int = 0  # requests waiting (0 = unlimited)
+    api_keys: list[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Caller:
+    tenant: str
+    lane: str = "interactive"
+
+
+@dataclass
+class _Waiter:
+    tenant: str
+    lane: str
+    cost: int  # charged to the tenant's share
+    units: int  # capacity held while running (cost, at most the capacity)
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class _Flow:
+    """The waiters of one tenant in one lane, and the flow's stride-scheduling pass."""
+
+    queue: deque = field(default_factory=deque)
+    passed: float = 0.0
+
+
+@dataclass
+class _TenantState:
+    policy: TenantPolicy
+    running: int = 0
+    waiting: int = 0
+    dispatched: int = 0
+    rejected: int = 0
+    wait_ms: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+
+class FairScheduler:
+    """
+    Weighted fair queueing in front of a shared model.
+
+    Callers wait for a slot with `async with scheduler.slot(tenant, lane, cost)`;
+    at most `capacity` cost units (e.g. images or tiles) run at once. When
+    the model is busy, slots go out in two levels of stride scheduling:
+    first between lanes (`interactive` gets `1 - bulk_share` of the
+    dispatched cost while both lanes wait, `bulk` the rest, so bulk work
+    never starves), then between the tenants waiting in that lane, in
+    proportion to their weights. A tenant uploading 500 pages therefore
+    gets its share instead of the whole model.
+
+    Per tenant, `max_concurrency` caps the cost units in flight and
+    `max_queue` the waiting requests (`TenantQueueFull`, a subclass of
+    `InferenceQueueFull`, is raised beyond it). `max_queue` also bounds the
+    total number of waiting requests.
+
+    Tenants not listed in `tenants` (named by `X-OCR-Tenant`) are tracked
+    only while they have requests waiting or running, and at most
+    `max_tenants` of them at once; beyond that a new name shares the
+    `anonymous` tenant, so made-up names neither grow memory nor buy
+    extra shares of the model.
+
+    Args:
+        capacity: Cost units allowed in flight.
+        tenants: Policies by tenant name; other tenants get `default`.
+        default: Policy of tenants not listed in `tenants`.
+        bulk_share: Share of the model the bulk lane gets when both lanes wait.
+        max_queue: Total waiting requests before `InferenceQueueFull` (0 = unlimited).
+        max_tenants: Unconfigured tenants tracked at once.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1,
+        tenants: Optional[dict[str, TenantPolicy]] = None,
+        default: Optional[TenantPolicy] = None,
+        bulk_share: float = 0.1,
+        max_queue: int = 0,
+        max_tenants: int = 64,
+    ):
+        self.capacity = max(1, capacity)
+        self.policies = dict(tenants or {})
+        self.default = default or TenantPolicy()
+        self.max_queue = max(0, max_queue)
+        self.max_tenants = max(1, max_tenants)
+        share = min(max(bulk_share, 0.01), 0.99)
+        self.lane_weights = {"interactive": 1 - share, "bulk": share}
+        self._keys = {key: name for name, policy in self.policies.items() for key in policy.api_keys}
+
+        self._lane_pass = {lane: 0.0 for lane in LANES}
+        # Virtual time of each level: the pass of the last dispatched lane / tenant flow
+        self._lane_vtime = 0.0
+        self._flow_vtime = {lane: 0.0 for lane in LANES}
+        self._flows: dict[str, dict[str, _Flow]] = {lane: {} for lane in LANES}
+        self._tenants: dict[str, _TenantState] = {}
+        self._in_use = 0
+        self._waiting = 0
+        self._lane_wait_ms = {lane: deque(maxlen=1024) for lane in LANES}
+
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, capacity: int, max_queue: int = 0) -> "FairScheduler":
+        """
+        Scheduler configured from `OCR_TENANTS` (JSON file path or inline JSON),
+        `OCR_BULK_SHARE` and `OCR_MAX_TENANTS`.
+
+        `OCR_TENANTS` format:
+            {
+                "default": {"weight": 1, "max_concurrency": 4, "max_queue": 32},
+                "tenants": {"agents": {"weight": 4, "api_keys": ["..."]}, "batch": {"weight": 1, "max_concurrency": 2}}
+            }
+        """
+        config = {}
+        raw = os.environ.get("OCR_TENANTS", "").strip()
+        if raw:
+            if raw.startswith("{"):
+                config = json.loads(raw)
+            else:
+                with open(raw) as f:
+                    config = json.load(f)
+        return cls(
+            capacity=capacity,
+            tenants={name: TenantPolicy(**policy) for name, policy in config.get("tenants", {}).items()},
+            default=TenantPolicy(**config.get("default", {})),
+            bulk_share=float(os.environ.get("OCR_BULK_SHARE", "0.1")),
+            max_queue=max_queue,
+            max_tenants=int(os.environ.get("OCR_MAX_TENANTS", "64")),
+        )
+
+    def caller(self, headers: Mapping[str, str], default_lane: str = "interactive") -> Caller:
+        """
+        Identify the caller of a request from its headers.
+
+        The tenant is the one owning the API key (`X-API-Key` or
+        `Authorization: Bearer`), `anonymous` for an unknown key, else the
+        `X-OCR-Tenant` header (e.g. an agent's name; tenants configured with
+        API keys cannot be claimed this way), else `anonymous`.
+        `X-OCR-Lane: interactive|bulk` overrides the endpoint's default lane.
+        """
+        key = headers.get("x-api-key")
+        authorization = headers.get("authorization", "")
+        if not key and authorization.lower().startswith("bearer "):
+            key = authorization[7:].strip()
+        if key:
+            # Unknown keys share one tenant: a fresh key per request must not buy a fresh share
+            tenant = self._keys.get(key, ANONYMOUS)
+        else:
+            tenant = headers.get("x-ocr-tenant") or ANONYMOUS
+            if tenant in self.policies and self.policies[tenant].api_keys:
+                tenant = ANONYMOUS
+        lane = headers.get("x-ocr-lane", default_lane)
+        return Caller(tenant=tenant, lane=lane if lane in LANES else default_lane)
+
+    def _tenant(self, name: str) -> _TenantState:
+        state = self._tenants.get(name)
+        if state is None:
+            state = self._tenants[name] = _TenantState(self.policies.get(name, self.default))
+        return state
+
+    def _resolve(self, name: str) -> str:
+        """`name`, or `anonymous` when `max_tenants` unconfigured tenants are already active."""
+        if name in self._tenants or name in self.policies or name == ANONYMOUS:
+            return name
+        unconfigured = sum(1 for tenant in self._tenants if tenant not in self.policies)
+        return ANONYMOUS if unconfigured >= self.max_tenants else name
+
+    def _forget_idle(self, name: str):
+        # Configured tenants keep their counters; others are dropped once they have nothing in flight
+        state = self._tenants.get(name)
+        if state is not None and name not in self.policies and state.waiting == 0 and state.running == 0:
+            del self._tenants[name]
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, lane: str = "interactive", cost: int = 1):
+        """
+        Wait for the caller's turn, hold `cost` units of capacity while the block runs.
+
+        A cost above the capacity holds the whole capacity, and is still charged in full to the tenant.
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r}, expected one of {', '.join(LANES)}")
+        cost = max(1, cost)
+        units = min(cost, self.capacity)
+        tenant = self._resolve(tenant)
+        await self._acquire(tenant, lane, cost, units)
+        try:
+            yield
+        finally:
+            self._release(tenant, units)
+
+    async def _acquire(self, tenant: str, lane: str, cost: int, units: int):
+        state = self._tenant(tenant)
+        if state.policy.max_queue and state.waiting >= state.policy.max_queue:
+            state.rejected += 1
+            raise TenantQueueFull(f"Too many OCR requests waiting for tenant '{tenant}' ({state.waiting})")
+        if self.max_queue and self._waiting >= self.max_queue:
+            self.rejected += 1
+            self._forget_idle(tenant)
+            raise InferenceQueueFull(f"OCR queue is full ({self._waiting} waiting)")
+
+        waiter = _Waiter(tenant, lane, cost, units, asyncio.get_running_loop().create_future())
+        flows = self._flows[lane]
+        flow = flows.setdefault(tenant, _Flow())
+        # A tenant or lane becoming active starts at the current virtual time, so idle time earns no credit
+        if not flow.queue:
+            flow.passed = max(flow.passed, self._flow_vtime[lane])
+        if not self._lane_waiting(lane):
+            self._lane_pass[lane] = self._lane_vtime
+        flow.queue.append(waiter)
+        state.waiting += 1
+        self._waiting += 1
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller went away: give the slot back
+                self._release(tenant, units)
+            else:
+                self._discard(waiter)
+            raise
+
+    def _lane_waiting(self, lane: str) -> int:
+        return sum(len(flow.queue) for flow in self._flows[lane].values())
+
+    def _discard(self, waiter: _Waiter):
+        self._flows[waiter.lane][waiter.tenant].queue.remove(waiter)
+        self._prune(waiter.lane, waiter.tenant)
+        self._tenants[waiter.tenant].waiting -= 1
+        self._waiting -= 1
+        self._forget_idle(waiter.tenant)
+        self._dispatch()
+
+    def _eligible(self, flow: _Flow) -> bool:
+        waiter = flow.queue[0]
+        if waiter.future.done():
+            # Cancelled caller, removed by its own `_acquire`
+            return False
+        if self._in_use + waiter.units > self.capacity:
+            return False
+        state = self._tenants[waiter.tenant]
+        limit = state.policy.max_concurrency
+        return not limit or state.running == 0 or state.running + waiter.units <= limit
+
+    def _pick(self) -> Optional[_Waiter]:
+        """Lane with the lowest pass, then the tenant of that lane with the lowest pass."""
+        candidates = []
+        for lane in LANES:
+            flows = [(f.passed, name, f) for name, f in self._flows[lane].items() if f.queue and self._eligible(f)]
+            if flows:
+                candidates.append((self._lane_pass[lane], lane, min(flows, key=lambda item: (item[0], item[1]))))
+        if not candidates:
+            return None
+        _, lane, (_, tenant, flow) = min(candidates, key=lambda item: (item[0], LANES.index(item[1])))
+        waiter = flow.queue.popleft()
+        self._lane_vtime = self._lane_pass[lane]
+        self._flow_vtime[lane] = flow.passed
+        flow.passed += waiter.cost / max(self._tenants[tenant].policy.weight, 1e-6)
+        self._lane_pass[lane] += waiter.cost / self.lane_weights[lane]
+        self._prune(lane, tenant)
+        return waiter
+
+    def _prune(self, lane: str, tenant: str):
+        # An idle flow restarts at the virtual time anyway, so it need not be kept
+        if not self._flows[lane][tenant].queue:
+            del self._flows[lane][tenant]
+
+    def _dispatch(self):
+        while self._in_use < self.capacity:
+            waiter = self._pick()
+            if waiter is None:
+                return
+            state = self._tenants[waiter.tenant]
+            state.waiting -= 1
+            self._waiting -= 1
+            state.running += waiter.units
+            state.dispatched += 1
+            self._in_use += waiter.units
+            wait_ms = (time.perf_counter() - waiter.enqueued_at) * 1000
+            state.wait_ms.append(wait_ms)
+            self._lane_wait_ms[waiter.lane].append(wait_ms)
+            waiter.future.set_result(None)
+
+    def _release(self, tenant: str, units: int):
+        self._in_use -= units
+        self._tenants[tenant].running -= units
+        self._forget_idle(tenant)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        """Capacity in use, queue lengths, and per-tenant / per-lane wait times."""
+
+        def waits(samples: deque) -> dict:
+            ordered = sorted(samples)
+            if not ordered:
+                return {"samples": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+            return {
+                "samples": len(ordered),
+                "p50": round(ordered[int(0.50 * (len(ordered) - 1))], 3),
+                "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+                "max": round(ordered[-1], 3),
+            }
+
+        return {
+            "capacity": self.capacity,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+            "lanes": {
+                lane: {"waiting": self._lane_waiting(lane), "weight": round(self.lane_weights[lane], 3),
+                       "wait_ms": waits(self._lane_wait_ms[lane])}
+                for lane in LANES
+            },
+            "tenants": {
+                name: {
+                    "weight": state.policy.weight,
+                    "running": state.running,
+                    "waiting": state.waiting,
+                    "dispatched": state.dispatched,
+                    "rejected": state.rejected,
+                    "wait_ms": waits(state.wait_ms),
+                }
+                for name, state in sorted(self._tenants.items())
+            },
+        }
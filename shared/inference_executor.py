@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class InferenceQueueFull(Exception):
+    """Raised when an inference queue has no room for another request."""
+
+
+class InferenceExecutor:
+    """
+    Run blocking model calls on dedicated worker threads.
+
+    Keeps synchronous inference (e.g. `generate_hf`) off the event loop so
+    health checks and SSE keepalives stay responsive while the model is busy.
+    At most `max_workers` calls run at once and up to `max_pending` more may
+    wait; beyond that `run` raises `InferenceQueueFull` immediately instead of
+    queueing, so callers can answer with 429 / a busy error.
+
+    Args:
+        max_workers: Number of worker threads (1 for a single GPU model).
+        max_pending: Calls allowed to wait behind the running ones.
+        name: Thread name prefix.
+    """
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 16, name: str = "inference"):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(0, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_pending
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on a worker thread and await its result."""
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self.rejected += 1
+                raise InferenceQueueFull(
+                    f"Inference queue is full ({self._inflight}/{self.capacity} in flight)"
+                )
+            self._inflight += 1
+
+        # Released from the worker thread when the call really finishes, so a
+        # cancelled caller does not free a slot the GPU is still using.
+        future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        with self._lock:
+            self._inflight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "inflight": self._inflight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
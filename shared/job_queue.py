@@ -0,0 +1,488 @@
+import asyncio
+import ipaddress
+import json
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    webhook_url TEXT,
+    webhook_status TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, seq);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+# Priority classes, highest first; queued jobs run in (priority, submission) order
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+WEBHOOK_SCHEMES = ("http", "https")
+
+
+def resolve_host(host: str) -> list[str]:
+    """Addresses `host` resolves to (an IP literal resolves to itself)."""
+    return [info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)]
+
+
+def check_webhook_url(url: str, allowed_hosts: Optional[Iterable[str]] = None):
+    """
+    Raise `ValueError` unless `url` is an http(s) URL jobs may POST to.
+
+    With `allowed_hosts`, the host must be one of them: a hostname, or
+    `*.example.com` for any subdomain of example.com. Without, every address
+    the host resolves to must be public: loopback, private, link-local
+    (e.g. cloud metadata), reserved and multicast addresses are refused.
+    Resolves the host, so call it off the event loop.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in WEBHOOK_SCHEMES or not parsed.hostname:
+        raise ValueError(f"Invalid webhook_url {url!r}, expected an http(s) URL")
+    host = parsed.hostname.lower()
+    if allowed_hosts:
+        for allowed in allowed_hosts:
+            allowed = allowed.strip().lower()
+            if host == allowed or (allowed.startswith("*.") and host.endswith(allowed[1:])):
+                return
+        raise ValueError(f"webhook_url host {parsed.hostname!r} is not allowed")
+    try:
+        addresses = resolve_host(host)
+    except (OSError, UnicodeError) as e:
+        raise ValueError(f"webhook_url host {parsed.hostname!r} cannot be resolved: {e}")
+    for address in addresses:
+        # Scoped IPv6 addresses come back as "fe80::1%eth0"
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"webhook_url host {parsed.hostname!r} resolves to non-public address {ip}")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect could point the POST at a host the allow-list would reject
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class JobRetry(Exception):
+    """Raised by a job handler to put the job back in the queue (e.g. the backend answered 429)."""
+
+    def __init__(self, message: str = "", delay: float = 1.0):
+        super().__init__(message)
+        self.delay = delay
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str  # queued / running / succeeded / failed / cancelled
+    priority: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    result: Any = None
+    error: Optional[str] = None
+    webhook_url: Optional[str] = None
+    webhook_status: Optional[str] = None  # pending / delivered / failed
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobQueue:
+    """
+    Durable local job queue (sqlite) for work that outlives an HTTP request.
+
+    `submit` stores the job and returns at once; `concurrency` worker tasks
+    run queued jobs through `handler(kind, payload)` in priority order and
+    store its (JSON-serialisable) result. Clients read the job with `get`,
+    long-poll with `wait`, or pass a `webhook_url` that receives the finished
+    job as a JSON POST (retried with backoff).
+
+    Jobs, results and pending webhooks survive a restart: jobs that were
+    running when the process died are queued again, up to `max_attempts`
+    runs, then failed. A job handler raising `JobRetry` is queued again,
+    up to `max_retries` times, then failed. Finished jobs are deleted `retention` seconds after
+    they finish; `cleanup(job, payload)` is called for every job that
+    reaches a final state, to release inputs spooled next to the queue.
+
+    Webhook URLs must be http(s), and on `webhook_hosts` when that is set,
+    else resolve to public addresses only (`submit` raises `ValueError`
+    otherwise); the URL is checked again before every delivery, and
+    redirects are not followed.
+
+    The sqlite reads and writes run in a worker thread (`asyncio.to_thread`),
+    so the event loop is not blocked on the disk. One process per database
+    file.
+
+    Args:
+        path: sqlite file.
+        concurrency: Jobs run at the same time.
+        max_attempts: Runs allowed for a job interrupted by a restart.
+        max_retries: `JobRetry`s allowed per job (0 = unlimited).
+        retention: Seconds finished jobs are kept (0 keeps them forever).
+        webhook_retries: Delivery attempts per webhook.
+        webhook_timeout: Timeout of one delivery (seconds).
+        webhook_hosts: Optional allow-list of webhook hosts (see `check_webhook_url`).
+        cleanup: Optional callback for jobs reaching a final state.
+    """
+
+    def __init__(
+        self,
+        path: str = "jobs.db",
+        concurrency: int = 1,
+        max_attempts: int = 3,
+        max_retries: int = 720,
+        retention: float = 24 * 3600,
+        webhook_retries: int = 5,
+        webhook_timeout: float = 10.0,
+        webhook_hosts: Optional[Iterable[str]] = None,
+        cleanup: Optional[Callable[[Job, dict], None]] = None,
+    ):
+        self.path = path
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.max_retries = max(0, max_retries)
+        self.retention = retention
+        self.webhook_retries = max(1, webhook_retries)
+        self.webhook_timeout = webhook_timeout
+        self.webhook_hosts = [host for host in (webhook_hosts or []) if host.strip()]
+        self.cleanup = cleanup
+
+        # The connection is shared by the worker threads; `_lock` serialises its use
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "retries" not in columns:
+            # Databases created before max_retries existed
+            self._db.execute("ALTER TABLE jobs ADD COLUMN retries INTEGER NOT NULL DEFAULT 0")
+
+        self._handler: Optional[Callable[[str, dict], Awaitable[Any]]] = None
+        self._workers: list[asyncio.Task] = []
+        self._background: set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._done_events: dict[str, asyncio.Event] = {}
+        self._waiters: dict[str, int] = {}
+        self._last_sweep = 0.0
+
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.recovered = 0
+
+    async def submit(
+        self, kind: str, payload: dict, priority: str = "normal", webhook_url: Optional[str] = None
+    ) -> Job:
+        """Store a new job and wake a worker; raises `ValueError` for an unknown priority or a rejected webhook URL."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {', '.join(PRIORITIES)}")
+        if webhook_url:
+            await self.check_webhook_url(webhook_url)
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status="queued",
+            priority=priority,
+            created_at=time.time(),
+            webhook_url=webhook_url,
+            webhook_status="pending" if webhook_url else None,
+        )
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO jobs (id, kind, priority, payload, status, created_at, webhook_url, webhook_status)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, kind, PRIORITIES[priority], json.dumps(payload), job.status, job.created_at,
+             webhook_url, job.webhook_status),
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def check_webhook_url(self, url: str):
+        """`check_webhook_url` against this queue's `webhook_hosts`, in a thread (it resolves the host)."""
+        await asyncio.to_thread(check_webhook_url, url, self.webhook_hosts)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Long-poll: return the job once it is finished, or as it is after `timeout` seconds."""
+        job = await self.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        event = self._done_events.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # The last waiter removes the event, so polls of jobs that never finish do not pile up
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                if self._done_events.get(job_id) is event:
+                    del self._done_events[job_id]
+        return await self.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued job; running and finished jobs are returned unchanged."""
+        cancelled = await asyncio.to_thread(
+            self._write,
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        job = await self.get(job_id)
+        if cancelled:
+            await self._finished(job)
+        return job
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    async def start(self, handler: Callable[[str, dict], Awaitable[Any]]):
+        """Recover jobs interrupted by a restart, resend pending webhooks and start the workers."""
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        pending, exhausted = await asyncio.to_thread(self._recover)
+        for job in pending:
+            self._spawn(self._deliver(job))
+        for job in exhausted:
+            await self._finished(job)
+        if self.recovered:
+            print(f"♻️ Re-queued {self.recovered} interrupted jobs")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Stop the workers; running jobs are queued again on the next start."""
+        for task in [*self._workers, *self._background]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._background, return_exceptions=True)
+        self._workers.clear()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock, self._db:
+            return self._db.execute(sql, params).rowcount
+
+    def _get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, priority, created_at, started_at, finished_at, attempts, result, error,"
+                " webhook_url, webhook_status FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(
+            id=row[0], kind=row[1], status=row[2], priority=PRIORITY_NAMES.get(row[3], str(row[3])),
+            created_at=row[4], started_at=row[5], finished_at=row[6], attempts=row[7],
+            result=json.loads(row[8]) if row[8] is not None else None,
+            error=row[9], webhook_url=row[10], webhook_status=row[11],
+        )
+
+    def _recover(self) -> tuple[list[Job], list[Job]]:
+        """Fail jobs interrupted `max_attempts` times, queue the other running jobs again; returns (pending webhooks, failed)."""
+        with self._lock:
+            pending = self._db.execute(
+                f"SELECT id FROM jobs WHERE webhook_status = 'pending' AND status IN {FINISHED}"
+            ).fetchall()
+            exhausted = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND attempts >= ?", (self.max_attempts,)
+            ).fetchall()
+            with self._db:
+                self._db.executemany(
+                    "UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', finished_at = ?"
+                    " WHERE id = ?",
+                    [(time.time(), job_id) for (job_id,) in exhausted],
+                )
+                self.recovered = self._db.execute(
+                    "UPDATE jobs SET status = 'queued' WHERE status = 'running'"
+                ).rowcount
+        return [self._get(job_id) for (job_id,) in pending], [self._get(job_id) for (job_id,) in exhausted]
+
+    def _claim(self) -> Optional[tuple[str, str, dict]]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' AND run_after <= ?"
+                " ORDER BY priority, seq LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            with self._db:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (now, row[0]),
+                )
+        return row[0], row[1], json.loads(row[2])
+
+    def _retry(self, job_id: str, delay: float, error: Optional[str]) -> bool:
+        """Queue the job again after `delay` seconds; False (and the job failed) once it ran out of retries."""
+        with self._lock:
+            retries = self._db.execute("SELECT retries FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            with self._db:
+                if self.max_retries and retries >= self.max_retries:
+                    message = f"Gave up after {retries} retries" + (f": {error}" if error else "")
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                        (message, time.time(), job_id),
+                    )
+                    return False
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', attempts = attempts - 1, retries = retries + 1,"
+                    " run_after = ?, error = ? WHERE id = ?",
+                    (time.time() + delay, error, job_id),
+                )
+        return True
+
+    async def _worker(self):
+        while True:
+            await self._maybe_sweep()
+            claimed = await asyncio.to_thread(self._claim)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    # Also wakes up for retried jobs whose run_after has passed
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, kind, payload = claimed
+            try:
+                result = await self._handler(kind, payload)
+            except JobRetry as e:
+                if await asyncio.to_thread(self._retry, job_id, e.delay, str(e) or None):
+                    self.retried += 1
+                    continue
+                self.failed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                await self._finish(job_id, "failed", None, str(e) or type(e).__name__)
+            else:
+                self.completed += 1
+                await self._finish(job_id, "succeeded", json.dumps(result), None)
+            await self._finished(await self.get(job_id), payload)
+
+    async def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]):
+        await asyncio.to_thread(
+            self._write,
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, result, error, time.time(), job_id),
+        )
+
+    def _payload(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def _finished(self, job: Job, payload: Optional[dict] = None):
+        event = self._done_events.pop(job.id, None)
+        if event is not None:
+            event.set()
+        if self.cleanup is not None:
+            if payload is None:
+                payload = await asyncio.to_thread(self._payload, job.id)
+            try:
+                self.cleanup(job, payload)
+            except Exception as e:
+                print(f"⚠️ Job cleanup failed for {job.id}: {e}")
+        if job.webhook_url:
+            self._spawn(self._deliver(job))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _deliver(self, job: Job):
+        """POST the finished job to its webhook, with exponential backoff."""
+        body = json.dumps(job.to_dict()).encode()
+        delay = 1.0
+        status = "failed"
+        for attempt in range(self.webhook_retries):
+            try:
+                await asyncio.to_thread(self._post, job.webhook_url, body)
+                status = "delivered"
+                break
+            except Exception as e:
+                print(f"⚠️ Webhook for job {job.id} failed (attempt {attempt + 1}): {e}")
+                if attempt + 1 < self.webhook_retries:
+                    await asyncio.sleep(delay)
+                    delay *= 4
+        await asyncio.to_thread(self._write, "UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job.id))
+
+    def _post(self, url: str, body: bytes):
+        # Checked again: jobs stored before an allow-list was configured, and hosts that now resolve elsewhere
+        check_webhook_url(url, self.webhook_hosts)
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.build_opener(_NoRedirect).open(request, timeout=self.webhook_timeout) as resp:
+            resp.read()
+
+    async def _maybe_sweep(self):
+        now = time.time()
+        if not self.retention or now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        await asyncio.to_thread(self._sweep, now - self.retention)
+
+    def _sweep(self, finished_before: float):
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id FROM jobs WHERE status IN {FINISHED} AND finished_at < ?"
+                " AND COALESCE(webhook_status, '') != 'pending'",
+                (finished_before,),
+            ).fetchall()
+            if not rows:
+                return
+            with self._db:
+                self._db.executemany("DELETE FROM jobs WHERE id = ?", rows)
+
+    def stats(self) -> dict:
+        return {
+            "jobs": self.counts(),
+            "workers": len(self._workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "webhooks_pending": len(self._background),
+        }
@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional
+
+LOAD_MODES = ("background", "blocking", "lazy")
+
+
+class ModelNotReady(Exception):
+    """Raised when a request needs the model before it is loaded (answer 503 and retry)."""
+
+
+@dataclass
+class ModelVersion:
+    revision: Optional[str]
+    model: Any
+    load_ms: float = 0.0
+    warmup_ms: float = 0.0
+    loaded_at: float = 0.0
+    leases: int = 0
+    served: int = 0
+
+    def info(self) -> dict:
+        return {
+            "revision": self.revision,
+            "backend": self.model.info() if hasattr(self.model, "info") else None,
+            "load_ms": round(self.load_ms, 1),
+            "warmup_ms": round(self.warmup_ms, 1),
+            "loaded_at": self.loaded_at,
+            "in_flight": self.leases,
+            "served": self.served,
+        }
+
+
+class ModelManager:
+    """
+    Owns the loaded model: background loading, warm-up, readiness and hot swap.
+
+    Inference code takes the model with `with manager.lease() as model:`
+    (from any thread). A lease pins the version it got, so `swap` can load
+    and warm up a new revision next to the serving one, switch new leases
+    to it atomically, and unload the old version once its in-flight
+    requests have drained. Readiness (`ready`) is separate from liveness:
+    the process answers `/health` while the model is still loading.
+    `stop` retires the serving version the same way, waiting (up to a
+    timeout) for in-flight leases before unloading it; a load still running
+    when the manager stops is unloaded instead of going live.
+
+    Load modes:
+        background: `start` returns at once and loads in a worker thread
+            (leases raise `ModelNotReady` until then).
+        blocking: `start` returns once the model is loaded and warmed up.
+        lazy: nothing is loaded until the first lease, which loads it.
+
+    Args:
+        load: `load(revision) -> model`.
+        warmup: Optional `warmup(model)`, run before a version serves traffic.
+        unload: Optional `unload(model)` to free (GPU) memory of a retired version.
+        revision: Revision loaded at start (None for the default).
+        mode: One of `LOAD_MODES`.
+        on_ready: Optional callback when a version starts serving (e.g. to re-key a cache).
+    """
+
+    def __init__(
+        self,
+        load: Callable[[Optional[str]], Any],
+        warmup: Optional[Callable[[Any], None]] = None,
+        unload: Optional[Callable[[Any], None]] = None,
+        revision: Optional[str] = None,
+        mode: str = "background",
+        on_ready: Optional[Callable[[ModelVersion], None]] = None,
+    ):
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode {mode!r}, expected one of {', '.join(LOAD_MODES)}")
+        self.load_fn = load
+        self.warmup_fn = warmup
+        self.unload_fn = unload
+        self.revision = revision
+        self.mode = mode
+        self.on_ready = on_ready
+
+        self.state = "idle"  # idle / loading / warming / ready / failed
+        self.error: Optional[str] = None
+        self._current: Optional[ModelVersion] = None
+        self._retiring: list[ModelVersion] = []
+        self._lock = threading.Condition()
+        self._load_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._swap_target: Optional[str] = None
+        self._stopped = False
+
+        self.swaps = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._current is not None
+
+    @property
+    def ready(self) -> bool:
+        """Whether requests are accepted (in lazy mode, before the model is loaded too)."""
+        return self._current is not None or self.mode == "lazy"
+
+    @property
+    def swapping(self) -> bool:
+        return self._swap_target is not None
+
+    def check(self):
+        """Fail fast while the model cannot serve (lazy mode loads on the first lease instead)."""
+        if self._current is None and self.mode != "lazy":
+            raise ModelNotReady(self._not_ready_message())
+
+    def _not_ready_message(self) -> str:
+        if self.state == "failed":
+            return f"Model failed to load: {self.error}"
+        return f"Model is not ready ({self.state})"
+
+    async def start(self):
+        self._stopped = False
+        if self.mode == "background":
+            self._task = asyncio.create_task(self._load_initial())
+        elif self.mode == "blocking":
+            await self._load_initial()
+
+    async def _load_initial(self):
+        try:
+            await asyncio.to_thread(self._ensure_loaded)
+        except Exception as e:
+            print(f"❌ Model load failed: {e}")
+
+    def _build(self, revision: Optional[str]) -> ModelVersion:
+        """Load and warm up one version (blocking)."""
+        start = time.perf_counter()
+        model = self.load_fn(revision)
+        version = ModelVersion(revision=revision, model=model, load_ms=(time.perf_counter() - start) * 1000)
+        if self.warmup_fn is not None:
+            if self._current is None:
+                self.state = "warming"
+            start = time.perf_counter()
+            self.warmup_fn(model)
+            version.warmup_ms = (time.perf_counter() - start) * 1000
+        version.loaded_at = time.time()
+        return version
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if self._current is not None:
+                return
+            if self._stopped:
+                raise ModelNotReady("Model manager is stopped")
+            self.state = "loading"
+            self.error = None
+            print(f"Loading model (revision {self.revision or 'default'})...")
+            try:
+                version = self._build(self.revision)
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e) or type(e).__name__
+                raise
+            if self._activate(version):
+                print(f"Model loaded! ({version.load_ms:.0f} ms load, {version.warmup_ms:.0f} ms warm-up)")
+
+    def _activate(self, version: ModelVersion) -> bool:
+        """Make `version` the serving one; after `stop` it is unloaded instead (returns False)."""
+        with self._lock:
+            if not self._stopped:
+                self._current = version
+                self.revision = version.revision
+            self.state = "idle" if self._stopped else "ready"
+        if self._stopped:
+            self._unload(version)
+            return False
+        if self.on_ready is not None:
+            self.on_ready(version)
+        return True
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """Pin the serving version for one inference call."""
+        if self._current is None:
+            if self.mode != "lazy":
+                raise ModelNotReady(self._not_ready_message())
+            self._ensure_loaded()
+        with self._lock:
+            version = self._current
+            version.leases += 1
+        try:
+            yield version.model
+        finally:
+            with self._lock:
+                version.leases -= 1
+                version.served += 1
+                self._lock.notify_all()
+
+    async def swap(self, revision: Optional[str]) -> ModelVersion:
+        """
+        Load and warm up `revision` while the current version keeps serving, then switch to it.
+
+        New leases get the new version as soon as it is ready; the old one is
+        unloaded after its last in-flight lease ends. Raises `RuntimeError` if
+        a swap is already running; load errors leave the current version serving.
+        """
+        self._claim_swap(revision)
+        return await self._swap(revision)
+
+    def start_swap(self, revision: Optional[str]) -> asyncio.Task:
+        """`swap` in a background task; the swap shows in `status()` (and `RuntimeError` is raised) at once."""
+        self._claim_swap(revision)
+        task = asyncio.create_task(self._swap(revision))
+        task.add_done_callback(self._swap_done)
+        return task
+
+    def _claim_swap(self, revision: Optional[str]):
+        if self._swap_target is not None:
+            raise RuntimeError(f"A swap to revision {self._swap_target!r} is already running")
+        self._swap_target = revision or "default"
+
+    @staticmethod
+    def _swap_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Model swap failed: {task.exception()}")
+
+    async def _swap(self, revision: Optional[str]) -> ModelVersion:
+        try:
+            if self._current is None:
+                # Nothing to swap out (load failed, or lazy mode): load the requested revision
+                self.revision = revision
+                await asyncio.to_thread(self._ensure_loaded)
+                return self._current
+
+            print(f"Loading model revision {revision or 'default'} for hot swap...")
+            version = await asyncio.to_thread(self._build, revision)
+            old = self._current
+            if not self._activate(version):
+                raise RuntimeError("Model manager stopped during the swap")
+            self.swaps += 1
+            print(f"Swapped to revision {revision or 'default'}; draining {old.leases} in-flight requests")
+            with self._lock:
+                self._retiring.append(old)
+            await asyncio.to_thread(self._retire, old)
+            return version
+        finally:
+            self._swap_target = None
+
+    def _retire(self, version: ModelVersion, timeout: Optional[float] = None):
+        """Unload `version` once its last lease ends (or after `timeout` seconds, leases or not)."""
+        with self._lock:
+            if not self._lock.wait_for(lambda: version.leases == 0, timeout):
+                print(f"⚠️ Unloading revision {version.revision or 'default'} with {version.leases} requests in flight")
+            self._retiring.remove(version)
+        self._unload(version)
+
+    def _unload(self, version: ModelVersion):
+        if self.unload_fn is not None:
+            self.unload_fn(version.model)
+        version.model = None
+        print(f"Unloaded revision {version.revision or 'default'} ({version.served} requests served)")
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Stop serving: new leases raise `ModelNotReady`, and the current version
+        is unloaded once its in-flight leases end, waiting at most `timeout` seconds.
+        """
+        with self._lock:
+            self._stopped = True
+            current, self._current = self._current, None
+            self.state = "idle"
+            if current is not None:
+                self._retiring.append(current)
+        if self._task is not None and not self._task.done():
+            # A load already running in its thread is unloaded by `_activate`
+            self._task.cancel()
+        if current is not None:
+            await asyncio.to_thread(self._retire, current, timeout)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "ready": self._current is not None or self.mode == "lazy",
+                "loaded": self._current is not None,
+                "mode": self.mode,
+                "error": self.error,
+                "current": self._current.info() if self._current else None,
+                "swapping_to": self._swap_target,
+                "retiring": [version.info() for version in self._retiring],
+                "swaps": self.swaps,
+            }
@@ -0,0 +1,340 @@
+import base64
+import gc
+import io
+import os
+import resource
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+MODEL_ID = "datalab-to/chandra"
+# chandra's own default (settings.MAX_OUTPUT_TOKENS)
+DEFAULT_MAX_OUTPUT_TOKENS = 8192
+
+BACKENDS = ("hf", "openai", "fake")
+# "default" leaves the dtype to transformers, as the servers loaded chandra before backends existed
+DTYPES = ("default", "bfloat16", "float16", "float32")
+QUANTIZATIONS = ("none", "int8")
+
+
+@dataclass
+class BackendConfig:
+    """
+    Which inference backend serves OCR, and how.
+
+    Args:
+        backend: `hf` (transformers, in process), `openai` (an OpenAI-compatible
+            VLM server such as vLLM) or `fake` (no model, for tests).
+        device: `hf` device: `auto` (CUDA if available, else CPU), `cpu`, `cuda` or `cuda:N`.
+        dtype: `hf` weight dtype; `default` keeps transformers' choice (the
+            servers' original behaviour), the others are opt-in and change outputs.
+        quantize: `int8` quantizes the linear layers (dynamic quantization on
+            CPU, bitsandbytes on CUDA).
+        threads: Torch intra-op threads on CPU (0 keeps torch's default).
+        max_output_tokens: Generation limit per image.
+        base_url / api_key / model_name: `openai` server; the model revision,
+            when given, is used as the served model name instead of `model_name`.
+        concurrency: `openai` requests in flight per batch.
+        timeout: `openai` request timeout in seconds.
+        retries: `openai` retries of failed or repetitive generations.
+        fake_latency_ms: `fake` latency per batch.
+    """
+
+    backend: str = "hf"
+    device: str = "auto"
+    dtype: str = "default"
+    quantize: str = "none"
+    threads: int = 0
+    max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS
+    base_url: str = "http://localhost:8000/v1"
+    api_key: str = "EMPTY"
+    model_name: str = "chandra"
+    concurrency: int = 8
+    timeout: float = 300.0
+    retries: int = 2
+    fake_latency_ms: float = 50.0
+
+    def __post_init__(self):
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown OCR backend {self.backend!r}, expected one of {', '.join(BACKENDS)}")
+        if self.dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype {self.dtype!r}, expected one of {', '.join(DTYPES)}")
+        if self.quantize not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {self.quantize!r}, expected one of {', '.join(QUANTIZATIONS)}")
+
+    @classmethod
+    def from_env(cls) -> "BackendConfig":
+        # OCR_FAKE_MODEL=1 predates OCR_BACKEND and still selects the fake backend
+        default_backend = "fake" if os.environ.get("OCR_FAKE_MODEL", "0") == "1" else "hf"
+        return cls(
+            backend=os.environ.get("OCR_BACKEND", default_backend),
+            device=os.environ.get("OCR_DEVICE", "auto"),
+            dtype=os.environ.get("OCR_DTYPE", "default"),
+            quantize=os.environ.get("OCR_QUANTIZE", "none"),
+            threads=int(os.environ.get("OCR_CPU_THREADS", "0")),
+            max_output_tokens=int(os.environ.get("OCR_MAX_OUTPUT_TOKENS", str(DEFAULT_MAX_OUTPUT_TOKENS))),
+            base_url=os.environ.get("OCR_OPENAI_BASE_URL", "http://localhost:8000/v1"),
+            api_key=os.environ.get("OCR_OPENAI_API_KEY", "EMPTY"),
+            model_name=os.environ.get("OCR_OPENAI_MODEL", "chandra"),
+            concurrency=int(os.environ.get("OCR_OPENAI_CONCURRENCY", "8")),
+            timeout=float(os.environ.get("OCR_OPENAI_TIMEOUT", "300")),
+            retries=int(os.environ.get("OCR_OPENAI_RETRIES", "2")),
+            fake_latency_ms=float(os.environ.get("OCR_FAKE_LATENCY_MS", "50")),
+        )
+
+    def key(self) -> str:
+        """Tag for cache keys ("" for the default setup, so existing entries stay valid)."""
+        if self.backend == "openai":
+            return f"openai:{self.model_name}"
+        if self.backend == "fake":
+            return "fake"
+        if self.dtype == "default" and self.quantize == "none":
+            return ""
+        return f"hf:{self.dtype}:{self.quantize}"
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class OCRBackend(ABC):
+    """
+    One loaded OCR model. `generate` turns a batch of chandra `BatchInputItem`s
+    into `GenerationResult`s (called from the inference thread), `close`
+    frees the model.
+    """
+
+    name = "base"
+
+    def __init__(self, revision: Optional[str] = None):
+        self.revision = revision
+
+    @abstractmethod
+    def generate(self, items: list) -> list:
+        ...
+
+    def close(self):
+        pass
+
+    def memory(self) -> dict:
+        """Peak memory of the process (and of the GPU, where the backend uses one)."""
+        return {"peak_rss_mb": round(peak_rss_mb(), 1)}
+
+    def info(self) -> dict:
+        return {"backend": self.name, "revision": self.revision}
+
+
+class FakeOCRModel(OCRBackend):
+    """
+    Stand-in for the chandra model, for running the OCR servers without a GPU.
+
+    Sleeps `latency_ms` per batch plus `per_item_ms` per image and returns a
+    short synthetic result naming the image size, prompt and revision.
+    """
+
+    name = "fake"
+
+    def __init__(self, revision: Optional[str] = None, latency_ms: float = 50.0, per_item_ms: float = 10.0):
+        super().__init__(revision)
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.calls = 0
+
+    def generate(self, items: list) -> list:
+        from chandra.model.schema import GenerationResult
+
+        self.calls += 1
+        time.sleep((self.latency_ms + self.per_item_ms * len(items)) / 1000)
+        return [
+            GenerationResult(
+                raw=f"<p>Fake OCR {item.image.size[0]}x{item.image.size[1]} "
+                    f"{item.prompt_type or 'custom'} ({self.revision or 'default'})</p>",
+                token_count=8,
+            )
+            for item in items
+        ]
+
+
+class HFBackend(OCRBackend):
+    """
+    chandra through transformers, on a GPU or on the CPU.
+
+    On CUDA, batches go through chandra's own `generate_hf` (with `cuda:N`
+    made the current device, since it moves its inputs to "cuda"). That
+    function cannot run on the CPU, so there the same steps are repeated with
+    the inputs left on the CPU.
+    """
+
+    name = "hf"
+
+    def __init__(self, config: BackendConfig, revision: Optional[str] = None):
+        super().__init__(revision)
+        import torch
+        from transformers import AutoProcessor, Qwen3VLForConditionalGeneration
+
+        device = config.device
+        if device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        self.quantize = config.quantize
+        self.max_output_tokens = config.max_output_tokens
+        on_cpu = device == "cpu"
+
+        if on_cpu and config.threads:
+            torch.set_num_threads(config.threads)
+        self.threads = torch.get_num_threads() if on_cpu else 0
+
+        kwargs = {"revision": revision} if revision else {}
+        # Dynamic int8 quantization on CPU needs float32 linear layers
+        self.dtype = "float32" if config.quantize == "int8" and on_cpu else config.dtype
+        load_kwargs = {"device_map": {"": device}}
+        if self.dtype != "default":
+            load_kwargs["dtype"] = getattr(torch, self.dtype)
+        if config.quantize == "int8" and not on_cpu:
+            from transformers import BitsAndBytesConfig
+
+            load_kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+        model = Qwen3VLForConditionalGeneration.from_pretrained(MODEL_ID, **load_kwargs, **kwargs).eval()
+        if config.quantize == "int8" and on_cpu:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.processor = AutoProcessor.from_pretrained(MODEL_ID, **kwargs)
+        self.model = model
+
+    def generate(self, items: list) -> list:
+        import torch
+
+        if self.device.startswith("cuda"):
+            from chandra.model.hf import generate_hf
+
+            with torch.inference_mode(), torch.cuda.device(self.device):
+                return generate_hf(items, self.model, max_output_tokens=self.max_output_tokens)
+        return self._generate_cpu(items)
+
+    def _generate_cpu(self, items: list) -> list:
+        """chandra's `generate_hf` without its move to "cuda"."""
+        import torch
+        from chandra.model.hf import process_batch_element
+        from chandra.model.schema import GenerationResult
+        from qwen_vl_utils import process_vision_info
+
+        processor = self.model.processor
+        messages = [process_batch_element(item, processor) for item in items]
+        text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        image_inputs, _ = process_vision_info(messages)
+        inputs = processor(text=text, images=image_inputs, padding=True, return_tensors="pt", padding_side="left")
+
+        with torch.inference_mode():
+            generated_ids = self.model.generate(**inputs, max_new_tokens=self.max_output_tokens)
+        trimmed = [out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)]
+        texts = processor.batch_decode(trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+        return [GenerationResult(raw=out, token_count=len(ids), error=False) for out, ids in zip(texts, trimmed)]
+
+    def close(self):
+        self.model = None
+        gc.collect()
+        import torch
+
+        if self.device.startswith("cuda"):
+            torch.cuda.empty_cache()
+
+    def memory(self) -> dict:
+        memory = super().memory()
+        if self.device.startswith("cuda"):
+            import torch
+
+            memory["peak_gpu_mb"] = round(torch.cuda.max_memory_allocated(self.device) / 1024 / 1024, 1)
+        return memory
+
+    def info(self) -> dict:
+        info = super().info()
+        info.update(device=self.device, dtype=self.dtype, quantize=self.quantize)
+        if self.threads:
+            info["threads"] = self.threads
+        return info
+
+
+class OpenAIBackend(OCRBackend):
+    """
+    chandra served by an OpenAI-compatible VLM server (vLLM, ...), one chat
+    completion per image, sent concurrently. Follows chandra's `generate_vllm`:
+    a failed or repetitive generation is retried with sampling.
+    """
+
+    name = "openai"
+
+    def __init__(self, config: BackendConfig, revision: Optional[str] = None):
+        super().__init__(revision)
+        try:
+            from openai import OpenAI
+        except ImportError as e:
+            raise ImportError("The openai backend needs the `openai` package (install the `openai` extra)") from e
+
+        self.client = OpenAI(
+            base_url=config.base_url, api_key=config.api_key, timeout=config.timeout, max_retries=1
+        )
+        self.base_url = config.base_url
+        self.model_name = revision or config.model_name
+        self.max_output_tokens = config.max_output_tokens
+        self.retries = config.retries
+        self.pool = ThreadPoolExecutor(max_workers=max(1, config.concurrency), thread_name_prefix="ocr-openai")
+
+    def _complete(self, item, temperature: float, top_p: float):
+        from chandra.model.schema import GenerationResult
+        from chandra.model.util import scale_to_fit
+        from chandra.prompts import PROMPT_MAPPING
+
+        buffer = io.BytesIO()
+        scale_to_fit(item.image).save(buffer, format="PNG")
+        content = [
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"}},
+            {"type": "text", "text": item.prompt or PROMPT_MAPPING[item.prompt_type]},
+        ]
+        try:
+            completion = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=self.max_output_tokens,
+                temperature=temperature,
+                top_p=top_p,
+            )
+        except Exception as e:
+            print(f"❌ OCR backend request failed: {e}")
+            return GenerationResult(raw="", token_count=0, error=True)
+        return GenerationResult(
+            raw=completion.choices[0].message.content or "",
+            token_count=completion.usage.completion_tokens if completion.usage else 0,
+            error=False,
+        )
+
+    def _generate_one(self, item):
+        from chandra.model.util import detect_repeat_token
+
+        result = self._complete(item, temperature=0, top_p=0.1)
+        for _ in range(self.retries):
+            if not (result.error or detect_repeat_token(result.raw)):
+                break
+            result = self._complete(item, temperature=0.3, top_p=0.95)
+        return result
+
+    def generate(self, items: list) -> list:
+        return list(self.pool.map(self._generate_one, items))
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        self.client.close()
+
+    def info(self) -> dict:
+        info = super().info()
+        info.update(base_url=self.base_url, model=self.model_name)
+        return info
+
+
+def create_backend(config: BackendConfig, revision: Optional[str] = None) -> OCRBackend:
+    """Load the backend `config` selects (blocking: loads the model weights for `hf`)."""
+    if config.backend == "fake":
+        return FakeOCRModel(revision, latency_ms=config.fake_latency_ms)
+    if config.backend == "openai":
+        return OpenAIBackend(config, revision)
+    return HFBackend(config, revision)
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class OCRCache:
+    """
+    Content-addressed cache for OCR results.
+
+    Entries are keyed on the SHA-256 of the decoded image bytes plus the
+    prompt parameters and model id, so the same image OCR'd through the REST
+    tool or the MCP server hits the same entry. Results live in an in-memory
+    LRU tier bounded by total size, with an optional sqlite tier that
+    survives restarts (and can be shared by several processes).
+
+    `get` and `put` block on sqlite; from async code use `aget` and `aput`,
+    which answer memory hits directly and run the disk tier in a thread.
+
+    Args:
+        model_id: Model identifier mixed into every key.
+        max_bytes: Size budget of the in-memory tier (0 disables it).
+        disk_path: Optional sqlite file for the persistent tier.
+        max_disk_bytes: Size budget of the sqlite tier (0 for unbounded).
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.model_id = model_id
+        self.max_bytes = max(0, max_bytes)
+        self.max_disk_bytes = max(0, max_disk_bytes)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self._bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+
+    def key(
+        self,
+        image_bytes: bytes,
+        prompt_type: Optional[str],
+        custom_prompt: Optional[str] = None,
+        variant: Optional[str] = None,
+    ) -> str:
+        """
+        Build the cache key for an image and its prompt parameters.
+
+        `variant` distinguishes results produced under different settings
+        (e.g. `PreprocessConfig.key()`).
+        """
+        return self.key_for_digest(hashlib.sha256(image_bytes).hexdigest(), prompt_type, custom_prompt, variant)
+
+    def key_for_digest(
+        self,
+        digest: str,
+        prompt_type: Optional[str],
+        custom_prompt: Optional[str] = None,
+        variant: Optional[str] = None,
+    ) -> str:
+        """Same as `key`, for an image already hashed with sha256 (e.g. while streaming)."""
+        params = [digest, prompt_type, custom_prompt, self.model_id]
+        if variant:
+            params.append(variant)
+        return hashlib.sha256(json.dumps(params).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self.disk_hits += 1
+                    value = json.loads(row[0])
+                    self._put_memory(key, value, len(row[0].encode()))
+                    return value
+
+            self.misses += 1
+            return None
+
+    async def aget(self, key: str) -> Optional[dict]:
+        """`get` for async callers: the sqlite lookup runs in a thread."""
+        if self._db is None:
+            return self.get(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: dict):
+        """`put` for async callers: the sqlite write runs in a thread."""
+        if self._db is None:
+            self.put(key, value)
+        else:
+            await asyncio.to_thread(self.put, key, value)
+
+    def put(self, key: str, value: dict):
+        encoded = json.dumps(value)
+        size = len(encoded.encode())
+        with self._lock:
+            self._put_memory(key, value, size)
+            if self._db is not None:
+                self._put_disk(key, encoded, size)
+
+    def _put_memory(self, key: str, value: dict, size: int):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _put_disk(self, key: str, encoded: str, size: int):
+        if self.max_disk_bytes and size > self.max_disk_bytes:
+            return
+        # The file may be shared with other processes, so the total is read inside the transaction
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, encoded, size, time.time()),
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+            if self.max_disk_bytes and total > self.max_disk_bytes:
+                evicted = []
+                for old_key, old_size in self._db.execute(
+                    "SELECT key, size FROM ocr_cache WHERE key != ? ORDER BY last_access", (key,)
+                ):
+                    if total <= self.max_disk_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= old_size
+                self._db.executemany("DELETE FROM ocr_cache WHERE key = ?", evicted)
+                self.disk_evictions += len(evicted)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._disk_bytes = total
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        return {
+            "model_id": self.model_id,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_enabled": self._db is not None,
+            "disk_bytes": self._disk_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
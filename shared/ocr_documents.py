@@ -0,0 +1,65 @@
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Union
+
+from PIL import Image, ImageSequence
+
+# Same rasterisation defaults as chandra.input.load_pdf_images
+PDF_DPI = 192
+MIN_PDF_IMAGE_DIM = 1024
+
+PDF_MAGIC = b"%PDF-"
+
+
+def is_pdf(source: Union[str, BinaryIO]) -> bool:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read(len(PDF_MAGIC)) == PDF_MAGIC
+    position = source.tell()
+    header = source.read(len(PDF_MAGIC))
+    source.seek(position)
+    return header == PDF_MAGIC
+
+
+def iter_pdf_pages(source: Union[str, BinaryIO], dpi: int = PDF_DPI) -> Iterator[Image.Image]:
+    """Render PDF pages one at a time, so only the current page is held in memory."""
+    import pypdfium2 as pdfium
+
+    doc = pdfium.PdfDocument(source)
+    try:
+        doc.init_forms()
+        for index in range(len(doc)):
+            page = doc[index]
+            try:
+                min_page_dim = min(page.get_width(), page.get_height())
+                scale_dpi = max((MIN_PDF_IMAGE_DIM / min_page_dim) * 72, dpi)
+                yield page.render(scale=scale_dpi / 72).to_pil().convert("RGB")
+            finally:
+                page.close()
+    finally:
+        doc.close()
+
+
+def iter_image_frames(source: Union[str, BinaryIO]) -> Iterator[Image.Image]:
+    """Yield every frame of a (possibly multi-page) image such as a TIFF."""
+    with Image.open(source) as image:
+        for frame in ImageSequence.Iterator(image):
+            yield frame.convert("RGB")
+
+
+def iter_pages(source: Union[str, BinaryIO], dpi: int = PDF_DPI) -> Iterator[Image.Image]:
+    """
+    Lazily rasterise the pages of a PDF, multi-page TIFF or single image.
+
+    Pages are produced one at a time as the caller iterates, so a 200-page
+    document never has all of its pages decoded at once.
+    """
+    if is_pdf(source):
+        return iter_pdf_pages(source, dpi=dpi)
+    return iter_image_frames(source)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
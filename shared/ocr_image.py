@@ -0,0 +1,69 @@
+import hashlib
+import tempfile
+from typing import AsyncIterable, BinaryIO
+
+from PIL import Image
+
+# Uploads up to this size stay in memory, larger ones spill to a temp file
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an uploaded image exceeds the configured size limit."""
+
+
+async def spool_stream(chunks: AsyncIterable[bytes], max_bytes: int = 0) -> tuple[BinaryIO, str, int]:
+    """
+    Write an upload stream to a spooled temp file while hashing it.
+
+    Avoids building the whole body as one `bytes` object (and the base64 /
+    JSON copies of the `image_base64` path): each chunk is hashed and written
+    once, and PIL later decodes straight from the returned file.
+
+    Returns:
+        (file positioned at 0, sha256 hex digest, size in bytes)
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+
+def hash_file(fp: BinaryIO, chunk_size: int = 1024 * 1024) -> tuple[str, int]:
+    """Hash a seekable file in chunks and rewind it. Returns (sha256 hex digest, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    fp.seek(0)
+    while chunk := fp.read(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    fp.seek(0)
+    return digest.hexdigest(), size
+
+
+def is_image(fp: BinaryIO) -> bool:
+    """Check whether PIL recognises the file, without decoding pixel data."""
+    position = fp.tell()
+    try:
+        with Image.open(fp):
+            return True
+    except Exception:
+        return False
+    finally:
+        fp.seek(position)
+
+
+def open_rgb(source) -> Image.Image:
+    """Decode an image from a path or file object into RGB."""
+    return Image.open(source).convert("RGB")
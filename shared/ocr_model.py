@@ -0,0 +1,85 @@
+import os
+import time
+from typing import Callable, Optional
+
+from PIL import Image, ImageDraw
+
+from shared.model_manager import ModelManager, ModelVersion
+from shared.ocr_backends import MODEL_ID, BackendConfig, OCRBackend, create_backend
+from shared.ocr_preprocess import PreprocessConfig, preprocess
+
+
+def generate(model: OCRBackend, items: list) -> list:
+    """One inference batch on the leased backend."""
+    return model.generate(items)
+
+
+def parse_sizes(spec: str) -> list[tuple[int, int]]:
+    """"1024x1024,2480x3508" -> [(1024, 1024), (2480, 3508)]."""
+    sizes = []
+    for part in spec.replace(" ", "").split(","):
+        if part:
+            width, _, height = part.lower().partition("x")
+            sizes.append((int(width), int(height or width)))
+    return sizes
+
+
+def warmup_image(size: tuple[int, int]) -> Image.Image:
+    """A page-like image (text lines and a table grid) of `size`."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    step = max(12, height // 40)
+    for i, y in enumerate(range(step, height // 2, step)):
+        draw.text((width // 20, y), f"Warm-up line {i}: the quick brown fox jumps over the lazy dog", fill="black")
+    for x in range(width // 20, width - width // 20, max(20, width // 6)):
+        draw.line([(x, height // 2), (x, height - step)], fill="black")
+    for y in range(height // 2, height - step, step * 2):
+        draw.line([(width // 20, y), (width - width // 20, y)], fill="black")
+    return image
+
+
+def warmup(model: OCRBackend, sizes: list[tuple[int, int]], config: PreprocessConfig):
+    """
+    Run one inference per representative page size, through the same preprocessing as
+    requests, so kernel selection / compilation for those shapes happens before traffic.
+    """
+    from chandra.model.schema import BatchInputItem
+
+    for size in sizes:
+        start = time.perf_counter()
+        tiles = preprocess(warmup_image(size), config).tiles
+        generate(model, [BatchInputItem(image=tile, prompt_type="ocr_layout") for tile in tiles])
+        print(f"🔥 Warm-up {size[0]}x{size[1]}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def cache_model_id(revision: Optional[str], backend: Optional[BackendConfig] = None) -> str:
+    """Model id for cache keys: results of different revisions and backends must not be mixed."""
+    tag = (backend or BackendConfig.from_env()).key()
+    model_id = f"{MODEL_ID}@{revision}" if revision else MODEL_ID
+    return f"{model_id}#{tag}" if tag else model_id
+
+
+def create_model_manager(
+    config: PreprocessConfig,
+    on_ready: Optional[Callable[[ModelVersion], None]] = None,
+    backend: Optional[BackendConfig] = None,
+) -> ModelManager:
+    """
+    Model manager for the OCR servers, configured from the environment:
+
+        OCR_MODEL_REVISION  revision of datalab-to/chandra to load (default: the Hub default)
+        OCR_MODEL_LOAD      background (default) / blocking / lazy
+        OCR_WARMUP_SIZES    page sizes to warm up, e.g. "1024x1024,2480x3508" ("" disables)
+        OCR_BACKEND, ...    inference backend (`BackendConfig.from_env`, unless `backend` is given)
+    """
+    sizes = parse_sizes(os.environ.get("OCR_WARMUP_SIZES", "1024x1024"))
+    backend = backend or BackendConfig.from_env()
+    return ModelManager(
+        load=lambda revision: create_backend(backend, revision),
+        warmup=(lambda model: warmup(model, sizes, config)) if sizes else None,
+        unload=lambda model: model.close(),
+        revision=os.environ.get("OCR_MODEL_REVISION") or None,
+        mode=os.environ.get("OCR_MODEL_LOAD", "background"),
+        on_ready=on_ready,
+    )
@@ -0,0 +1,212 @@
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Union
+
+from PIL import Image, ImageOps
+
+# chandra's scale_to_fit caps images at 3072x2048 pixels inside generate_hf
+DEFAULT_MAX_PIXELS = 3072 * 2048
+
+EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class PreprocessConfig:
+    """
+    Image preprocessing applied before inference.
+
+    Args:
+        auto_orient: Apply the EXIF orientation (phone photos are often stored sideways).
+        max_pixels: Pixel budget per image sent to the model; larger images are downsampled.
+        target_dpi: Downsample images whose DPI metadata is above this (0 disables).
+        tile: Split pages above `max_pixels` into overlapping horizontal strips
+            instead of downsampling them to a single image.
+        max_tiles: Tile limit; pages larger than `max_tiles` overlapping strips of
+            `max_pixels` each can cover are downsampled first.
+        tile_overlap: Fraction of each strip that overlaps the next one (at most 0.5).
+    """
+
+    auto_orient: bool = True
+    max_pixels: int = DEFAULT_MAX_PIXELS
+    target_dpi: int = 0
+    tile: bool = False
+    max_tiles: int = 4
+    tile_overlap: float = 0.1
+
+    @classmethod
+    def from_env(cls) -> "PreprocessConfig":
+        return cls(
+            auto_orient=os.environ.get("OCR_AUTO_ORIENT", "1") == "1",
+            max_pixels=int(os.environ.get("OCR_MAX_PIXELS", str(DEFAULT_MAX_PIXELS))),
+            target_dpi=int(os.environ.get("OCR_TARGET_DPI", "0")),
+            tile=os.environ.get("OCR_TILE", "0") == "1",
+            max_tiles=int(os.environ.get("OCR_MAX_TILES", "4")),
+            tile_overlap=float(os.environ.get("OCR_TILE_OVERLAP", "0.1")),
+        )
+
+    def key(self) -> str:
+        """Short tag for cache keys: results depend on the preprocessing settings."""
+        tiling = f"t{self.max_tiles}:{self.tile_overlap}" if self.tile else "t0"
+        return f"o{int(self.auto_orient)}:p{self.max_pixels}:d{self.target_dpi}:{tiling}"
+
+
+@dataclass
+class PreprocessedImage:
+    tiles: list[Image.Image]
+    original_size: tuple[int, int]
+    size: tuple[int, int]
+    timings_ms: dict[str, float] = field(default_factory=dict)
+
+
+class _Timer:
+    def __init__(self, timings: dict[str, float]):
+        self.timings = timings
+        self.start = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self.start) * 1000, 3)
+        self.start = now
+
+
+def tiled_rows(strip: int, tiles: int, overlap: float) -> int:
+    """Rows covered by `tiles` strips of `strip` rows, each overlapping the next by `overlap` of a strip."""
+    return math.floor(strip * (tiles - overlap * (tiles - 1)))
+
+
+def target_pixels(size: tuple[int, int], dpi, config: PreprocessConfig) -> int:
+    """Pixel count an image of `size` (and DPI metadata `dpi`) should be reduced to."""
+    width, height = size
+    pixels = width * height
+    budget = config.max_pixels
+    if config.tile and config.max_tiles > 1:
+        # The overlaps are sent twice, so the strips cover less than max_tiles * max_pixels
+        overlap = min(max(config.tile_overlap, 0.0), 0.5)
+        budget = tiled_rows(config.max_pixels, config.max_tiles, overlap)
+    if config.max_pixels > 0:
+        pixels = min(pixels, budget)
+    if config.target_dpi and dpi:
+        source_dpi = min(dpi) if isinstance(dpi, tuple) else dpi
+        if source_dpi > config.target_dpi:
+            pixels = min(pixels, int(width * height * (config.target_dpi / source_dpi) ** 2))
+    return max(1, pixels)
+
+
+def resize_to_pixels(image: Image.Image, pixels: int) -> Image.Image:
+    """Downsample (never upsample) keeping the aspect ratio, so the image has at most `pixels` pixels."""
+    width, height = image.size
+    if width * height <= pixels:
+        return image
+    scale = math.sqrt(pixels / (width * height))
+    size = (max(1, math.floor(width * scale)), max(1, math.floor(height * scale)))
+    # reducing_gap does most of the work with a cheap box reduce before the LANCZOS pass
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def split_tiles(image: Image.Image, max_pixels: int, max_tiles: int, overlap: float) -> list[Image.Image]:
+    """
+    Split an image into overlapping full-width horizontal strips of at most `max_pixels`.
+
+    Strips keep text lines whole and follow top-to-bottom reading order, so
+    their outputs can be concatenated (see `merge_tile_text`). An image
+    taller than `max_tiles` strips can cover is downsampled to fit first.
+    """
+    width, height = image.size
+    if width * height <= max_pixels or max_tiles <= 1:
+        return [image]
+
+    overlap = min(max(overlap, 0.0), 0.5)
+    while True:
+        strip = max(1, max_pixels // width)
+        count = math.ceil((height - strip) / (strip * (1 - overlap))) + 1
+        if count <= max_tiles:
+            break
+        image = resize_to_pixels(image, width * tiled_rows(strip, max_tiles, overlap))
+        width, height = image.size
+    if count == 1:
+        return [image]
+    # Spread the strips evenly over the page; never taller than `strip`, since `count` strips of it cover the page
+    strip = math.ceil(height / (count - overlap * (count - 1)))
+    step = (height - strip) / (count - 1)
+
+    tiles = []
+    for index in range(count):
+        top = round(index * step)
+        tiles.append(image.crop((0, top, width, min(height, top + strip))))
+    return tiles
+
+
+def merge_tile_text(parts: list[str], max_overlap_lines: int = 30, min_overlap_chars: int = 16) -> str:
+    """
+    Join the outputs of consecutive strips, dropping lines repeated across an overlap.
+
+    The leading lines of each part that match the trailing lines of the text
+    so far (ignoring blank lines and surrounding whitespace) are removed, if
+    the match has at least `min_overlap_chars` characters: a lone `---` or
+    table border repeated at a seam is kept.
+    """
+    merged: list[str] = []
+    for part in parts:
+        lines = part.strip("\n").splitlines()
+        previous = [line.strip() for line in merged if line.strip()][-max_overlap_lines:]
+        leading = [(i, line.strip()) for i, line in enumerate(lines) if line.strip()][:max_overlap_lines]
+
+        skip = 0
+        for k in range(min(len(previous), len(leading)), 0, -1):
+            matched = [line for _, line in leading[:k]]
+            if previous[-k:] == matched and sum(map(len, matched)) >= min_overlap_chars:
+                skip = leading[k - 1][0] + 1
+                break
+
+        merged.extend(lines[skip:])
+    return "\n".join(merged).strip("\n")
+
+
+def preprocess(source: Union[str, BinaryIO, Image.Image], config: PreprocessConfig) -> PreprocessedImage:
+    """
+    Decode, orient, downsample and optionally tile an image for inference.
+
+    `source` is a path, a file object or an already-decoded image (e.g. a
+    rendered PDF page, which skips the decode stage). JPEGs far above the
+    pixel budget are decoded at a reduced scale via `Image.draft`. Each
+    stage's duration is recorded in `timings_ms`.
+    """
+    timings: dict[str, float] = {}
+    timer = _Timer(timings)
+
+    if isinstance(source, Image.Image):
+        image = source
+        original_size = image.size
+        pixels = target_pixels(original_size, image.info.get("dpi"), config)
+    else:
+        image = Image.open(source)
+        original_size = image.size
+        pixels = target_pixels(original_size, image.info.get("dpi"), config)
+        if image.format == "JPEG" and pixels < original_size[0] * original_size[1]:
+            scale = math.sqrt(pixels / (original_size[0] * original_size[1]))
+            image.draft("RGB", (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale)))
+        image.load()
+        timer.lap("decode")
+
+    if config.auto_orient:
+        # exif_transpose copies the image even when there is nothing to rotate
+        if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+        timer.lap("orient")
+
+    # Palette / bilevel images would be resized with NEAREST; grayscale is resized before conversion
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    image = resize_to_pixels(image, pixels)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    timer.lap("resize")
+
+    tiles = [image]
+    if config.tile:
+        tiles = split_tiles(image, config.max_pixels, config.max_tiles, config.tile_overlap)
+        timer.lap("tile")
+
+    return PreprocessedImage(tiles=tiles, original_size=original_size, size=image.size, timings_ms=timings)
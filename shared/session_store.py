@@ -0,0 +1,413 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid INTEGER PRIMARY KEY,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    update_time REAL NOT NULL,
+    UNIQUE (app_name, user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_update_time ON sessions (update_time);
+CREATE TABLE IF NOT EXISTS events (
+    sid INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_sid ON events (sid, timestamp);
+CREATE TABLE IF NOT EXISTS app_states (app_name TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS user_states (app_name TEXT, user_id TEXT, state TEXT NOT NULL, PRIMARY KEY (app_name, user_id));
+"""
+
+# Events larger than this are zlib-compressed (model responses, OCR text)
+COMPRESS_MIN_BYTES = 512
+
+
+def encode_event(event: Event) -> bytes:
+    """Compact event encoding: JSON without null fields, zlib-compressed when large."""
+    data = event.model_dump_json(exclude_none=True).encode()
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data, 1)
+    return b"j" + data
+
+
+def decode_event(data: bytes) -> Event:
+    payload = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    return Event.model_validate_json(payload)
+
+
+def split_state(state: Optional[dict]) -> tuple[dict, dict, dict]:
+    """Split a state dict into (app, user, session) parts; `temp:` keys are dropped."""
+    app, user, session = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+@dataclass
+class CachedSession:
+    sid: int
+    session: Session  # session-scope state only; app/user state is merged on read
+
+
+class BoundedSessionService(BaseSessionService):
+    """
+    Persistent ADK session service with bounded memory.
+
+    `InMemorySessionService` keeps every session and event of a long-running
+    server forever and loses them on restart. Here sessions live in sqlite,
+    with only the `max_cached` most recently used ones (and their events) in
+    memory. Sessions idle for more than `ttl` seconds expire, and the store
+    keeps at most `max_sessions`, dropping the least recently updated.
+
+    Writes are batched: new sessions, events and state updates are queued and
+    committed in one transaction every `batch_size` writes or
+    `flush_interval` seconds, whichever comes first (state updates of the
+    same session are coalesced). Reads that go to sqlite flush first, so
+    they always see queued writes. A crash loses at most one batch.
+
+    One process per database file: session row ids are allocated in memory.
+
+    Args:
+        path: sqlite file (":memory:" for a non-persistent, still bounded store).
+        ttl: Seconds since last update before a session expires (0 disables).
+        max_sessions: Maximum sessions kept in the store (0 for unbounded).
+        max_cached: Sessions kept in memory.
+        batch_size: Queued writes that trigger a commit.
+        flush_interval: Maximum seconds a write stays queued.
+        sweep_interval: Seconds between TTL / size-cap sweeps.
+    """
+
+    def __init__(
+        self,
+        path: str = "sessions.db",
+        ttl: float = 24 * 3600,
+        max_sessions: int = 10000,
+        max_cached: int = 256,
+        batch_size: int = 64,
+        flush_interval: float = 0.5,
+        sweep_interval: float = 60.0,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max(0, max_sessions)
+        self.max_cached = max(1, max_cached)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._next_sid = (self._db.execute("SELECT COALESCE(MAX(sid), 0) FROM sessions").fetchone()[0]) + 1
+
+        self._cache: OrderedDict[tuple[str, str, str], CachedSession] = OrderedDict()
+        self._new_sessions: list[tuple] = []
+        self._new_events: list[tuple] = []
+        self._dirty: dict[int, tuple[str, float]] = {}
+        self._pending = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_sweep = time.monotonic()
+
+        self.flushes = 0
+        self.expired = 0
+        self.evicted = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @classmethod
+    def from_env(cls) -> "BoundedSessionService":
+        return cls(
+            path=os.environ.get("SESSION_DB", "sessions.db"),
+            ttl=float(os.environ.get("SESSION_TTL", str(24 * 3600))),
+            max_sessions=int(os.environ.get("SESSION_MAX", "10000")),
+            max_cached=int(os.environ.get("SESSION_CACHE", "256")),
+            batch_size=int(os.environ.get("SESSION_BATCH", "64")),
+            flush_interval=float(os.environ.get("SESSION_FLUSH_INTERVAL", "0.5")),
+        )
+
+    # --- write queue ---
+
+    def _queued(self):
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            try:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def flush(self):
+        """Commit queued writes; also runs the TTL / size-cap sweep when it is due."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO sessions (sid, app_name, user_id, id, state, update_time) VALUES (?, ?, ?, ?, ?, ?)",
+                    self._new_sessions,
+                )
+                self._db.executemany("INSERT INTO events (sid, timestamp, data) VALUES (?, ?, ?)", self._new_events)
+                self._db.executemany(
+                    "UPDATE sessions SET state = ?, update_time = ? WHERE sid = ?",
+                    [(state, update_time, sid) for sid, (state, update_time) in self._dirty.items()],
+                )
+            self._new_sessions.clear()
+            self._new_events.clear()
+            self._dirty.clear()
+            self._pending = 0
+            self.flushes += 1
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def sweep(self):
+        """
+        Delete expired sessions and, above `max_sessions`, the least recently updated ones.
+
+        Sessions in the cache or with queued writes are skipped: a runner may
+        hold them and append an event next. They are swept once they leave the cache.
+        """
+        self._last_sweep = time.monotonic()
+        in_use = {cached.sid for cached in self._cache.values()} | set(self._dirty)
+        in_use.update(row[0] for row in self._new_sessions)
+        in_use.update(row[0] for row in self._new_events)
+        doomed: list[int] = []
+        if self.ttl > 0:
+            rows = self._db.execute("SELECT sid FROM sessions WHERE update_time < ?", (time.time() - self.ttl,)).fetchall()
+            expired = [row[0] for row in rows if row[0] not in in_use]
+            doomed += expired
+            self.expired += len(expired)
+        if self.max_sessions:
+            skip = in_use | set(doomed)
+            rows = self._db.execute(
+                "SELECT sid FROM sessions ORDER BY update_time DESC LIMIT -1 OFFSET ?", (self.max_sessions,)
+            ).fetchall()
+            evicted = [row[0] for row in rows if row[0] not in skip]
+            doomed += evicted
+            self.evicted += len(evicted)
+        if doomed:
+            self._delete_sids(doomed)
+
+    def _delete_sids(self, sids: list[int]):
+        if self._pending:
+            self.flush()
+        with self._db:
+            self._db.executemany("DELETE FROM events WHERE sid = ?", [(sid,) for sid in sids])
+            self._db.executemany("DELETE FROM sessions WHERE sid = ?", [(sid,) for sid in sids])
+        doomed = set(sids)
+        for key in [key for key, cached in self._cache.items() if cached.sid in doomed]:
+            del self._cache[key]
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    # --- cache / state helpers ---
+
+    def _remember(self, key: tuple[str, str, str], cached: CachedSession):
+        self._cache[key] = cached
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _load(self, app_name: str, user_id: str, session_id: str) -> Optional[CachedSession]:
+        key = (app_name, user_id, session_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached
+
+        self.cache_misses += 1
+        self.flush()
+        row = self._db.execute(
+            "SELECT sid, state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+            (app_name, user_id, session_id),
+        ).fetchone()
+        if row is None:
+            return None
+        sid, state, update_time = row
+        events = [
+            decode_event(data)
+            for (data,) in self._db.execute("SELECT data FROM events WHERE sid = ? ORDER BY timestamp, rowid", (sid,))
+        ]
+        cached = CachedSession(sid, Session(
+            app_name=app_name, user_id=user_id, id=session_id,
+            state=json.loads(state), events=events, last_update_time=update_time,
+        ))
+        self._remember(key, cached)
+        return cached
+
+    def _expired(self, session: Session) -> bool:
+        return self.ttl > 0 and session.last_update_time < time.time() - self.ttl
+
+    def _shared_state(self, table: str, where: str, params: tuple) -> dict:
+        row = self._db.execute(f"SELECT state FROM {table} WHERE {where}", params).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _update_shared_state(self, app_name: str, user_id: str, app_delta: dict, user_delta: dict):
+        """App / user state is shared across sessions and rarely written, so it is written through."""
+        with self._db:
+            if app_delta:
+                state = self._shared_state("app_states", "app_name = ?", (app_name,)) | app_delta
+                self._db.execute("INSERT OR REPLACE INTO app_states VALUES (?, ?)", (app_name, json.dumps(state)))
+            if user_delta:
+                state = self._shared_state("user_states", "app_name = ? AND user_id = ?", (app_name, user_id)) | user_delta
+                self._db.execute("INSERT OR REPLACE INTO user_states VALUES (?, ?, ?)", (app_name, user_id, json.dumps(state)))
+
+    def _merged_state(self, app_name: str, user_id: str, state: dict) -> dict:
+        merged = dict(state)
+        for key, value in self._shared_state("app_states", "app_name = ?", (app_name,)).items():
+            merged[State.APP_PREFIX + key] = value
+        for key, value in self._shared_state("user_states", "app_name = ? AND user_id = ?", (app_name, user_id)).items():
+            merged[State.USER_PREFIX + key] = value
+        return merged
+
+    # --- BaseSessionService ---
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip()
+        if session_id:
+            if self._load(app_name, user_id, session_id) is not None:
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+        else:
+            session_id = str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+
+        app_delta, user_delta, session_state = split_state(state)
+        self._update_shared_state(app_name, user_id, app_delta, user_delta)
+        now = time.time()
+        sid = self._next_sid
+        self._next_sid += 1
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=session_state, last_update_time=now)
+        self._remember(key, CachedSession(sid, session))
+        self._new_sessions.append((sid, app_name, user_id, session_id, json.dumps(session_state), now))
+        self._queued()
+        return session.model_copy(update={"state": self._merged_state(app_name, user_id, session_state), "events": []})
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        cached = self._load(app_name, user_id, session_id)
+        if cached is None:
+            return None
+        if self._expired(cached.session):
+            self._delete_sids([cached.sid])
+            self.expired += 1
+            return None
+
+        events = cached.session.events
+        if config and config.num_recent_events:
+            events = events[-config.num_recent_events:]
+        if config and config.after_timestamp:
+            events = [event for event in events if event.timestamp >= config.after_timestamp]
+        # Shallow copy: callers may append to events / update state without touching the cache
+        return cached.session.model_copy(update={
+            "events": list(events),
+            "state": self._merged_state(app_name, user_id, cached.session.state),
+        })
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        self.flush()
+        if user_id is None:
+            rows = self._db.execute("SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ?", (app_name,))
+        else:
+            rows = self._db.execute(
+                "SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ? AND user_id = ?",
+                (app_name, user_id),
+            )
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=row_user, id=session_id,
+                    state=self._merged_state(app_name, row_user, json.loads(state)), last_update_time=update_time)
+            for row_user, session_id, state, update_time in rows.fetchall()
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        cached = self._load(app_name, user_id, session_id)
+        if cached is not None:
+            self._delete_sids([cached.sid])
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session, event)
+        session.last_update_time = event.timestamp
+
+        cached = self._load(session.app_name, session.user_id, session.id)
+        if cached is None:
+            raise ValueError(f"Session {session.id} not found.")
+        if cached.session is not session:
+            cached.session.events.append(event)
+            cached.session.last_update_time = event.timestamp
+
+        app_delta, user_delta, session_delta = split_state(event.actions.state_delta if event.actions else None)
+        self._update_shared_state(session.app_name, session.user_id, app_delta, user_delta)
+        cached.session.state.update(session_delta)
+
+        self._new_events.append((cached.sid, event.timestamp, encode_event(event)))
+        self._dirty[cached.sid] = (json.dumps(cached.session.state), event.timestamp)
+        self._queued()
+        return event
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._cache),
+            "pending_writes": self._pending,
+            "flushes": self.flushes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+def create_session_service(default: str = "memory") -> BaseSessionService:
+    """
+    Session service selected by `SESSION_BACKEND` ("memory" or "sqlite").
+
+    `memory` is ADK's unbounded `InMemorySessionService` (fine for one-off
+    scripts); `sqlite` is `BoundedSessionService.from_env()`.
+    """
+    backend = os.environ.get("SESSION_BACKEND", default)
+    if backend == "memory":
+        return InMemorySessionService()
+    if backend == "sqlite":
+        return BoundedSessionService.from_env()
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
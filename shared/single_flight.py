@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key starts `fn()` as a task; callers arriving while
+    it is in flight wait on that task and receive the same result (or
+    exception). Each caller awaits the task through `asyncio.shield`, so a
+    caller that disconnects does not cancel the work for the others. The key
+    is released as soon as the task finishes; later calls start a new
+    execution (put a cache in front for completed results).
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            self.executions += 1
+            task.add_done_callback(lambda t, key=key: self._release(key, t))
+            return await asyncio.shield(task)
+
+        self.coalesced += 1
+        self._waiters[key] += 1
+        self.max_waiters = max(self.max_waiters, self._waiters[key])
+        try:
+            return await asyncio.shield(task)
+        finally:
+            # Also when this caller is cancelled; the key may already be released (and reused)
+            if self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _release(self, key: str, task: asyncio.Task):
+        self._tasks.pop(key, None)
+        self._waiters.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+    def is_inflight(self, key: str) -> bool:
+        return key in self._tasks
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._tasks),
+            "waiting": sum(self._waiters.values()),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "max_waiters": self.max_waiters,
+        }
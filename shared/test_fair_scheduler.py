@@ -0,0 +1,215 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from shared.fair_scheduler import FairScheduler, TenantPolicy, TenantQueueFull
+from shared.inference_executor import InferenceQueueFull
+
+
+async def dispatch_order(scheduler: FairScheduler, requests: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """Queue `(tenant, lane)` requests behind a held slot, release it and return the order they ran in."""
+    order = []
+    gate = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot("holder"):
+            await gate.wait()
+
+    async def request(tenant, lane):
+        async with scheduler.slot(tenant, lane):
+            order.append((tenant, lane))
+            await asyncio.sleep(0)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(request(tenant, lane)) for tenant, lane in requests]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["waiting"] == len(requests)
+    gate.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_tenants_share_the_model_by_weight():
+    scheduler = FairScheduler(capacity=1, tenants={"agents": TenantPolicy(weight=3), "batch": TenantPolicy(weight=1)})
+    # The heavy tenant queues everything first; arrival order must not matter
+    requests = [("batch", "interactive")] * 100 + [("agents", "interactive")] * 100
+    order = asyncio.run(dispatch_order(scheduler, requests))
+
+    first = Counter(tenant for tenant, _ in order[:80])
+    assert first["agents"] == 60 and first["batch"] == 20
+    assert len(order) == 200
+
+
+def test_bulk_lane_gets_its_share_without_starving():
+    scheduler = FairScheduler(capacity=1, bulk_share=0.1)
+    requests = [("uploads", "bulk")] * 50 + [("agents", "interactive")] * 100
+    order = asyncio.run(dispatch_order(scheduler, requests))
+
+    first = Counter(lane for _, lane in order[:100])
+    assert first["bulk"] == 10 and first["interactive"] == 90
+    # Once interactive work is done, bulk gets the whole model
+    assert all(lane == "bulk" for _, lane in order[-35:])
+
+
+def test_idle_time_earns_no_credit():
+    scheduler = FairScheduler(capacity=1)
+
+    async def main():
+        await dispatch_order(scheduler, [("a", "interactive")] * 20)
+        # b was idle while a ran alone: it now alternates with a instead of running 20 in a row
+        return await dispatch_order(scheduler, [("b", "interactive")] * 10 + [("a", "interactive")] * 10)
+
+    order = asyncio.run(main())
+    assert Counter(tenant for tenant, _ in order[:10]) == {"a": 5, "b": 5}
+
+
+def test_cancelled_waiters_are_removed():
+    scheduler = FairScheduler(capacity=1)
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("holder"):
+                await gate.wait()
+
+        async def wait_for_slot():
+            async with scheduler.slot("gone"):
+                raise AssertionError("a cancelled waiter must not run")
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(wait_for_slot()) for _ in range(3)]
+        await asyncio.sleep(0)
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        stats = scheduler.stats()
+        assert stats["waiting"] == 0 and "gone" not in stats["tenants"]
+        assert not scheduler._flows["interactive"]
+        gate.set()
+        await holder
+        # The capacity is free for the next caller
+        async with scheduler.slot("next"):
+            return scheduler.stats()["in_use"]
+
+    assert asyncio.run(main()) == 1
+    assert scheduler.stats()["in_use"] == 0
+
+
+def test_a_slot_granted_to_a_cancelled_caller_is_given_back():
+    scheduler = FairScheduler(capacity=1)
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("holder"):
+                await gate.wait()
+
+        async def wait_for_slot():
+            async with scheduler.slot("late"):
+                raise AssertionError("a cancelled waiter must not run")
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        late = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+        gate.set()
+        await holder  # releasing hands the slot to `late`...
+        late.cancel()  # ...which goes away before it resumes
+        await asyncio.gather(late, return_exceptions=True)
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert stats["in_use"] == 0 and stats["tenants"] == {}
+
+
+def test_queue_limits():
+    scheduler = FairScheduler(capacity=1, tenants={"a": TenantPolicy(max_queue=2)}, max_queue=3)
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def hold(tenant):
+            async with scheduler.slot(tenant):
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold(tenant)) for tenant in ("a", "a", "a")]
+        await asyncio.sleep(0)
+        # One runs and two wait: a third waiting request from the same tenant is refused
+        with pytest.raises(TenantQueueFull):
+            await scheduler.slot("a").__aenter__()
+        tasks.append(asyncio.create_task(hold("b")))
+        await asyncio.sleep(0)
+        # Three waiting in total: even a new tenant is refused now
+        with pytest.raises(InferenceQueueFull):
+            await scheduler.slot("c").__aenter__()
+        gate.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert scheduler.stats()["tenants"]["a"]["rejected"] == 1 and scheduler.rejected == 1
+
+
+def test_max_concurrency_caps_a_tenant():
+    scheduler = FairScheduler(capacity=4, tenants={"batch": TenantPolicy(max_concurrency=2)})
+    peak = 0
+
+    async def main():
+        nonlocal peak
+
+        async def request():
+            nonlocal peak
+            async with scheduler.slot("batch"):
+                peak = max(peak, scheduler.stats()["tenants"]["batch"]["running"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+
+
+def test_caller_identification():
+    scheduler = FairScheduler(tenants={"agents": TenantPolicy(api_keys=["secret"])})
+    assert scheduler.caller({"x-api-key": "secret"}).tenant == "agents"
+    assert scheduler.caller({"authorization": "Bearer secret"}).tenant == "agents"
+    assert scheduler.caller({"x-api-key": "other"}).tenant == "anonymous"
+    assert scheduler.caller({"x-ocr-tenant": "planner"}).tenant == "planner"
+    # A tenant with API keys cannot be claimed by name
+    assert scheduler.caller({"x-ocr-tenant": "agents"}).tenant == "anonymous"
+    assert scheduler.caller({"x-ocr-lane": "bulk"}).lane == "bulk"
+    assert scheduler.caller({"x-ocr-lane": "vip"}, default_lane="bulk").lane == "bulk"
+
+
+def test_made_up_keys_and_tenant_names_do_not_grow_state():
+    scheduler = FairScheduler(capacity=1, tenants={"agents": TenantPolicy(weight=4)}, max_tenants=8)
+
+    async def main():
+        gate = asyncio.Event()
+        peak = 0
+
+        async def request(headers):
+            nonlocal peak
+            caller = scheduler.caller(headers)
+            async with scheduler.slot(caller.tenant, caller.lane):
+                peak = max(peak, len(scheduler._tenants))
+                await gate.wait()
+
+        tasks = [asyncio.create_task(request({"x-api-key": f"random-{i}"})) for i in range(200)]
+        tasks += [asyncio.create_task(request({"x-ocr-tenant": f"name-{i}"})) for i in range(200)]
+        tasks.append(asyncio.create_task(request({"x-ocr-tenant": "agents"})))
+        await asyncio.sleep(0)
+        # Unknown keys share `anonymous`; names beyond max_tenants do too
+        assert len(scheduler._tenants) <= 8 + 2
+        assert scheduler.stats()["tenants"]["anonymous"]["waiting"] >= 200
+        gate.set()
+        await asyncio.gather(*tasks)
+        return peak
+
+    assert asyncio.run(main()) <= 10
+    # Idle unconfigured tenants are forgotten, configured ones keep their counters
+    assert list(scheduler._tenants) == ["agents"]
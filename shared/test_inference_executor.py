@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from shared.inference_executor import InferenceExecutor, InferenceQueueFull
+
+
+def test_runs_off_the_event_loop():
+    executor = InferenceExecutor(max_workers=1, max_pending=0, name="test-inference")
+
+    async def main():
+        return await executor.run(lambda x, y=0: (threading.current_thread().name, x + y), 1, y=2)
+
+    try:
+        name, value = asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert name.startswith("test-inference") and value == 3
+    assert executor.stats()["completed"] == 1
+
+
+def test_rejects_beyond_workers_plus_pending():
+    release = threading.Event()
+    executor = InferenceExecutor(max_workers=1, max_pending=2)
+
+    async def main():
+        calls = [asyncio.create_task(executor.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert executor.inflight == executor.capacity == 3
+        with pytest.raises(InferenceQueueFull):
+            await executor.run(lambda: None)
+        release.set()
+        await asyncio.gather(*calls)
+        # Slots are free again once the calls finished
+        return await executor.run(lambda: "ok")
+
+    try:
+        assert asyncio.run(main()) == "ok"
+    finally:
+        release.set()
+        executor.shutdown()
+    stats = executor.stats()
+    assert (stats["completed"], stats["rejected"], stats["inflight"]) == (4, 1, 0)
+
+
+def test_cancelled_caller_keeps_its_slot_until_the_call_ends():
+    started, release = threading.Event(), threading.Event()
+    executor = InferenceExecutor(max_workers=1, max_pending=0)
+
+    def generate():
+        started.set()
+        release.wait(5)
+
+    async def main():
+        call = asyncio.create_task(executor.run(generate))
+        await asyncio.to_thread(started.wait, 5)
+        call.cancel()
+        await asyncio.sleep(0.01)
+        # The model is still busy, so there is still no room
+        with pytest.raises(InferenceQueueFull):
+            await executor.run(lambda: None)
+        release.set()
+        while executor.inflight:
+            await asyncio.sleep(0.01)
+        return await executor.run(lambda: "free")
+
+    try:
+        assert asyncio.run(main()) == "free"
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_errors_are_raised_and_counted():
+    executor = InferenceExecutor()
+
+    def fail():
+        raise ValueError("bad image")
+
+    async def main():
+        await executor.run(fail)
+
+    try:
+        with pytest.raises(ValueError, match="bad image"):
+            asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert executor.stats()["failed"] == 1 and executor.inflight == 0
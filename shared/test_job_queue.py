@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+import shared.job_queue as job_queue
+from shared.job_queue import JobQueue, JobRetry, check_webhook_url
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://example.com/x", "gopher://h", "http://", "not a url"])
+def test_webhook_url_must_be_http(url):
+    with pytest.raises(ValueError):
+        check_webhook_url(url)
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8080/", "http://localhost/", "http://10.1.2.3/", "http://192.168.0.5/",
+    "http://169.254.169.254/latest/meta-data", "http://[::1]/", "http://[::ffff:127.0.0.1]/",
+    "http://0.0.0.0/", "http://100.64.0.1/", "http://224.0.0.1/", "http://240.0.0.1/",
+])
+def test_webhooks_to_internal_addresses_are_refused_without_an_allow_list(url):
+    with pytest.raises(ValueError, match="non-public address"):
+        check_webhook_url(url)
+
+
+def test_webhook_host_is_resolved_without_an_allow_list(monkeypatch):
+    addresses = {"hooks.example.com": ["93.184.215.14"], "rebound.example.com": ["93.184.215.14", "10.0.0.7"]}
+    monkeypatch.setattr(job_queue, "resolve_host", lambda host: addresses[host])
+    check_webhook_url("https://hooks.example.com/done")
+    # Every address must be public, not just the first
+    with pytest.raises(ValueError, match="10.0.0.7"):
+        check_webhook_url("https://rebound.example.com/done")
+
+    def unresolvable(host):
+        raise OSError("Name or service not known")
+
+    monkeypatch.setattr(job_queue, "resolve_host", unresolvable)
+    with pytest.raises(ValueError, match="cannot be resolved"):
+        check_webhook_url("https://nowhere.invalid/")
+
+
+def test_webhook_allow_list():
+    allowed = ["hooks.internal", "*.example.com"]
+    check_webhook_url("https://hooks.internal/done", allowed)
+    check_webhook_url("http://api.example.com:8080/cb", allowed)
+    for url in ("http://169.254.169.254/latest", "http://example.com.evil.io/", "http://hooks.internal.evil/"):
+        with pytest.raises(ValueError):
+            check_webhook_url(url, allowed)
+
+
+def test_submit_rejects_webhook(tmp_path):
+    async def run():
+        # The allow-list is the operator's choice: an internal host on it is fine
+        jobs = JobQueue(str(tmp_path / "jobs.db"), webhook_hosts=["hooks.internal"])
+        with pytest.raises(ValueError):
+            await jobs.submit("image", {}, webhook_url="file:///etc/passwd")
+        with pytest.raises(ValueError):
+            await jobs.submit("image", {}, webhook_url="http://localhost:9/")
+        assert jobs.counts() == {}
+        await jobs.submit("image", {}, webhook_url="http://hooks.internal/done")
+        assert jobs.counts() == {"queued": 1}
+        jobs.close()
+
+        jobs = JobQueue(str(tmp_path / "default.db"))
+        with pytest.raises(ValueError, match="non-public"):
+            await jobs.submit("image", {}, webhook_url="http://169.254.169.254/latest/meta-data")
+        assert jobs.counts() == {}
+        jobs.close()
+
+    asyncio.run(run())
+
+
+def test_delivery_rechecks_the_url(tmp_path, monkeypatch):
+    addresses = ["93.184.215.14"]
+    opened = []
+    monkeypatch.setattr(job_queue, "resolve_host", lambda host: addresses)
+    monkeypatch.setattr(job_queue.urllib.request, "build_opener", lambda *handlers: opened.append(handlers))
+
+    async def run():
+        jobs = JobQueue(str(tmp_path / "jobs.db"), webhook_retries=1)
+
+        async def handler(kind, payload):
+            # The host was public at submit time and points inside the network by delivery time
+            addresses[:] = ["127.0.0.1"]
+            return {}
+
+        await jobs.start(handler)
+        job = await jobs.submit("image", {}, webhook_url="https://hooks.example.com/done")
+        await jobs.wait(job.id, 5)
+        await asyncio.gather(*jobs._background)
+        assert opened == []
+        assert (await jobs.get(job.id)).webhook_status == "failed"
+        await jobs.stop()
+        jobs.close()
+
+    asyncio.run(run())
+
+
+def test_wait_does_not_keep_events_of_unfinished_jobs(tmp_path):
+    async def run():
+        jobs = JobQueue(str(tmp_path / "jobs.db"))
+        job = await jobs.submit("image", {})
+        results = await asyncio.gather(*(jobs.wait(job.id, 0.05) for _ in range(3)))
+        assert [result.status for result in results] == ["queued"] * 3
+        assert jobs._done_events == {} and jobs._waiters == {}
+        assert await jobs.wait("unknown", 0.05) is None
+        assert jobs._done_events == {}
+        jobs.close()
+
+    asyncio.run(run())
+
+
+def test_wait_returns_when_job_finishes(tmp_path):
+    async def run():
+        jobs = JobQueue(str(tmp_path / "jobs.db"))
+
+        async def handler(kind, payload):
+            await asyncio.sleep(0.05)
+            return {"ok": payload["n"]}
+
+        await jobs.start(handler)
+        job = await jobs.submit("image", {"n": 1})
+        finished = await jobs.wait(job.id, 5)
+        assert finished.status == "succeeded" and finished.result == {"ok": 1}
+        assert jobs._done_events == {}
+        await jobs.stop()
+        jobs.close()
+
+    asyncio.run(run())
+
+
+def test_retries_are_capped(tmp_path):
+    async def run():
+        jobs = JobQueue(str(tmp_path / "jobs.db"), max_retries=3)
+        calls = []
+
+        async def handler(kind, payload):
+            calls.append(kind)
+            raise JobRetry("busy", delay=0)
+
+        await jobs.start(handler)
+        job = await jobs.wait((await jobs.submit("image", {})).id, 10)
+        assert job.status == "failed"
+        assert job.error == "Gave up after 3 retries: busy"
+        assert len(calls) == 4
+        await jobs.stop()
+        jobs.close()
+
+    asyncio.run(run())
+
+
+def test_priority_order(tmp_path):
+    async def run():
+        jobs = JobQueue(str(tmp_path / "jobs.db"))
+        order = []
+
+        async def handler(kind, payload):
+            order.append(payload["name"])
+
+        ids = [(await jobs.submit("image", {"name": name}, priority=priority)).id
+               for name, priority in [("low", "low"), ("normal", "normal"), ("high", "high")]]
+        await jobs.start(handler)
+        for job_id in ids:
+            await jobs.wait(job_id, 5)
+        assert order == ["high", "normal", "low"]
+        await jobs.stop()
+        jobs.close()
+
+    asyncio.run(run())
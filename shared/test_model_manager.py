@@ -0,0 +1,246 @@
+import asyncio
+import threading
+
+import pytest
+
+from shared.model_manager import ModelManager, ModelNotReady
+
+
+class Loader:
+    """Loads `model@revision` strings, optionally blocking until `gate` is set."""
+
+    def __init__(self, gated: bool = False, fail: set = ()):
+        self.gate = threading.Event()
+        if not gated:
+            self.gate.set()
+        self.fail = set(fail)
+        self.loaded, self.warmed, self.unloaded = [], [], []
+
+    def load(self, revision):
+        self.gate.wait(5)
+        if revision in self.fail:
+            raise RuntimeError(f"no revision {revision}")
+        self.loaded.append(revision)
+        return f"model@{revision}"
+
+    def warmup(self, model):
+        self.warmed.append(model)
+
+    def unload(self, model):
+        self.unloaded.append(model)
+
+    def manager(self, **kwargs) -> ModelManager:
+        return ModelManager(self.load, warmup=self.warmup, unload=self.unload, **kwargs)
+
+
+async def until(condition, timeout: float = 5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.005)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_background_load_is_not_ready_until_warmed_up():
+    loader = Loader(gated=True)
+    manager = loader.manager(revision="v1")
+
+    async def main():
+        await manager.start()
+        await until(lambda: manager.state == "loading")
+        assert not manager.ready
+        with pytest.raises(ModelNotReady, match="not ready"):
+            manager.check()
+        with pytest.raises(ModelNotReady):
+            with manager.lease():
+                pass
+        loader.gate.set()
+        await until(lambda: manager.ready)
+        with manager.lease() as model:
+            return model
+
+    assert asyncio.run(main()) == "model@v1"
+    # Warmed up before it served anything
+    assert loader.warmed == ["model@v1"]
+    assert manager.status()["current"]["served"] == 1
+
+
+def test_failed_load_is_reported():
+    manager = Loader(fail={"bad"}).manager(revision="bad")
+
+    async def main():
+        await manager.start()
+        await until(lambda: manager.state == "failed")
+
+    asyncio.run(main())
+    with pytest.raises(ModelNotReady, match="Model failed to load: no revision bad"):
+        manager.check()
+    assert manager.status()["error"] == "no revision bad"
+
+
+def test_blocking_mode_is_ready_after_start():
+    manager = Loader().manager(mode="blocking")
+    asyncio.run(manager.start())
+    assert manager.ready and manager.state == "ready"
+
+
+def test_lazy_mode_loads_once_on_the_first_lease():
+    loader = Loader()
+    manager = loader.manager(mode="lazy")
+    asyncio.run(manager.start())
+    # Ready to accept requests before anything is loaded
+    assert manager.ready and not manager.loaded
+
+    def infer():
+        with manager.lease() as model:
+            return model
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(infer())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["model@None"] * 4
+    assert loader.loaded == [None]
+
+
+def test_hot_swap_drains_the_old_version_before_unloading_it():
+    loader = Loader()
+    swapped = []
+    manager = loader.manager(revision="v1", mode="blocking", on_ready=lambda version: swapped.append(version.revision))
+
+    async def main():
+        await manager.start()
+        leased, done = threading.Event(), threading.Event()
+
+        def slow_request():
+            with manager.lease() as model:
+                leased.set()
+                done.wait(5)
+                return model
+
+        old_request = asyncio.create_task(asyncio.to_thread(slow_request))
+        await asyncio.to_thread(leased.wait, 5)
+
+        swap = manager.start_swap("v2")
+        with pytest.raises(RuntimeError, match="already running"):
+            manager.start_swap("v3")
+        await until(lambda: manager.revision == "v2")
+
+        # New requests get v2 while the old request still holds v1
+        with manager.lease() as model:
+            assert model == "model@v2"
+        status = manager.status()
+        assert status["swapping_to"] == "v2" and status["retiring"][0]["in_flight"] == 1
+        assert loader.unloaded == []
+
+        done.set()
+        assert await old_request == "model@v1"
+        await swap
+        return manager.status()
+
+    status = asyncio.run(main())
+    assert loader.unloaded == ["model@v1"]
+    assert swapped == ["v1", "v2"]
+    assert status["swaps"] == 1 and status["retiring"] == [] and status["swapping_to"] is None
+    assert loader.warmed == ["model@v1", "model@v2"]
+
+
+def test_failed_swap_keeps_the_current_version_serving():
+    loader = Loader(fail={"broken"})
+    manager = loader.manager(revision="v1", mode="blocking")
+
+    async def main():
+        await manager.start()
+        with pytest.raises(RuntimeError, match="no revision broken"):
+            await manager.swap("broken")
+
+    asyncio.run(main())
+    assert manager.ready and manager.revision == "v1" and not manager.swapping
+    with manager.lease() as model:
+        assert model == "model@v1"
+    assert loader.unloaded == []
+
+
+def test_swap_after_a_failed_load_loads_the_new_revision():
+    manager = Loader(fail={"bad"}).manager(revision="bad", mode="blocking")
+
+    async def main():
+        await manager.start()
+        assert manager.state == "failed"
+        await manager.swap("good")
+
+    asyncio.run(main())
+    assert manager.ready and manager.revision == "good"
+
+
+def test_unknown_load_mode():
+    with pytest.raises(ValueError):
+        ModelManager(lambda revision: None, mode="eager")
+
+
+def test_stop_waits_for_in_flight_leases_before_unloading():
+    loader = Loader()
+    manager = loader.manager(revision="v1", mode="blocking")
+
+    async def main():
+        await manager.start()
+        leased, release = threading.Event(), threading.Event()
+
+        def infer():
+            with manager.lease():
+                leased.set()
+                release.wait(5)
+
+        inference = asyncio.create_task(asyncio.to_thread(infer))
+        await asyncio.to_thread(leased.wait, 5)
+        stopping = asyncio.create_task(manager.stop())
+        await until(lambda: not manager.loaded)
+        # No new leases, and the in-flight one keeps its model
+        with pytest.raises(ModelNotReady):
+            manager.check()
+        with pytest.raises(ModelNotReady):
+            with manager.lease():
+                pass
+        assert manager.status()["retiring"][0]["in_flight"] == 1
+        await asyncio.sleep(0.05)
+        assert loader.unloaded == []
+
+        release.set()
+        await inference
+        await stopping
+        assert loader.unloaded == ["model@v1"]
+        assert manager.status()["retiring"] == []
+
+    asyncio.run(main())
+
+
+def test_stop_unloads_after_the_timeout_even_with_leases():
+    loader = Loader()
+    manager = loader.manager(mode="blocking")
+
+    async def main():
+        await manager.start()
+        with manager.lease():
+            await manager.stop(timeout=0.05)
+            assert loader.unloaded == ["model@None"]
+
+    asyncio.run(main())
+
+
+def test_a_load_finishing_after_stop_does_not_go_live():
+    loader = Loader(gated=True)
+    manager = loader.manager(revision="v1")
+
+    async def main():
+        await manager.start()
+        await until(lambda: manager.state == "loading")
+        await manager.stop()
+        loader.gate.set()
+        await until(lambda: loader.unloaded == ["model@v1"])
+        assert not manager.loaded and manager.state == "idle"
+        with pytest.raises(ModelNotReady):
+            manager.check()
+
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+import sys
+import types
+
+import pytest
+from PIL import Image
+
+from shared.ocr_backends import BackendConfig, FakeOCRModel, OpenAIBackend, create_backend
+
+ENV = (
+    "OCR_BACKEND", "OCR_FAKE_MODEL", "OCR_DEVICE", "OCR_DTYPE", "OCR_QUANTIZE", "OCR_CPU_THREADS",
+    "OCR_OPENAI_BASE_URL", "OCR_OPENAI_MODEL", "OCR_OPENAI_CONCURRENCY", "OCR_OPENAI_RETRIES",
+)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    for name in ENV:
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def items(n: int = 2) -> list:
+    schema = pytest.importorskip("chandra.model.schema")
+    return [schema.BatchInputItem(image=Image.new("RGB", (60, 40)), prompt_type="ocr_layout") for _ in range(n)]
+
+
+def test_defaults_keep_the_original_model_setup(env):
+    config = BackendConfig.from_env()
+    assert (config.backend, config.device, config.dtype, config.quantize) == ("hf", "auto", "default", "none")
+    # Same cache keys as before backends existed
+    assert config.key() == ""
+
+
+def test_from_env(env):
+    env.setenv("OCR_BACKEND", "openai")
+    env.setenv("OCR_OPENAI_BASE_URL", "http://vllm:8000/v1")
+    env.setenv("OCR_OPENAI_MODEL", "chandra-int4")
+    env.setenv("OCR_OPENAI_CONCURRENCY", "16")
+    config = BackendConfig.from_env()
+    assert (config.backend, config.base_url, config.model_name, config.concurrency) == (
+        "openai", "http://vllm:8000/v1", "chandra-int4", 16
+    )
+    assert config.key() == "openai:chandra-int4"
+
+    env.delenv("OCR_BACKEND")
+    env.setenv("OCR_DTYPE", "bfloat16")
+    env.setenv("OCR_DEVICE", "cpu")
+    env.setenv("OCR_CPU_THREADS", "4")
+    config = BackendConfig.from_env()
+    assert (config.device, config.dtype, config.threads) == ("cpu", "bfloat16", 4)
+    # An opt-in dtype changes outputs, so it gets its own cache entries
+    assert config.key() == "hf:bfloat16:none"
+    assert BackendConfig(quantize="int8").key() == "hf:default:int8"
+
+
+def test_legacy_fake_model_flag(env):
+    env.setenv("OCR_FAKE_MODEL", "1")
+    assert BackendConfig.from_env().backend == "fake"
+    env.setenv("OCR_BACKEND", "hf")
+    assert BackendConfig.from_env().backend == "hf"
+
+
+@pytest.mark.parametrize("field, value", [("backend", "onnx"), ("dtype", "int4"), ("quantize", "int4")])
+def test_unknown_values_are_rejected(field, value):
+    with pytest.raises(ValueError, match=value):
+        BackendConfig(**{field: value})
+
+
+def test_fake_backend_is_selected(env):
+    env.setenv("OCR_BACKEND", "fake")
+    backend = create_backend(BackendConfig.from_env(), revision="v2")
+    assert isinstance(backend, FakeOCRModel)
+    assert backend.info() == {"backend": "fake", "revision": "v2"}
+
+    backend.latency_ms = backend.per_item_ms = 0
+    results = backend.generate(items())
+    assert [result.raw for result in results] == ["<p>Fake OCR 60x40 ocr_layout (v2)</p>"] * 2
+    assert backend.calls == 1
+
+
+class FakeOpenAI:
+    """Stub of `openai.OpenAI`: answers each completion with the next of `replies`."""
+
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.requests = []
+        self.replies = iter([])
+        self.closed = False
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+        FakeOpenAI.instances.append(self)
+
+    def create(self, **request):
+        self.requests.append(request)
+        reply = next(self.replies)
+        if isinstance(reply, Exception):
+            raise reply
+        message = types.SimpleNamespace(content=reply)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=message)],
+            usage=types.SimpleNamespace(completion_tokens=len(reply.split())),
+        )
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def openai(env):
+    FakeOpenAI.instances.clear()
+    env.setitem(sys.modules, "openai", types.SimpleNamespace(OpenAI=FakeOpenAI))
+    env.setenv("OCR_BACKEND", "openai")
+    env.setenv("OCR_OPENAI_BASE_URL", "http://vllm:8000/v1")
+    # One request at a time, so the replies are consumed in order
+    env.setenv("OCR_OPENAI_CONCURRENCY", "1")
+    return env
+
+
+def test_openai_backend_is_selected(openai):
+    backend = create_backend(BackendConfig.from_env(), revision="served-model")
+    assert isinstance(backend, OpenAIBackend)
+    client = FakeOpenAI.instances[-1]
+    assert client.kwargs["base_url"] == "http://vllm:8000/v1"
+    # The revision names the served model
+    assert backend.info() == {
+        "backend": "openai", "revision": "served-model", "base_url": "http://vllm:8000/v1", "model": "served-model"
+    }
+    backend.close()
+    assert client.closed
+
+
+def test_openai_backend_retries_failed_and_repetitive_generations(openai):
+    backend = create_backend(BackendConfig.from_env())
+    client = FakeOpenAI.instances[-1]
+    client.replies = iter([
+        "<p>page one</p>",
+        RuntimeError("connection reset"), "<p>page two</p>",
+        "<p>" + "ab " * 400 + "</p>", "<p>page three</p>",
+    ])
+    results = backend.generate(items(3))
+    assert [result.raw for result in results] == ["<p>page one</p>", "<p>page two</p>", "<p>page three</p>"]
+    assert not any(result.error for result in results)
+    # Greedy first, sampling for the retries
+    assert [request["temperature"] for request in client.requests] == [0, 0, 0.3, 0, 0.3]
+    assert all(request["model"] == "chandra" for request in client.requests)
+    backend.close()
+
+
+def test_openai_backend_reports_an_error_after_its_retries(openai):
+    openai.setenv("OCR_OPENAI_RETRIES", "1")
+    backend = create_backend(BackendConfig.from_env())
+    client = FakeOpenAI.instances[-1]
+    client.replies = iter([RuntimeError("down"), RuntimeError("still down")])
+    [result] = backend.generate(items(1))
+    assert result.error and result.raw == ""
+    assert len(client.requests) == 2
+    backend.close()
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+
+from shared.ocr_cache import OCRCache
+
+
+def value(n: int, size: int = 100) -> dict:
+    """An entry whose JSON encoding is exactly `size` bytes."""
+    padding = size - len(json.dumps({"i": n, "text": ""}))
+    return {"i": n, "text": "x" * padding}
+
+
+def test_keys_depend_on_every_parameter():
+    cache = OCRCache("model-a")
+    key = cache.key(b"image", "ocr_layout")
+    assert key == cache.key_for_digest(hashlib.sha256(b"image").hexdigest(), "ocr_layout")
+    assert len({
+        key,
+        cache.key(b"other", "ocr_layout"),
+        cache.key(b"image", "ocr"),
+        cache.key(b"image", None, "custom prompt"),
+        cache.key(b"image", "ocr_layout", variant="tiles"),
+        OCRCache("model-b").key(b"image", "ocr_layout"),
+    }) == 6
+
+
+def test_memory_tier_evicts_least_recently_used_within_the_byte_budget():
+    cache = OCRCache("m", max_bytes=300)
+    for n in range(3):
+        cache.put(f"k{n}", value(n))
+    assert cache.get("k0") == value(0)  # k0 is now the most recently used
+
+    cache.put("k3", value(3))
+    assert cache.get("k1") is None
+    assert [cache.get(f"k{n}") for n in (0, 2, 3)] == [value(0), value(2), value(3)]
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (3, 300, 1)
+
+    # Entries larger than the whole budget are not kept
+    cache.put("big", value(9, size=301))
+    assert cache.get("big") is None and cache.stats()["entries"] == 3
+
+
+def test_counters():
+    cache = OCRCache("m")
+    assert cache.get("k") is None
+    cache.put("k", value(1))
+    cache.get("k")
+    cache.get("k")
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (2, 0, 1)
+    assert not stats["disk_enabled"]
+
+
+def test_disk_tier_survives_a_reopen(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = OCRCache("m", disk_path=path)
+    cache.put("k", value(1))
+    cache.close()
+
+    reopened = OCRCache("m", disk_path=path)
+    assert reopened.stats()["disk_bytes"] == 100
+    assert reopened.get("k") == value(1)
+    assert reopened.get("k") == value(1)
+    stats = reopened.stats()
+    # The disk hit is promoted to memory
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    reopened.close()
+
+
+def test_disk_tier_evicts_least_recently_used_within_the_byte_budget(tmp_path):
+    cache = OCRCache("m", max_bytes=0, disk_path=str(tmp_path / "cache.db"), max_disk_bytes=300)
+    for n in range(3):
+        cache.put(f"k{n}", value(n))
+    cache.get("k0")
+    cache.put("k3", value(3))
+    assert cache.get("k1") is None
+    assert all(cache.get(f"k{n}") is not None for n in (0, 2, 3))
+    stats = cache.stats()
+    assert (stats["disk_bytes"], stats["disk_evictions"]) == (300, 1)
+    cache.close()
+
+
+def test_disk_budget_counts_entries_written_by_another_process(tmp_path):
+    path = str(tmp_path / "cache.db")
+    rest = OCRCache("m", max_bytes=0, disk_path=path, max_disk_bytes=300)
+    mcp = OCRCache("m", max_bytes=0, disk_path=path, max_disk_bytes=300)
+    rest.put("a", value(1))
+    rest.put("b", value(2))
+    # `mcp` opened before these were written; the budget is still shared
+    mcp.put("c", value(3))
+    mcp.put("d", value(4))
+    assert mcp.get("a") is None
+    assert mcp.stats()["disk_bytes"] == 300
+    assert sorted(k for k in "abcd" if rest.get(k) is not None) == ["b", "c", "d"]
+    rest.close()
+    mcp.close()
+
+
+def test_async_access(tmp_path):
+    async def run():
+        cache = OCRCache("m", disk_path=str(tmp_path / "cache.db"))
+        assert await cache.aget("k") is None
+        await cache.aput("k", value(1))
+        assert await cache.aget("k") == value(1)
+        cache.close()
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["memory_hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,114 @@
+import io
+
+import pytest
+from PIL import Image
+
+from shared.ocr_preprocess import (
+    EXIF_ORIENTATION,
+    PreprocessConfig,
+    merge_tile_text,
+    preprocess,
+    resize_to_pixels,
+    split_tiles,
+)
+
+
+def encode(image: Image.Image, format: str, **params) -> io.BytesIO:
+    buffer = io.BytesIO()
+    image.save(buffer, format, **params)
+    buffer.seek(0)
+    return buffer
+
+
+def test_small_images_are_not_resized():
+    prepared = preprocess(encode(Image.new("RGB", (200, 100), "white"), "PNG"), PreprocessConfig(max_pixels=100_000))
+    assert prepared.size == prepared.original_size == (200, 100)
+    assert len(prepared.tiles) == 1 and prepared.tiles[0].mode == "RGB"
+    assert set(prepared.timings_ms) == {"decode", "orient", "resize"}
+
+
+def test_resize_keeps_the_aspect_ratio_within_the_budget():
+    image = resize_to_pixels(Image.new("RGB", (4000, 3000)), 1_200_000)
+    assert image.size == (1264, 948)
+    assert image.size[0] * image.size[1] <= 1_200_000
+    # Never upsamples
+    small = Image.new("RGB", (10, 10))
+    assert resize_to_pixels(small, 1_000_000) is small
+
+
+def test_large_jpegs_are_decoded_at_a_reduced_scale():
+    source = encode(Image.new("RGB", (4000, 3000), "gray"), "JPEG")
+    prepared = preprocess(source, PreprocessConfig(max_pixels=500_000))
+    assert prepared.original_size == (4000, 3000)
+    assert prepared.size[0] * prepared.size[1] <= 500_000
+    assert abs(prepared.size[0] / prepared.size[1] - 4 / 3) < 0.01
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6  # stored sideways: rotate 90° clockwise to display
+    source = encode(Image.new("RGB", (300, 100)), "JPEG", exif=exif.tobytes())
+    assert preprocess(source, PreprocessConfig()).size == (100, 300)
+    source.seek(0)
+    assert preprocess(source, PreprocessConfig(auto_orient=False)).size == (300, 100)
+
+
+def test_palette_and_grayscale_images_become_rgb():
+    for mode in ("P", "L", "1", "RGBA"):
+        prepared = preprocess(encode(Image.new(mode, (400, 400)), "PNG"), PreprocessConfig(max_pixels=40_000))
+        assert prepared.tiles[0].mode == "RGB"
+        assert prepared.size == (200, 200)
+
+
+def test_target_dpi_downsamples_high_resolution_scans():
+    source = encode(Image.new("RGB", (1200, 1200)), "PNG", dpi=(600, 600))
+    assert preprocess(source, PreprocessConfig(target_dpi=300)).size == (600, 600)
+
+
+def test_decoded_images_skip_the_decode_stage():
+    prepared = preprocess(Image.new("RGB", (50, 50)), PreprocessConfig())
+    assert "decode" not in prepared.timings_ms
+
+
+@pytest.mark.parametrize("size", [(1000, 4000), (1000, 3800), (1000, 2500), (997, 4321), (2480, 3508), (1000, 9000)])
+@pytest.mark.parametrize("overlap", [0.0, 0.1, 0.3])
+def test_tiles_stay_within_the_pixel_budget(size, overlap):
+    max_pixels, max_tiles = 1_000_000, 4
+    tiles = split_tiles(Image.new("RGB", size), max_pixels, max_tiles, overlap)
+    assert 1 <= len(tiles) <= max_tiles
+    for tile in tiles:
+        assert tile.size[0] * tile.size[1] <= max_pixels
+
+
+def test_tiles_cover_the_page_with_overlap():
+    image = Image.new("RGB", (1000, 3500))
+    tiles = split_tiles(image, 1_000_000, 4, 0.1)
+    assert len(tiles) == 4
+    assert all(tile.size[0] == 1000 for tile in tiles)
+    covered = sum(tile.size[1] for tile in tiles)
+    assert image.size[1] < covered <= image.size[1] * 1.15
+
+
+def test_tiled_preprocess_fits_each_strip_in_the_budget():
+    config = PreprocessConfig(max_pixels=1_000_000, tile=True, max_tiles=4, tile_overlap=0.1)
+    prepared = preprocess(Image.new("RGB", (2000, 8000)), config)
+    assert len(prepared.tiles) == 4
+    assert all(tile.size[0] * tile.size[1] <= config.max_pixels for tile in prepared.tiles)
+
+
+def test_merge_drops_repeated_lines_without_adding_blank_lines():
+    parts = [
+        "# Report\nFirst paragraph of the page.\nSecond paragraph, in the overlap.",
+        "Second paragraph, in the overlap.\nThird paragraph.",
+    ]
+    assert merge_tile_text(parts) == (
+        "# Report\nFirst paragraph of the page.\nSecond paragraph, in the overlap.\nThird paragraph."
+    )
+
+
+def test_merge_keeps_short_lines_repeated_at_a_seam():
+    parts = ["| a | b |\n|---|---|\n| 1 | 2 |\n---", "---\n| 3 | 4 |"]
+    assert merge_tile_text(parts) == "| a | b |\n|---|---|\n| 1 | 2 |\n---\n---\n| 3 | 4 |"
+    # A long enough run that ends in the short line still counts
+    parts = ["Totals for the quarter\n---", "Totals for the quarter\n---\nNext section"]
+    assert merge_tile_text(parts) == "Totals for the quarter\n---\nNext section"
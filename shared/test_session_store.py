@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from google.adk.events import Event, EventActions  # noqa: E402
+
+from shared.session_store import BoundedSessionService  # noqa: E402
+
+APP, USER = "ocr_agent", "u1"
+
+
+def event(**state_delta) -> Event:
+    return Event(author="user", invocation_id="i", actions=EventActions(state_delta=state_delta))
+
+
+def rows(service: BoundedSessionService, table: str = "sessions") -> int:
+    return service._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def stored_ids(service: BoundedSessionService) -> set[str]:
+    service.flush()
+    return {row[0] for row in service._db.execute("SELECT id FROM sessions")}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_sessions_expire_after_the_ttl():
+    async def main():
+        service = BoundedSessionService(":memory:", ttl=0.05)
+        session = await service.create_session(app_name=APP, user_id=USER)
+        assert await service.get_session(app_name=APP, user_id=USER, session_id=session.id) is not None
+        await asyncio.sleep(0.1)
+        assert await service.get_session(app_name=APP, user_id=USER, session_id=session.id) is None
+        assert service.stats()["expired"] == 1 and stored_ids(service) == set()
+
+    run(main())
+
+
+def test_sweep_expires_and_caps_sessions_that_are_not_in_use():
+    async def main():
+        service = BoundedSessionService(":memory:", ttl=0, max_sessions=3, max_cached=1)
+        for n in range(5):
+            await service.create_session(app_name=APP, user_id=USER, session_id=f"s{n}")
+            await asyncio.sleep(0.01)
+        # Queued sessions are in use too: commit them first
+        service.flush()
+        service.sweep()
+        # The least recently updated go first
+        assert stored_ids(service) == {"s2", "s3", "s4"}
+        assert service.stats()["evicted"] == 2
+
+        service.ttl = 0.05
+        await asyncio.sleep(0.1)
+        service.sweep()
+        # s4 is cached, so a runner may still hold it
+        assert stored_ids(service) == {"s4"}
+        assert service.stats()["expired"] == 2
+
+    run(main())
+
+
+def test_sweep_does_not_delete_a_session_a_runner_holds():
+    async def main():
+        service = BoundedSessionService(":memory:", max_sessions=1, max_cached=4)
+        held = await service.create_session(app_name=APP, user_id=USER, session_id="held")
+        await service.create_session(app_name=APP, user_id=USER, session_id="newer")
+        service.flush()
+        service.sweep()
+        assert stored_ids(service) == {"held", "newer"}
+        # Would raise "Session held not found." had the sweep deleted it
+        await service.append_event(held, event(step=1))
+        assert len((await service.get_session(app_name=APP, user_id=USER, session_id="held")).events) == 1
+
+    run(main())
+
+
+def test_least_recently_used_sessions_leave_the_cache():
+    async def main():
+        service = BoundedSessionService(":memory:", max_cached=2)
+        first = await service.create_session(app_name=APP, user_id=USER, session_id="a")
+        await service.append_event(first, event(step=1))
+        for session_id in ("b", "c"):
+            await service.create_session(app_name=APP, user_id=USER, session_id=session_id)
+        assert list(service._cache) == [(APP, USER, "b"), (APP, USER, "c")]
+
+        # Read back from sqlite, with its events and state
+        misses = service.cache_misses
+        session = await service.get_session(app_name=APP, user_id=USER, session_id="a")
+        assert len(session.events) == 1 and session.state == {"step": 1}
+        assert service.cache_misses == misses + 1 and service.stats()["cached"] == 2
+        assert list(service._cache) == [(APP, USER, "c"), (APP, USER, "a")]
+
+    run(main())
+
+
+def test_writes_are_batched():
+    async def main():
+        service = BoundedSessionService(":memory:", batch_size=3, flush_interval=60)
+        session = await service.create_session(app_name=APP, user_id=USER)
+        await service.append_event(session, event())
+        assert (rows(service), rows(service, "events"), service.stats()["pending_writes"]) == (0, 0, 2)
+        await service.append_event(session, event())
+        assert (rows(service), rows(service, "events"), service.stats()["pending_writes"]) == (1, 2, 0)
+        assert service.flushes == 1
+
+        # A lone write is committed after flush_interval
+        service.flush_interval = 0.02
+        await service.append_event(session, event())
+        await asyncio.sleep(0.1)
+        assert rows(service, "events") == 3 and service.flushes == 2
+
+    run(main())
+
+
+def test_state_updates_of_a_session_are_coalesced():
+    async def main():
+        service = BoundedSessionService(":memory:", batch_size=100, flush_interval=60)
+        session = await service.create_session(app_name=APP, user_id=USER, state={"pages": 0})
+        for pages in range(1, 4):
+            await service.append_event(session, event(pages=pages))
+        assert len(service._dirty) == 1 and len(service._new_events) == 3
+        service.flush()
+        state = service._db.execute("SELECT state FROM sessions").fetchone()[0]
+        assert state == '{"pages": 3}'
+
+    run(main())
+
+
+def test_app_and_user_state_are_shared_across_sessions():
+    async def main():
+        service = BoundedSessionService(":memory:")
+        first = await service.create_session(
+            app_name=APP, user_id=USER, state={"app:model": "chandra", "user:lang": "zh", "doc": "a.pdf", "temp:x": 1}
+        )
+        assert first.state == {"app:model": "chandra", "user:lang": "zh", "doc": "a.pdf"}
+
+        await service.append_event(first, event(**{"user:lang": "en"}))
+        second = await service.create_session(app_name=APP, user_id=USER)
+        assert second.state == {"app:model": "chandra", "user:lang": "en"}
+        other = await service.create_session(app_name=APP, user_id="u2")
+        assert other.state == {"app:model": "chandra"}
+
+        listed = await service.list_sessions(app_name=APP, user_id=USER)
+        assert {s.id: s.state.get("doc") for s in listed.sessions} == {first.id: "a.pdf", second.id: None}
+
+    run(main())
+
+
+def test_sessions_survive_a_reopen(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def write():
+        service = BoundedSessionService(path, flush_interval=60)
+        session = await service.create_session(app_name=APP, user_id=USER, session_id="s", state={"user:lang": "zh"})
+        await service.append_event(session, event(pages=2))
+        service.close()
+
+    async def read():
+        service = BoundedSessionService(path)
+        session = await service.get_session(app_name=APP, user_id=USER, session_id="s")
+        assert len(session.events) == 1
+        assert session.state == {"pages": 2, "user:lang": "zh"}
+        # Row ids continue after the stored ones
+        created = await service.create_session(app_name=APP, user_id=USER)
+        await service.append_event(created, event())
+        service.flush()
+        sids = dict(service._db.execute("SELECT id, sid FROM sessions").fetchall())
+        assert sids == {"s": 1, created.id: 2}
+        assert rows(service, "events") == 2
+        service.close()
+
+    run(write())
+    run(read())
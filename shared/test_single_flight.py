@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from shared.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def ocr():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"markdown": "# Page"}
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("image", ocr) for _ in range(5)), flight.do("other", ocr))
+        return results, flight.stats()
+
+    results, stats = asyncio.run(main())
+    assert results[:5] == [{"markdown": "# Page"}] * 5
+    assert len(calls) == 2
+    assert stats == {"inflight": 0, "waiting": 0, "executions": 2, "coalesced": 4, "max_waiters": 4}
+
+
+def test_key_is_released_when_the_call_finishes():
+    flight = SingleFlight()
+    calls = []
+
+    async def ocr():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        first = await flight.do("image", ocr)
+        assert not flight.is_inflight("image")
+        return first, await flight.do("image", ocr)
+
+    assert asyncio.run(main()) == (1, 2)
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def ocr():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model not ready")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("image", ocr) for _ in range(3)), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(main())] == ["model not ready"] * 3
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+    release = None
+
+    async def ocr():
+        await release.wait()
+        return "done"
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        leaving = asyncio.create_task(flight.do("image", ocr))
+        staying = asyncio.create_task(flight.do("image", ocr))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        assert flight.is_inflight("image")
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_waiting_counts_only_callers_still_waiting():
+    flight = SingleFlight()
+    release = None
+
+    async def ocr():
+        await release.wait()
+        return "done"
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(flight.do("image", ocr))
+        joiners = [asyncio.create_task(flight.do("image", ocr)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.stats()["waiting"] == 3
+        joiners[0].cancel()
+        await asyncio.sleep(0)
+        assert flight.stats()["waiting"] == 2
+        release.set()
+        assert await asyncio.gather(first, *joiners[1:]) == ["done"] * 3
+        return flight.stats()
+
+    stats = asyncio.run(main())
+    assert stats["waiting"] == 0 and stats["inflight"] == 0 and stats["max_waiters"] == 3
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence
+
+from shared.inference_executor import InferenceExecutor, InferenceQueueFull
+
+
+@dataclass
+class _Pending:
+    item: Any
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent inference requests into batches.
+
+    Requests are collected until `max_batch_size` items are pending or
+    `max_wait_ms` has passed since the worker picked up the first one, then
+    `generate_fn` is called once with the whole batch. Each caller receives
+    the result at its own position.
+
+    Args:
+        generate_fn: Callable taking a list of items and returning a list of
+            results of the same length (e.g. `lambda b: generate_hf(b, model)`).
+        max_batch_size: Maximum number of items per generate call.
+        max_wait_ms: How long to wait for more items once a batch is started.
+        max_queue_size: Pending items allowed before `submit` raises
+            `InferenceQueueFull` (0 for unbounded).
+        executor: Optional `InferenceExecutor` to run `generate_fn` on, keeping
+            the blocking call off the event loop.
+        wait_samples: Number of recent wait times kept for percentiles.
+    """
+
+    def __init__(
+        self,
+        generate_fn: Callable[[list], Sequence],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        max_queue_size: int = 0,
+        executor: Optional[InferenceExecutor] = None,
+        wait_samples: int = 1024,
+    ):
+        self.generate_fn = generate_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.max_queue_size = max(0, max_queue_size)
+        self.executor = executor
+
+        self._pending: deque[_Pending] = deque()
+        self._not_empty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+        self.total_requests = 0
+        self.total_batches = 0
+        self.rejected = 0
+        self.batch_size_histogram: Counter[int] = Counter()
+        self._wait_ms: deque[float] = deque(maxlen=wait_samples)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result."""
+        if self._worker is None:
+            raise RuntimeError("Batcher is not running")
+        if self.max_queue_size and len(self._pending) >= self.max_queue_size:
+            self.rejected += 1
+            raise InferenceQueueFull(f"OCR queue is full ({len(self._pending)} pending)")
+
+        pending = _Pending(item=item, future=asyncio.get_running_loop().create_future())
+        self._pending.append(pending)
+        self.total_requests += 1
+        self._not_empty.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return await pending.future
+
+    async def _collect(self) -> list[_Pending]:
+        while not self._pending:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        if len(self._pending) < self.max_batch_size and self.max_wait_ms > 0:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.max_wait_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = []
+        while self._pending and len(batch) < self.max_batch_size:
+            pending = self._pending.popleft()
+            # Skip callers that went away while waiting (e.g. client disconnect)
+            if not pending.future.done():
+                batch.append(pending)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            now = time.perf_counter()
+            for pending in batch:
+                self._wait_ms.append((now - pending.enqueued_at) * 1000)
+            self.total_batches += 1
+            self.batch_size_histogram[len(batch)] += 1
+
+            try:
+                results = await self._generate([p.item for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Expected {len(batch)} results, got {len(results)}")
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+
+            for pending, result in zip(batch, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+    async def _generate(self, items: list) -> Sequence:
+        if self.executor is not None:
+            return await self.executor.run(self.generate_fn, items)
+        return self.generate_fn(items)
+
+    def stats(self) -> dict:
+        """Queue depth, batch-size histogram and recent per-request wait times."""
+        waits = sorted(self._wait_ms)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3)
+
+        return {
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue_size": self.max_queue_size,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "rejected": self.rejected,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_size_histogram.items())},
+            "wait_ms": {
+                "samples": len(waits),
+                "mean": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
@@ -0,0 +1,98 @@
+"""
+Compare peak RSS and latency of the base64-in-JSON path with the raw upload path.
+
+Each case runs in a fresh subprocess so its peak RSS is measured on its own.
+Only the server-side request handling is measured (body parse, decode,
+image open), not inference, so no model or GPU is needed.
+
+    uv run python bench_upload.py --sizes 1 5 10 20
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+# Add repo root to sys.path for shared utils
+if str(Path(__file__).resolve().parent.parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from shared.ocr_image import open_rgb, spool_stream
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_image(path: str, size_mb: int):
+    """Write a PNG of roughly `size_mb` MB (random pixels do not compress)."""
+    side = int((size_mb * 1024 * 1024 / 3) ** 0.5)
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(path, compress_level=1)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_base64(path: str):
+    # What the client sends and what /ocr does with it: JSON parse, b64decode, BytesIO, decode
+    body = json.dumps({"image_base64": base64.b64encode(Path(path).read_bytes()).decode()}).encode()
+    start = time.perf_counter()
+    payload = json.loads(body)
+    open_rgb(BytesIO(base64.b64decode(payload["image_base64"])))
+    return time.perf_counter() - start
+
+
+def run_upload(path: str):
+    # What /ocr/upload does with a raw body: spool + hash chunk by chunk, decode from the spool
+    async def chunks():
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    start = time.perf_counter()
+    fp, _, _ = asyncio.run(spool_stream(chunks()))
+    open_rgb(fp)
+    fp.close()
+    return time.perf_counter() - start
+
+
+def run_case(case: str, path: str):
+    elapsed = run_base64(path) if case == "base64" else run_upload(path)
+    print(json.dumps({"latency_ms": elapsed * 1000, "peak_rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 20], help="Image sizes in MB")
+    parser.add_argument("--case", choices=["base64", "upload"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case, args.path)
+        return
+
+    print(f"{'size':>6} {'path':>8} {'latency ms':>11} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes:
+            path = os.path.join(tmp, f"{size_mb}mb.png")
+            make_image(path, size_mb)
+            for case in ("base64", "upload"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--case", case, "--path", path],
+                    capture_output=True, text=True, check=True,
+                )
+                result = json.loads(out.stdout)
+                print(f"{size_mb:>4}MB {case:>8} {result['latency_ms']:>11.1f} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Tests import the shared utilities as `shared.<module>`, like main.py does
+if str(Path(__file__).resolve().parent.parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
@@ -1,18 +1,75 @@
+import asyncio
 import base64
+import contextlib
+import hashlib
 import io
+import os
+import shutil
+import sys
+import uuid
+import time
+from collections import deque
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from PIL import Image
 from pydantic import BaseModel, Field
-from transformers import AutoProcessor, Qwen3VLForConditionalGeneration
+from starlette.datastructures import FormData, UploadFile
 
-from chandra.model.hf import generate_hf
 from chandra.model.schema import BatchInputItem
 from chandra.output import parse_markdown
 
+# Add repo root to sys.path for shared utils
+if str(Path(__file__).resolve().parent.parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+from batching import MicroBatcher
+from shared.fair_scheduler import Caller, FairScheduler
+from shared.inference_executor import InferenceExecutor, InferenceQueueFull
+from shared.job_queue import Job, JobQueue, JobRetry
+from shared.model_manager import ModelNotReady, ModelVersion
+from shared.ocr_model import cache_model_id, create_model_manager, generate
+from shared.ocr_cache import OCRCache
+from shared.ocr_documents import is_pdf, iter_pages
+from shared.ocr_image import UploadTooLarge, hash_file, is_image, spool_stream
+from shared.ocr_preprocess import PreprocessConfig, PreprocessedImage, merge_tile_text, preprocess
+
+# Micro-batching: concurrent /ocr requests are coalesced into one generate_hf call
+OCR_BATCH_MAX_SIZE = int(os.environ.get("OCR_BATCH_MAX_SIZE", "8"))
+OCR_BATCH_WINDOW_MS = float(os.environ.get("OCR_BATCH_WINDOW_MS", "20"))
+# Requests allowed to wait for the model before /ocr answers 429
+OCR_MAX_PENDING = int(os.environ.get("OCR_MAX_PENDING", "64"))
+# Images / tiles handed to the batcher at once; the rest wait in the per-tenant fair scheduler.
+# One batch keeps the batcher's FIFO short, so the scheduler's order decides who runs next.
+OCR_SCHED_CAPACITY = int(os.environ.get("OCR_SCHED_CAPACITY", str(OCR_BATCH_MAX_SIZE)))
+# Result cache: in-memory LRU, plus a sqlite tier when OCR_CACHE_PATH is set
+OCR_CACHE_MAX_MB = int(os.environ.get("OCR_CACHE_MAX_MB", "256"))
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH")
+OCR_CACHE_DISK_MAX_MB = int(os.environ.get("OCR_CACHE_DISK_MAX_MB", "0"))
+# Size limit for /ocr/upload bodies
+OCR_MAX_UPLOAD_MB = int(os.environ.get("OCR_MAX_UPLOAD_MB", "50"))
+# Page limit for /ocr/document
+OCR_MAX_PAGES = int(os.environ.get("OCR_MAX_PAGES", "500"))
+# Async jobs (/jobs): inputs and the sqlite queue live in OCR_JOBS_DIR and survive restarts
+OCR_JOBS_DIR = os.environ.get("OCR_JOBS_DIR", "ocr_jobs")
+OCR_JOB_CONCURRENCY = int(os.environ.get("OCR_JOB_CONCURRENCY", "2"))
+OCR_JOB_RETENTION_HOURS = float(os.environ.get("OCR_JOB_RETENTION_HOURS", "24"))
+OCR_JOB_MAX_WAIT = float(os.environ.get("OCR_JOB_MAX_WAIT", "60"))
+# Comma-separated webhook hosts jobs may POST to (e.g. "hooks.internal,*.example.com"; unset: any public http(s) host)
+OCR_WEBHOOK_HOSTS = os.environ.get("OCR_WEBHOOK_HOSTS", "").split(",")
+# Seconds before a job that found the server busy (429) / the model not ready (503) runs again
+JOB_RETRY_DELAY_BUSY = 1.0
+JOB_RETRY_DELAY_NOT_READY = 5.0
+# Orientation / downsampling / tiling before inference (OCR_MAX_PIXELS, OCR_TARGET_DPI, OCR_TILE, ...)
+PREPROCESS = PreprocessConfig.from_env()
+# Bearer token required by POST /admin/model (unset: endpoint disabled)
+OCR_ADMIN_TOKEN = os.environ.get("OCR_ADMIN_TOKEN")
+
 
 class PromptType(str, Enum):
     ocr_layout = "ocr_layout"
@@ -30,20 +87,88 @@ class OCRResponse(BaseModel):
     markdown: str = Field(..., description="Parsed markdown")
     token_count: int = Field(..., description="Number of tokens generated")
     error: bool = Field(default=False, description="Whether an error occurred")
+    timings_ms: Optional[dict[str, float]] = Field(
+        default=None, description="Per-stage timings (decode, orient, resize, tile, inference, parse); unset on cache hits"
+    )
+
+
+class JobPriority(str, Enum):
+    high = "high"
+    normal = "normal"
+    low = "low"
+
+
+class OCRJobRequest(OCRRequest):
+    priority: JobPriority = Field(default=JobPriority.normal, description="Priority class")
+    webhook_url: Optional[str] = Field(default=None, description="URL that receives the finished job as a JSON POST")
 
 
-model = None
+class ModelSwapRequest(BaseModel):
+    revision: Optional[str] = Field(default=None, description="Model revision (branch, tag or commit) to swap to")
+
+
+class PageResult(OCRResponse):
+    page: int = Field(..., description="1-based page number")
+
+
+class DocumentOCRResponse(BaseModel):
+    page_count: int = Field(..., description="Number of pages processed")
+    markdown: str = Field(..., description="Markdown of all pages, in order")
+    pages: list[PageResult] = Field(..., description="Per-page results")
+
+
+batcher: MicroBatcher | None = None
+background_tasks: set[asyncio.Task] = set()
+jobs: JobQueue | None = None
+# Single worker thread: batches already share the GPU, the thread keeps the event loop free
+executor = InferenceExecutor(max_workers=1, max_pending=1, name="ocr-inference")
+ocr_cache = OCRCache(
+    cache_model_id(os.environ.get("OCR_MODEL_REVISION") or None),
+    max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024,
+    disk_path=OCR_CACHE_PATH,
+    max_disk_bytes=OCR_CACHE_DISK_MAX_MB * 1024 * 1024,
+)
+
+
+def use_revision(version: ModelVersion):
+    # Results of a new revision are cached under their own keys
+    ocr_cache.model_id = cache_model_id(version.revision)
+
+
+# Background load / warm-up / hot swap (OCR_MODEL_REVISION, OCR_MODEL_LOAD, OCR_WARMUP_SIZES, OCR_FAKE_MODEL)
+model_manager = create_model_manager(PREPROCESS, on_ready=use_revision)
+# Weighted fair queueing between tenants (API key / X-OCR-Tenant) and the interactive / bulk lanes
+scheduler = FairScheduler.from_env(capacity=OCR_SCHED_CAPACITY, max_queue=OCR_MAX_PENDING)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global model
-    print("Loading model...")
-    model = Qwen3VLForConditionalGeneration.from_pretrained("datalab-to/chandra").cuda()
-    model.processor = AutoProcessor.from_pretrained("datalab-to/chandra")
-    print("Model loaded!")
+    global batcher, jobs
+    await model_manager.start()
+    batcher = MicroBatcher(
+        generate_batch,
+        max_batch_size=OCR_BATCH_MAX_SIZE,
+        max_wait_ms=OCR_BATCH_WINDOW_MS,
+        max_queue_size=OCR_MAX_PENDING,
+        executor=executor,
+    )
+    await batcher.start()
+    os.makedirs(OCR_JOBS_DIR, exist_ok=True)
+    jobs = JobQueue(
+        os.path.join(OCR_JOBS_DIR, "jobs.db"),
+        concurrency=OCR_JOB_CONCURRENCY,
+        retention=OCR_JOB_RETENTION_HOURS * 3600,
+        webhook_hosts=OCR_WEBHOOK_HOSTS,
+        cleanup=remove_job_input,
+    )
+    await jobs.start(run_job)
     yield
-    del model
+    await jobs.stop()
+    jobs.close()
+    await batcher.stop()
+    executor.shutdown(wait=False)
+    ocr_cache.close()
+    await model_manager.stop()
 
 
 app = FastAPI(
@@ -54,43 +179,485 @@ app = FastAPI(
 )
 
 
-def decode_base64_image(image_base64: str) -> Image.Image:
+def generate_batch(items: list) -> list:
+    """Batcher callback (inference thread): the batch runs on the model version it leased."""
+    with model_manager.lease() as model:
+        return generate(model, items)
+
+
+def interactive_caller(request: Request) -> Caller:
+    return scheduler.caller(request.headers, "interactive")
+
+
+def bulk_caller(request: Request) -> Caller:
+    return scheduler.caller(request.headers, "bulk")
+
+
+def decode_base64_image(image_base64: str) -> bytes:
     try:
-        image_data = base64.b64decode(image_base64)
-        image = Image.open(io.BytesIO(image_data)).convert("RGB")
-        return image
+        return base64.b64decode(image_base64)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
 
 
+def load_image(image_data: bytes) -> PreprocessedImage:
+    try:
+        return preprocess(io.BytesIO(image_data), PREPROCESS)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+
+
+def load_upload(fp) -> PreprocessedImage:
+    try:
+        return preprocess(fp, PREPROCESS)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+
+
+async def run_ocr(
+    cache_key: str,
+    load: Callable[[], PreprocessedImage],
+    prompt_type: Optional[str],
+    custom_prompt: Optional[str],
+    caller: Caller,
+) -> OCRResponse:
+    """
+    Serve from the cache, or preprocess the image (off the event loop) and run it through the batcher.
+
+    Tiles of a large page are submitted together and their outputs merged back into one result.
+    They reach the batcher when the fair scheduler gives the caller's tenant its turn.
+    """
+    cached = await ocr_cache.aget(cache_key)
+    if cached is not None:
+        return OCRResponse(**cached)
+    try:
+        model_manager.check()
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    prepared = await asyncio.to_thread(load)
+    timings = dict(prepared.timings_ms)
+    items = [
+        BatchInputItem(image=tile, prompt=custom_prompt, prompt_type=prompt_type)
+        for tile in prepared.tiles
+    ]
+
+    start = time.perf_counter()
+    try:
+        async with scheduler.slot(caller.tenant, caller.lane, cost=len(items)):
+            results = await asyncio.gather(*(batcher.submit(item) for item in items))
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    timings["inference"] = round((time.perf_counter() - start) * 1000, 3)
+
+    start = time.perf_counter()
+    markdown = merge_tile_text([parse_markdown(result.raw) for result in results])
+    timings["parse"] = round((time.perf_counter() - start) * 1000, 3)
+
+    response = OCRResponse(
+        raw="\n\n".join(result.raw for result in results),
+        markdown=markdown,
+        token_count=sum(result.token_count for result in results),
+        error=any(result.error for result in results),
+        timings_ms=timings,
+    )
+    if not response.error:
+        await ocr_cache.aput(cache_key, response.model_dump(exclude={"timings_ms"}))
+    return response
+
+
 @app.post("/ocr", response_model=OCRResponse)
-async def ocr(request: OCRRequest):
+async def ocr(request: OCRRequest, caller: Caller = Depends(interactive_caller)):
     """Perform OCR on an image and return structured output."""
-    image = decode_base64_image(request.image_base64)
+    image_data = decode_base64_image(request.image_base64)
+    prompt_type = request.prompt_type.value if not request.custom_prompt else None
+
+    cache_key = ocr_cache.key(image_data, prompt_type, request.custom_prompt, PREPROCESS.key())
+    return await run_ocr(cache_key, lambda: load_image(image_data), prompt_type, request.custom_prompt, caller)
 
-    batch = [
-        BatchInputItem(
-            image=image,
-            prompt=request.custom_prompt,
-            prompt_type=request.prompt_type.value if not request.custom_prompt else None,
+
+@dataclass
+class ReceivedUpload:
+    file: BinaryIO
+    digest: str
+    fields: dict = field(default_factory=dict)
+    form: Optional[FormData] = None
+
+    async def close(self):
+        if self.form is not None:
+            await self.form.close()
+        else:
+            self.file.close()
+
+
+async def receive_upload(request: Request) -> ReceivedUpload:
+    """
+    Receive an uploaded file without base64 encoding.
+
+    Accepts `multipart/form-data` (file in the `file` field, other string
+    fields returned in `fields`) or the raw file as the body. Raw bodies are
+    hashed and spooled chunk by chunk from the request stream. The caller
+    must `close()` the result.
+    """
+    max_bytes = OCR_MAX_UPLOAD_MB * 1024 * 1024
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            await form.close()
+            raise HTTPException(status_code=400, detail="Missing 'file' field")
+        received = ReceivedUpload(
+            file=upload.file,
+            digest="",
+            fields={k: v for k, v in form.items() if isinstance(v, str)},
+            form=form,
         )
-    ]
+        received.digest, size = await asyncio.to_thread(hash_file, upload.file)
+    else:
+        try:
+            fp, digest, size = await spool_stream(request.stream(), max_bytes=max_bytes)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        received = ReceivedUpload(file=fp, digest=digest)
 
-    result = generate_hf(batch, model)[0]
-    markdown = parse_markdown(result.raw)
+    if size > max_bytes or size == 0:
+        await received.close()
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+    return received
 
-    return OCRResponse(
-        raw=result.raw,
-        markdown=markdown,
-        token_count=result.token_count,
-        error=result.error,
+
+def resolve_prompt(
+    fields: dict, prompt_type: PromptType, custom_prompt: Optional[str]
+) -> tuple[Optional[str], Optional[str]]:
+    """Apply multipart form overrides; returns (prompt_type value or None, custom_prompt)."""
+    try:
+        prompt_type = PromptType(fields.get("prompt_type", prompt_type))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    custom_prompt = fields.get("custom_prompt") or custom_prompt
+    return (prompt_type.value if not custom_prompt else None), custom_prompt
+
+
+@app.post("/ocr/upload", response_model=OCRResponse)
+async def ocr_upload(
+    request: Request,
+    prompt_type: PromptType = PromptType.ocr_layout,
+    custom_prompt: Optional[str] = None,
+    caller: Caller = Depends(interactive_caller),
+):
+    """
+    Perform OCR on an uploaded image, without base64 encoding.
+
+    Accepts `multipart/form-data` (image in the `file` field) or the raw image
+    as the body (`application/octet-stream` / `image/*`); the image is decoded
+    straight from the spooled upload. Prompt options are query parameters, or
+    form fields for multipart.
+    """
+    upload = await receive_upload(request)
+    try:
+        prompt_type_value, custom_prompt = resolve_prompt(upload.fields, prompt_type, custom_prompt)
+        cache_key = ocr_cache.key_for_digest(upload.digest, prompt_type_value, custom_prompt, PREPROCESS.key())
+        return await run_ocr(cache_key, lambda: load_upload(upload.file), prompt_type_value, custom_prompt, caller)
+    finally:
+        await upload.close()
+
+
+async def ocr_document_pages(
+    upload: ReceivedUpload, prompt_type: Optional[str], custom_prompt: Optional[str], caller: Caller
+) -> AsyncIterator[PageResult]:
+    """
+    OCR a document page by page, yielding results in page order.
+
+    Pages are rasterised lazily and up to `OCR_BATCH_MAX_SIZE` of them are kept
+    in flight, so they share batches in the micro-batcher while memory stays
+    bounded. Each page is cached under the document hash and page number.
+    """
+    pages = iter_pages(upload.file)
+    in_flight: deque[asyncio.Task] = deque()
+
+    async def run_page(page: int, image: Image.Image) -> PageResult:
+        cache_key = ocr_cache.key_for_digest(f"{upload.digest}:{page}", prompt_type, custom_prompt, PREPROCESS.key())
+        while True:
+            try:
+                result = await run_ocr(
+                    cache_key, lambda: preprocess(image, PREPROCESS), prompt_type, custom_prompt, caller
+                )
+                return PageResult(page=page, **result.model_dump())
+            except HTTPException as e:
+                if e.status_code != 429:
+                    raise
+                # Queue is full: back off instead of failing the rest of the document
+                await asyncio.sleep(0.5)
+
+    try:
+        page = 0
+        while True:
+            while len(in_flight) < OCR_BATCH_MAX_SIZE and page < OCR_MAX_PAGES:
+                image = await asyncio.to_thread(next, pages, None)
+                if image is None:
+                    break
+                in_flight.append(asyncio.create_task(run_page(page + 1, image)))
+                page += 1
+            if not in_flight:
+                break
+            yield await in_flight.popleft()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        pages.close()
+
+
+@app.post("/ocr/document", response_model=DocumentOCRResponse)
+async def ocr_document(
+    request: Request,
+    prompt_type: PromptType = PromptType.ocr_layout,
+    custom_prompt: Optional[str] = None,
+    stream: bool = False,
+    caller: Caller = Depends(bulk_caller),
+):
+    """
+    Perform OCR on a multi-page PDF or TIFF (or a single image).
+
+    The document is uploaded like `/ocr/upload`. With `stream=true` each page
+    is sent as an NDJSON line as soon as it is done, keeping time-to-first-page
+    low on long documents; otherwise all pages are returned together.
+    """
+    upload = await receive_upload(request)
+    try:
+        prompt_type_value, custom_prompt = resolve_prompt(upload.fields, prompt_type, custom_prompt)
+        is_document = await asyncio.to_thread(lambda: is_pdf(upload.file) or is_image(upload.file))
+        if not is_document:
+            raise HTTPException(status_code=400, detail="Unsupported document, expected a PDF or image")
+    except BaseException:
+        await upload.close()
+        raise
+
+    pages = ocr_document_pages(upload, prompt_type_value, custom_prompt, caller)
+
+    if stream:
+        async def stream_pages():
+            try:
+                async for page in pages:
+                    yield page.model_dump_json() + "\n"
+            finally:
+                await pages.aclose()
+                await upload.close()
+
+        return StreamingResponse(stream_pages(), media_type="application/x-ndjson")
+
+    try:
+        results = [page async for page in pages]
+    finally:
+        await pages.aclose()
+        await upload.close()
+    return DocumentOCRResponse(
+        page_count=len(results),
+        markdown="\n\n".join(page.markdown for page in results),
+        pages=results,
     )
 
 
+def remove_job_input(job: Job, payload: dict):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(payload["path"])
+
+
+async def save_job_input(write: Callable[[BinaryIO], None]) -> str:
+    """Write a job's input next to the queue, so the job can run again after a restart."""
+    path = os.path.join(OCR_JOBS_DIR, f"{uuid.uuid4().hex}.bin")
+
+    def save():
+        with open(path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    await asyncio.to_thread(save)
+    return path
+
+
+async def check_webhook_url(webhook_url: Optional[str]):
+    """422 for a webhook URL jobs may not POST to (checked before the input is saved)."""
+    if webhook_url:
+        try:
+            await jobs.check_webhook_url(webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+
+async def submit_job(kind: str, payload: dict, priority: JobPriority, webhook_url: Optional[str]) -> JSONResponse:
+    job = await jobs.submit(kind, payload, priority=priority.value, webhook_url=webhook_url)
+    return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+
+def job_error(e: HTTPException) -> Exception:
+    """What a job does with an HTTP error: retry later when the server is busy or the model is loading, else fail."""
+    # A model that failed to load stays failed until an admin swaps in another revision
+    if e.status_code == 429:
+        return JobRetry(str(e.detail), delay=JOB_RETRY_DELAY_BUSY)
+    if e.status_code == 503 and model_manager.state != "failed":
+        return JobRetry(str(e.detail), delay=JOB_RETRY_DELAY_NOT_READY)
+    return ValueError(e.detail)
+
+
+async def run_job(kind: str, payload: dict) -> dict:
+    """Job handler: run a queued `image` or `document` job from its saved input."""
+    prompt_type, custom_prompt = payload["prompt_type"], payload["custom_prompt"]
+    caller = Caller(tenant=payload.get("tenant", "anonymous"), lane=payload.get("lane", "bulk"))
+    with open(payload["path"], "rb") as fp:
+        if kind == "image":
+            cache_key = ocr_cache.key_for_digest(payload["digest"], prompt_type, custom_prompt, PREPROCESS.key())
+            try:
+                result = await run_ocr(cache_key, lambda: load_upload(fp), prompt_type, custom_prompt, caller)
+            except HTTPException as e:
+                raise job_error(e)
+            return result.model_dump()
+
+        pages = ocr_document_pages(
+            ReceivedUpload(file=fp, digest=payload["digest"]), prompt_type, custom_prompt, caller
+        )
+        try:
+            results = [page async for page in pages]
+        except HTTPException as e:
+            raise job_error(e)
+        finally:
+            await pages.aclose()
+        return DocumentOCRResponse(
+            page_count=len(results),
+            markdown="\n\n".join(page.markdown for page in results),
+            pages=results,
+        ).model_dump()
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: OCRJobRequest, caller: Caller = Depends(bulk_caller)):
+    """
+    Queue OCR of a base64 image and return the job at once (`202`, `Location: /jobs/{id}`).
+
+    Use this instead of `/ocr` for work that may outlast the caller's (or
+    the gateway's) timeout. Read the result from `GET /jobs/{id}`, or get it
+    POSTed to `webhook_url`.
+    """
+    await check_webhook_url(request.webhook_url)
+    image_data = decode_base64_image(request.image_base64)
+    prompt_type = request.prompt_type.value if not request.custom_prompt else None
+    path = await save_job_input(lambda f: f.write(image_data))
+    payload = {
+        "path": path,
+        "digest": hashlib.sha256(image_data).hexdigest(),
+        "prompt_type": prompt_type,
+        "custom_prompt": request.custom_prompt,
+        "tenant": caller.tenant,
+        "lane": caller.lane,
+    }
+    return await submit_job("image", payload, request.priority, request.webhook_url)
+
+
+@app.post("/jobs/upload", status_code=202)
+@app.post("/jobs/document", status_code=202)
+async def create_upload_job(
+    request: Request,
+    prompt_type: PromptType = PromptType.ocr_layout,
+    custom_prompt: Optional[str] = None,
+    priority: JobPriority = JobPriority.normal,
+    webhook_url: Optional[str] = None,
+    caller: Caller = Depends(bulk_caller),
+):
+    """Queue OCR of an uploaded image (`/jobs/upload`) or document (`/jobs/document`), uploaded as for `/ocr/upload`."""
+    kind = "document" if request.url.path.endswith("/document") else "image"
+    await check_webhook_url(webhook_url)
+    upload = await receive_upload(request)
+    try:
+        prompt_type_value, custom_prompt = resolve_prompt(upload.fields, prompt_type, custom_prompt)
+        if kind == "document":
+            is_document = await asyncio.to_thread(lambda: is_pdf(upload.file) or is_image(upload.file))
+            if not is_document:
+                raise HTTPException(status_code=400, detail="Unsupported document, expected a PDF or image")
+
+        def copy(f: BinaryIO):
+            upload.file.seek(0)
+            shutil.copyfileobj(upload.file, f)
+
+        path = await save_job_input(copy)
+    finally:
+        await upload.close()
+    payload = {
+        "path": path,
+        "digest": upload.digest,
+        "prompt_type": prompt_type_value,
+        "custom_prompt": custom_prompt,
+        "tenant": caller.tenant,
+        "lane": caller.lane,
+    }
+    return await submit_job(kind, payload, priority, webhook_url)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status and, once finished, its result; `?wait=30` long-polls until the job finishes."""
+    job = await jobs.wait(job_id, min(max(wait, 0), OCR_JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job (running jobs are not interrupted)."""
+    job = await jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.to_dict()
+
+
 @app.get("/health")
 async def health():
-    """Health check endpoint."""
-    return {"status": "ok", "model_loaded": model is not None}
+    """Liveness: answers while the model is loading, warming up or being swapped."""
+    return {"status": "ok", "model_loaded": model_manager.loaded, "model": model_manager.status()}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once a warmed-up model is serving (and during a hot swap), 503 before (always 200 in lazy mode)."""
+    status = model_manager.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.post("/admin/model", status_code=202)
+async def swap_model(request: ModelSwapRequest, http_request: Request):
+    """
+    Hot swap to another model revision without dropping traffic.
+
+    The new revision is loaded and warmed up next to the serving one, new
+    batches switch to it atomically, and the old one is unloaded once its
+    in-flight batches finish. Poll `/health` for progress. Needs
+    `Authorization: Bearer $OCR_ADMIN_TOKEN`.
+    """
+    if not OCR_ADMIN_TOKEN or http_request.headers.get("authorization") != f"Bearer {OCR_ADMIN_TOKEN}":
+        raise HTTPException(status_code=403, detail="Model admin requires OCR_ADMIN_TOKEN")
+    try:
+        task = model_manager.start_swap(request.revision)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return JSONResponse(model_manager.status(), status_code=202)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Batching, scheduler (queue wait by tenant / lane), executor and cache metrics."""
+    return {
+        "batcher": batcher.stats() if batcher else None,
+        "scheduler": scheduler.stats(),
+        "executor": executor.stats(),
+        "cache": ocr_cache.stats(),
+        "jobs": await asyncio.to_thread(jobs.stats) if jobs else None,
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+import pytest
+
+from batching import MicroBatcher
+from shared.inference_executor import InferenceExecutor, InferenceQueueFull
+
+
+def run(main):
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_a_batch():
+    batches = []
+
+    def generate(items):
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(generate, max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(6))), batcher.stats()
+        finally:
+            await batcher.stop()
+
+    results, stats = run(main)
+    # Each caller gets the result at its own position
+    assert results == [0, 10, 20, 30, 40, 50]
+    assert batches == [[0, 1, 2, 3], [4, 5]]
+    assert stats["batch_size_histogram"] == {"2": 1, "4": 1}
+    assert stats["total_requests"] == 6 and stats["wait_ms"]["samples"] == 6
+
+
+def test_a_full_batch_does_not_wait_for_the_timeout():
+    async def main():
+        batcher = MicroBatcher(lambda items: items, max_batch_size=2, max_wait_ms=10_000)
+        await batcher.start()
+        try:
+            return await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 2)
+        finally:
+            await batcher.stop()
+
+    assert run(main) == ["a", "b"]
+
+
+def test_a_lone_request_is_sent_after_max_wait():
+    async def main():
+        batcher = MicroBatcher(lambda items: items, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        try:
+            return await asyncio.wait_for(batcher.submit("x"), 2)
+        finally:
+            await batcher.stop()
+
+    assert run(main) == "x"
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def generate(items):
+        raise RuntimeError("CUDA out of memory")
+
+    async def main():
+        batcher = MicroBatcher(generate, max_batch_size=2, max_wait_ms=50)
+        await batcher.start()
+        try:
+            return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    assert [str(e) for e in run(main)] == ["CUDA out of memory"] * 2
+
+
+def test_wrong_result_count_is_an_error():
+    async def main():
+        batcher = MicroBatcher(lambda items: items[:1], max_batch_size=2, max_wait_ms=50)
+        await batcher.start()
+        try:
+            return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    assert all("Expected 2 results, got 1" in str(e) for e in run(main))
+
+
+def test_full_queue_rejects_requests():
+    release = threading.Event()
+
+    def generate(items):
+        release.wait(5)
+        return items
+
+    async def main():
+        executor = InferenceExecutor(max_workers=1, max_pending=4)
+        batcher = MicroBatcher(generate, max_batch_size=1, max_wait_ms=0, max_queue_size=2, executor=executor)
+        await batcher.start()
+        try:
+            # One batch runs on the executor, two wait in the queue
+            running = [asyncio.create_task(batcher.submit(0))]
+            await asyncio.sleep(0.05)
+            running += [asyncio.create_task(batcher.submit(i)) for i in (1, 2)]
+            await asyncio.sleep(0)
+            with pytest.raises(InferenceQueueFull):
+                await batcher.submit(3)
+            release.set()
+            return await asyncio.gather(*running), batcher.rejected
+        finally:
+            release.set()
+            await batcher.stop()
+            executor.shutdown()
+
+    results, rejected = run(main)
+    assert results == [0, 1, 2] and rejected == 1
+
+
+def test_cancelled_callers_are_skipped():
+    batches = []
+
+    def generate(items):
+        batches.append(items)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(generate, max_batch_size=4, max_wait_ms=30)
+        await batcher.start()
+        try:
+            gone = asyncio.create_task(batcher.submit("gone"))
+            kept = asyncio.create_task(batcher.submit("kept"))
+            await asyncio.sleep(0)
+            gone.cancel()
+            return await kept
+        finally:
+            await batcher.stop()
+
+    assert run(main) == "kept"
+    assert batches == [["kept"]]
+
+
+def test_submit_needs_a_running_batcher():
+    async def main():
+        await MicroBatcher(lambda items: items).submit(1)
+
+    with pytest.raises(RuntimeError, match="not running"):
+        run(main)
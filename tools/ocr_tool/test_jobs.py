@@ -0,0 +1,97 @@
+"""
+Tests for the async job API (`/jobs*`), run on the fake model (no GPU):
+
+    uv run pytest test_jobs.py
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+
+os.environ.update(
+    OCR_FAKE_MODEL="1",
+    OCR_FAKE_LATENCY_MS="10",
+    OCR_MODEL_LOAD="background",
+    OCR_WARMUP_SIZES="",
+    OCR_JOBS_DIR=tempfile.mkdtemp(prefix="ocr-jobs-test-"),
+)
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+
+# The model manager only loads once this is set
+model_gate = threading.Event()
+
+
+def png(color: str = "red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def wait_for(client: TestClient, job_id: str, condition, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if condition(job) or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+@pytest.fixture(scope="module")
+def client():
+    load = main.model_manager.load_fn
+
+    def gated_load(revision):
+        model_gate.wait()
+        return load(revision)
+
+    main.model_manager.load_fn = gated_load
+    main.JOB_RETRY_DELAY_NOT_READY = 0.1
+    # The app (and its inference executor) can only be started once per process
+    with TestClient(main.app) as client:
+        try:
+            yield client
+        finally:
+            model_gate.set()
+
+
+def test_jobs_wait_for_the_model_instead_of_failing(client):
+    assert client.get("/ready").status_code == 503
+
+    document = client.post("/jobs/document", files={"file": ("page.png", png("white"))})
+    image = client.post("/jobs/upload", content=png("blue"), headers={"content-type": "application/octet-stream"})
+    assert document.status_code == image.status_code == 202
+
+    # Both jobs are retried while the model loads, neither fails
+    for response in (document, image):
+        job = wait_for(client, response.json()["id"], lambda job: job["error"] is not None)
+        assert job["status"] in ("queued", "running"), job
+        assert "not ready" in job["error"]
+
+    model_gate.set()
+    for response in (document, image):
+        job = wait_for(client, response.json()["id"], lambda job: job["status"] in ("succeeded", "failed"))
+        assert job["status"] == "succeeded", job
+    assert job["result"]["markdown"].startswith("Fake OCR 64x32")
+    assert wait_for(client, document.json()["id"], lambda job: True)["result"]["page_count"] == 1
+
+
+def test_webhook_url_is_validated(client):
+    response = client.post("/jobs/upload", params={"webhook_url": "file:///etc/passwd"}, content=png(),
+                           headers={"content-type": "application/octet-stream"})
+    assert response.status_code == 422
+    response = client.post("/jobs", json={"image_base64": "", "webhook_url": "gopher://internal/"})
+    assert response.status_code == 422
+
+
+def test_jobs_fail_when_the_model_failed_to_load(monkeypatch):
+    error = main.HTTPException(status_code=503, detail="Model failed to load: out of memory")
+    assert isinstance(main.job_error(error), main.JobRetry)
+    monkeypatch.setattr(main.model_manager, "state", "failed")
+    assert isinstance(main.job_error(error), ValueError)
+    assert isinstance(main.job_error(main.HTTPException(status_code=429, detail="busy")), main.JobRetry)
@@ -1,56 +1,188 @@
 import os
-os.environ["CUDA_VISIBLE_DEVICES"] = "2"
-
+import io
 import sys
+import json
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable
 from mcp.server import Server
 from mcp.server.sse import SseServerTransport
 import uvicorn
 
+# Add repo root to sys.path for shared utils
+if str(Path(__file__).resolve().parent.parent.parent) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
-# Global model instance
-model = None
+from shared.fair_scheduler import Caller, FairScheduler
+from shared.inference_executor import InferenceExecutor, InferenceQueueFull
+from shared.model_manager import ModelNotReady, ModelVersion
+from shared.ocr_cache import OCRCache
+from shared.ocr_documents import batched, iter_pages
+from shared.ocr_image import hash_file
+from shared.ocr_model import cache_model_id, create_model_manager, generate
+from shared.ocr_preprocess import PreprocessConfig, merge_tile_text, preprocess
+from shared.single_flight import SingleFlight
 
+# Inference runs on a dedicated thread so SSE keepalives and /health are not blocked;
+# calls beyond OCR_MAX_PENDING waiting ones are rejected instead of queueing forever
+executor = InferenceExecutor(
+    max_workers=int(os.environ.get("OCR_INFERENCE_WORKERS", "1")),
+    max_pending=int(os.environ.get("OCR_MAX_PENDING", "16")),
+    name="ocr-inference",
+)
 
-def load_model():
-    global model
-    if model is None:
-        from transformers import AutoProcessor, Qwen3VLForConditionalGeneration
-        
-        print("Loading OCR model...", file=sys.stderr)
-        model = Qwen3VLForConditionalGeneration.from_pretrained("datalab-to/chandra").cuda()
-        model.processor = AutoProcessor.from_pretrained("datalab-to/chandra")
-        print("Model loaded!", file=sys.stderr)
-    return model
+# Results are cached by image content + prompt; point OCR_CACHE_PATH at the same
+# sqlite file as tools/ocr_tool to share entries between the two servers
+ocr_cache = OCRCache(
+    cache_model_id(os.environ.get("OCR_MODEL_REVISION") or None),
+    max_bytes=int(os.environ.get("OCR_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    disk_path=os.environ.get("OCR_CACHE_PATH"),
+    max_disk_bytes=int(os.environ.get("OCR_CACHE_DISK_MAX_MB", "0")) * 1024 * 1024,
+)
 
+# generate_hf calls wait here for their tenant's turn (weighted fair queueing between
+# callers, interactive `ocr` ahead of bulk `ocr_document`), then run on the executor
+scheduler = FairScheduler.from_env(capacity=executor.max_workers, max_queue=executor.max_pending)
 
-def perform_ocr(image_path: str, prompt_type: str = "ocr_layout", custom_prompt: str | None = None) -> dict:
-    """Perform OCR on an image."""
-    from PIL import Image
-    from chandra.model.hf import generate_hf
-    from chandra.model.schema import BatchInputItem
+# Identical requests arriving while one is being processed wait for it instead of
+# running inference again (e.g. the same shared document sent by several sessions)
+single_flight = SingleFlight()
+
+# Document OCR: pages per generate_hf call and page limit
+OCR_DOC_BATCH_SIZE = int(os.environ.get("OCR_DOC_BATCH_SIZE", "4"))
+OCR_MAX_PAGES = int(os.environ.get("OCR_MAX_PAGES", "500"))
+
+# Orientation / downsampling / tiling before inference (OCR_MAX_PIXELS, OCR_TARGET_DPI, OCR_TILE, ...)
+PREPROCESS = PreprocessConfig.from_env()
+
+# Bearer token required by POST /admin/model (unset: endpoint disabled)
+OCR_ADMIN_TOKEN = os.environ.get("OCR_ADMIN_TOKEN")
+
+
+def use_revision(version: ModelVersion):
+    # Results of a new revision are cached under their own keys
+    ocr_cache.model_id = cache_model_id(version.revision)
+
+
+# Background load / warm-up / hot swap (OCR_MODEL_REVISION, OCR_MODEL_LOAD, OCR_WARMUP_SIZES, OCR_FAKE_MODEL)
+model_manager = create_model_manager(PREPROCESS, on_ready=use_revision)
+background_tasks: set[asyncio.Task] = set()
+
+
+def generate_batch(items: list) -> list:
+    """One generate_hf call on the model version it leased (a hot swap waits for it)."""
+    with model_manager.lease() as model:
+        return generate(model, items)
+
+
+def merge_results(results) -> dict:
+    """Combine the generate_hf results of one image's tiles into a single OCR result."""
     from chandra.output import parse_markdown
-    
-    load_model()
 
-    image = Image.open(image_path).convert("RGB")
+    return {
+        "raw": "\n\n".join(result.raw for result in results),
+        "markdown": merge_tile_text([parse_markdown(result.raw) for result in results]),
+        "token_count": sum(result.token_count for result in results),
+        "error": any(result.error for result in results),
+    }
+
+
+def perform_ocr(
+    image_path: str,
+    prompt_type: str = "ocr_layout",
+    custom_prompt: str | None = None,
+    image_bytes: bytes | None = None,
+    generate: Callable[[list], list] = generate_batch,
+) -> dict:
+    """
+    Perform OCR on an image (already-read `image_bytes` take precedence over the path).
+
+    `generate` runs one generate_hf batch (the tools pass a scheduled one).
+    """
+    from chandra.model.schema import BatchInputItem
+
+    prepared = preprocess(io.BytesIO(image_bytes) if image_bytes is not None else image_path, PREPROCESS)
+    timings = dict(prepared.timings_ms)
 
     batch = [
         BatchInputItem(
-            image=image,
+            image=tile,
             prompt=custom_prompt,
             prompt_type=prompt_type if not custom_prompt else None,
         )
+        for tile in prepared.tiles
     ]
 
-    result = generate_hf(batch, model)[0]
-    markdown = parse_markdown(result.raw)
+    start = time.perf_counter()
+    results = generate(batch)
+    timings["inference"] = round((time.perf_counter() - start) * 1000, 3)
+
+    start = time.perf_counter()
+    result = merge_results(results)
+    timings["parse"] = round((time.perf_counter() - start) * 1000, 3)
+
+    result["timings_ms"] = timings
+    return result
+
+
+def perform_document_ocr(
+    file_path: str,
+    prompt_type: str | None = "ocr_layout",
+    custom_prompt: str | None = None,
+    batch_size: int = OCR_DOC_BATCH_SIZE,
+    generate: Callable[[list], list] = generate_batch,
+    digest: str | None = None,
+) -> dict:
+    """
+    Perform OCR on every page of a PDF / multi-page TIFF.
+
+    Pages are rasterised lazily and sent to `generate` `batch_size` at a time;
+    pages already in the cache (keyed on the file hash and page number) are skipped.
+    `digest` is the file's sha256 when the caller already computed it.
+    """
+    from chandra.model.schema import BatchInputItem
 
-    return {
-        "raw": result.raw,
-        "markdown": markdown,
-        "token_count": result.token_count,
-        "error": result.error,
-    }
+    if digest is None:
+        with open(file_path, "rb") as f:
+            digest, _ = hash_file(f)
+
+    pages = []
+    numbered_pages = zip(range(1, OCR_MAX_PAGES + 1), iter_pages(file_path))
+    for batch in batched(numbered_pages, max(1, batch_size)):
+        todo = []
+        for page, image in batch:
+            cache_key = ocr_cache.key_for_digest(f"{digest}:{page}", prompt_type, custom_prompt, PREPROCESS.key())
+            cached = ocr_cache.get(cache_key)
+            if cached is not None:
+                pages.append({"page": page, **cached})
+            else:
+                todo.append((page, image, cache_key))
+        if not todo:
+            continue
+
+        # Large pages may be split into tiles; all tiles of the batch go through one generate_hf call
+        tile_counts = []
+        items = []
+        for _, image, _ in todo:
+            tiles = preprocess(image, PREPROCESS).tiles
+            tile_counts.append(len(tiles))
+            items.extend(
+                BatchInputItem(image=tile, prompt=custom_prompt, prompt_type=prompt_type if not custom_prompt else None)
+                for tile in tiles
+            )
+        results = generate(items)
+
+        offset = 0
+        for (page, _, cache_key), count in zip(todo, tile_counts):
+            page_result = merge_results(results[offset:offset + count])
+            offset += count
+            if not page_result["error"]:
+                ocr_cache.put(cache_key, page_result)
+            pages.append({"page": page, **page_result})
+
+    pages.sort(key=lambda p: p["page"])
+    return {"page_count": len(pages), "pages": pages}
 
 
 # Create MCP server
@@ -79,27 +211,96 @@ async def list_tools():
                 },
                 "required": ["image_path"]
             }
+        ),
+        Tool(
+            name="ocr_document",
+            description="Perform OCR on every page of a multi-page PDF or TIFF file",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "Path to the PDF or TIFF file"
+                    },
+                    "prompt_type": {
+                        "type": "string",
+                        "enum": ["ocr_layout", "ocr"],
+                        "default": "ocr_layout"
+                    },
+                    "batch_size": {
+                        "type": "integer",
+                        "description": "Pages per inference batch",
+                        "default": OCR_DOC_BATCH_SIZE
+                    }
+                },
+                "required": ["file_path"]
+            }
         )
     ]
 
 
-@server.call_tool()
-async def call_tool(name: str, arguments: dict):
-    from mcp.types import TextContent
-    
-    if name != "ocr":
-        raise ValueError(f"Unknown tool: {name}")
-
+def current_caller(default_lane: str) -> Caller:
+    """Tenant and lane of the current tool call, from the headers of its MCP POST (API key / X-OCR-Tenant)."""
     try:
-        print(f"Performing OCR on: {arguments.get('image_path')}", file=sys.stderr)
-        result = perform_ocr(
-            image_path=arguments["image_path"],
-            prompt_type=arguments.get("prompt_type", "ocr_layout"),
-            custom_prompt=arguments.get("custom_prompt")
+        request = server.request_context.request
+    except LookupError:
+        request = None
+    return scheduler.caller(request.headers if request is not None else {}, default_lane)
+
+
+def scheduled_generate(caller: Caller) -> Callable[[list], list]:
+    """
+    generate_hf for a worker thread: each batch waits for the caller's turn in the
+    scheduler, then runs on the inference executor. Preprocessing, rasterising and
+    parsing stay on the calling thread, so they do not hold the model.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def generate(items: list) -> list:
+        async with scheduler.slot(caller.tenant, caller.lane, cost=len(items)):
+            return await executor.run(generate_batch, items)
+
+    return lambda items: asyncio.run_coroutine_threadsafe(generate(items), loop).result()
+
+
+async def ocr_image_tool(arguments: dict) -> str:
+    print(f"Performing OCR on: {arguments.get('image_path')}", file=sys.stderr)
+    image_path = arguments["image_path"]
+    custom_prompt = arguments.get("custom_prompt")
+    prompt_type = arguments.get("prompt_type", "ocr_layout") if not custom_prompt else None
+    caller = current_caller("interactive")
+
+    image_bytes = await asyncio.to_thread(Path(image_path).read_bytes)
+    cache_key = ocr_cache.key(image_bytes, prompt_type, custom_prompt, PREPROCESS.key())
+
+    async def run_ocr() -> dict:
+        # Re-checked here: an identical request may have finished since the lookup below
+        cached = await ocr_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        result = await asyncio.to_thread(
+            perform_ocr,
+            image_path=image_path,
+            prompt_type=prompt_type,
+            custom_prompt=custom_prompt,
+            image_bytes=image_bytes,
+            generate=scheduled_generate(caller),
         )
-        print("OCR completed!", file=sys.stderr)
-
-        response_text = f"""## OCR Result
+        if not result["error"]:
+            await ocr_cache.aput(cache_key, {k: v for k, v in result.items() if k != "timings_ms"})
+        print(f"OCR completed! timings_ms={result['timings_ms']}", file=sys.stderr)
+        return result
+
+    result = await ocr_cache.aget(cache_key)
+    if result is not None:
+        print("OCR cache hit!", file=sys.stderr)
+    else:
+        model_manager.check()
+        if single_flight.is_inflight(cache_key):
+            print("OCR already in flight, waiting for its result", file=sys.stderr)
+        result = await single_flight.do(cache_key, run_ocr)
+
+    return f"""## OCR Result
 
 **Markdown Output:**
 {result['markdown']}
@@ -107,8 +308,67 @@ async def call_tool(name: str, arguments: dict):
 **Token Count:** {result['token_count']}
 **Error:** {result['error']}
 """
+
+
+async def ocr_document_tool(arguments: dict) -> str:
+    print(f"Performing document OCR on: {arguments.get('file_path')}", file=sys.stderr)
+    file_path = arguments["file_path"]
+    custom_prompt = arguments.get("custom_prompt")
+    prompt_type = arguments.get("prompt_type", "ocr_layout") if not custom_prompt else None
+    model_manager.check()
+
+    # The page cache needs the file hash anyway: compute it once and key the flight on it too,
+    # so copies of a file share one run; batch_size only changes throughput, not the result
+    with open(file_path, "rb") as f:
+        digest, _ = await asyncio.to_thread(hash_file, f)
+    flight_key = json.dumps(["document", digest, prompt_type, custom_prompt])
+    result = await single_flight.do(flight_key, lambda: asyncio.to_thread(
+        perform_document_ocr,
+        file_path=file_path,
+        prompt_type=prompt_type,
+        custom_prompt=custom_prompt,
+        batch_size=int(arguments.get("batch_size", OCR_DOC_BATCH_SIZE)),
+        generate=scheduled_generate(current_caller("bulk")),
+        digest=digest,
+    ))
+    print(f"Document OCR completed! ({result['page_count']} pages)", file=sys.stderr)
+
+    sections = [f"## OCR Result ({result['page_count']} pages)"]
+    for page in result["pages"]:
+        sections.append(f"""### Page {page['page']}
+
+{page['markdown']}
+
+**Token Count:** {page['token_count']}
+**Error:** {page['error']}""")
+    return "\n\n".join(sections) + "\n"
+
+
+TOOL_HANDLERS = {
+    "ocr": ocr_image_tool,
+    "ocr_document": ocr_document_tool,
+}
+
+
+@server.call_tool()
+async def call_tool(name: str, arguments: dict):
+    from mcp.types import TextContent
+    
+    if name not in TOOL_HANDLERS:
+        raise ValueError(f"Unknown tool: {name}")
+
+    try:
+        response_text = await TOOL_HANDLERS[name](arguments)
         return [TextContent(type="text", text=response_text)]
 
+    except InferenceQueueFull as e:
+        print(f"Rejected OCR request: {e}", file=sys.stderr)
+        return [TextContent(type="text", text=f"OCR Error: Server busy, retry later ({e})")]
+
+    except ModelNotReady as e:
+        print(f"Rejected OCR request: {e}", file=sys.stderr)
+        return [TextContent(type="text", text=f"OCR Error: Model not ready, retry later ({e})")]
+
     except Exception as e:
         import traceback
         print(traceback.format_exc(), file=sys.stderr)
@@ -132,6 +392,70 @@ async def handle_messages(scope, receive, send):
     await sse.handle_post_message(scope, receive, send)
 
 
+async def send_json(send, payload: dict, status: int = 200):
+    """Send a JSON response as raw ASGI."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [[b"content-type", b"application/json"]],
+    })
+    await send({
+        "type": "http.response.body",
+        "body": json.dumps(payload).encode(),
+    })
+
+
+async def read_json(receive) -> dict:
+    """Read a JSON request body as raw ASGI."""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return json.loads(body or b"{}")
+
+
+async def handle_health(scope, receive, send):
+    """Liveness, answered while the model is busy, loading, warming up or being swapped."""
+    await send_json(send, {
+        "status": "ok",
+        "model_loaded": model_manager.loaded,
+        "model": model_manager.status(),
+        "executor": executor.stats(),
+        "scheduler": scheduler.stats(),
+        "cache": ocr_cache.stats(),
+        "single_flight": single_flight.stats(),
+    })
+
+
+async def handle_ready(scope, receive, send):
+    """Readiness: 200 once a warmed-up model is serving (and during a hot swap), 503 before."""
+    status = model_manager.status()
+    await send_json(send, status, status=200 if status["ready"] else 503)
+
+
+async def handle_swap(scope, receive, send):
+    """Hot swap to {"revision": ...}: loaded and warmed up next to the serving model, old one drained."""
+    headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+    if not OCR_ADMIN_TOKEN or headers.get("authorization") != f"Bearer {OCR_ADMIN_TOKEN}":
+        await send_json(send, {"detail": "Model admin requires OCR_ADMIN_TOKEN"}, status=403)
+        return
+    try:
+        revision = (await read_json(receive)).get("revision")
+    except (ValueError, AttributeError):
+        await send_json(send, {"detail": "Expected a JSON object with a revision"}, status=400)
+        return
+    try:
+        task = model_manager.start_swap(revision)
+    except RuntimeError as e:
+        await send_json(send, {"detail": str(e)}, status=409)
+        return
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    await send_json(send, model_manager.status(), status=202)
+
+
 async def app(scope, receive, send):
     """Main ASGI application."""
     if scope["type"] == "http":
@@ -142,6 +466,12 @@ async def app(scope, receive, send):
             await handle_sse(scope, receive, send)
         elif path.startswith("/messages/") and method == "POST":
             await handle_messages(scope, receive, send)
+        elif path == "/health" and method == "GET":
+            await handle_health(scope, receive, send)
+        elif path == "/ready" and method == "GET":
+            await handle_ready(scope, receive, send)
+        elif path == "/admin/model" and method == "POST":
+            await handle_swap(scope, receive, send)
         else:
             # 404 response
             await send({
@@ -157,17 +487,19 @@ async def app(scope, receive, send):
         while True:
             message = await receive()
             if message["type"] == "lifespan.startup":
+                await model_manager.start()
                 await send({"type": "lifespan.startup.complete"})
             elif message["type"] == "lifespan.shutdown":
+                executor.shutdown(wait=False)
+                ocr_cache.close()
+                await model_manager.stop()
                 await send({"type": "lifespan.shutdown.complete"})
                 return
 
 
 if __name__ == "__main__":
     print("🚀 Starting OCR MCP Server...")
-    print("⏳ Pre-loading model...")
-    load_model()
-    print("✅ Model ready!")
+    print(f"⏳ Model load: {model_manager.mode} (GET /ready once it is warmed up)")
     print("🌐 Server running on http://localhost:8888")
     
     uvicorn.run(app, host="0.0.0.0", port=8888)
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Benchmark Graph calls against a local fake token endpoint and fake Graph API.
+
+Compares the shared TokenProvider + pooled GraphClient with the previous
+behaviour (a token acquisition and a new httpx.AsyncClient per call), and
+reports how many times the token endpoint was hit. With `--throttle-every N`
+the fake Graph answers every Nth call with 429 + Retry-After, to exercise
+the retry / adaptive concurrency path (see `throttle.py`).
+
+    uv run python bench_graph.py --requests 500 --concurrency 20 --token-latency-ms 80
+    uv run python bench_graph.py --requests 500 --concurrency 50 --throttle-every 25
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from graph import GraphClient, TokenProvider
+from throttle import GraphThrottle
+
+token_requests = 0
+token_latency = 0.0
+graph_requests = 0
+throttle_every = 0
+
+
+async def fake_token(request: Request):
+    global token_requests
+    token_requests += 1
+    await asyncio.sleep(token_latency)
+    return JSONResponse({"access_token": f"token-{token_requests}", "expires_in": 3600, "token_type": "Bearer"})
+
+
+async def fake_messages(request: Request):
+    global graph_requests
+    graph_requests += 1
+    if throttle_every and graph_requests % throttle_every == 0:
+        return JSONResponse({"error": {"code": "TooManyRequests"}}, status_code=429, headers={"Retry-After": "1"})
+    if not request.headers.get("authorization", "").startswith("Bearer token-"):
+        return JSONResponse({"error": {"code": "InvalidAuthenticationToken"}}, status_code=401)
+    return JSONResponse({"value": [{"id": "1", "subject": "hello", "isRead": False}]})
+
+
+fake_server = Starlette(routes=[
+    Route("/token", fake_token, methods=["POST"]),
+    Route("/v1.0/me/mailFolders/Inbox/messages", fake_messages),
+])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_acquirer(token_url: str):
+    """Client-credentials grant against the fake endpoint (stands in for MSAL)."""
+    def acquire() -> dict:
+        return httpx.post(token_url, data={"grant_type": "client_credentials"}).json()
+    return acquire
+
+
+async def run_load(call, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def main():
+    global token_latency, throttle_every
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--token-latency-ms", type=float, default=80.0, help="Simulated authority latency")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth Graph call with 429")
+    args = parser.parse_args()
+    token_latency = args.token_latency_ms / 1000
+    throttle_every = args.throttle_every
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(fake_server, host="127.0.0.1", port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    base_url = f"http://127.0.0.1:{port}/v1.0"
+    acquire = http_acquirer(f"http://127.0.0.1:{port}/token")
+
+    async def per_call():
+        # Previous behaviour: acquire a token and open a new client on every call
+        provider = TokenProvider(acquire)
+        client = GraphClient(provider, base_url=base_url, throttle=GraphThrottle(rate=0, max_concurrency=args.concurrency))
+        try:
+            await client.request("GET", "/me/mailFolders/Inbox/messages")
+        finally:
+            await client.aclose()
+
+    throttle = GraphThrottle(rate=0, max_concurrency=args.concurrency)
+    shared = GraphClient(TokenProvider(acquire), base_url=base_url, throttle=throttle)
+
+    async def pooled():
+        await shared.request("GET", "/me/mailFolders/Inbox/messages")
+
+    global token_requests
+    print(f"{'mode':>10} {'req/s':>8} {'token requests':>15}")
+    for name, call in (("per-call", per_call), ("pooled", pooled)):
+        token_requests = 0
+        elapsed = await run_load(call, args.requests, args.concurrency)
+        print(f"{name:>10} {args.requests / elapsed:>8.1f} {token_requests:>15}")
+    if throttle_every:
+        print(f"pooled throttle stats: {throttle.stats()}")
+
+    await shared.aclose()
+    server.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,305 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Optional
+
+import httpx
+
+from throttle import GraphThrottle
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Graph JSON batching accepts at most 20 requests per $batch call
+MAX_BATCH_SIZE = 20
+
+
+class GraphError(RuntimeError):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Graph error {status_code}: {text}")
+        self.status_code = status_code
+
+
+def msal_acquirer(client_id: str, client_secret: str, authority: str, scopes: list[str]) -> Callable[[], dict]:
+    """
+    Return a function that acquires an app token from one shared MSAL client.
+
+    The application object is created on first use and then reused: building
+    it per call repeats the authority metadata discovery and throws away
+    MSAL's own token cache.
+    """
+    app = None
+
+    def acquire() -> dict:
+        nonlocal app
+        if app is None:
+            import msal
+
+            app = msal.ConfidentialClientApplication(
+                client_id=client_id,
+                client_credential=client_secret,
+                authority=authority,
+            )
+        return app.acquire_token_for_client(scopes=scopes)
+
+    return acquire
+
+
+@dataclass
+class DeltaResult:
+    items: list[dict] = field(default_factory=list)
+    # Link to resume from: the @odata.deltaLink once the round is complete,
+    # otherwise the @odata.nextLink where `max_items` stopped it
+    link: Optional[str] = None
+    complete: bool = False
+
+
+class TokenProvider:
+    """
+    Process-wide access token cache with single-flight refresh.
+
+    The token is kept until `refresh_margin` seconds before it expires.
+    Concurrent callers that find it stale wait on one refresh instead of
+    each hitting the authority.
+
+    Args:
+        acquire: Blocking function returning an MSAL-style result
+            (`access_token`, `expires_in`, or `error` / `error_description`).
+            Runs in a worker thread.
+        refresh_margin: Seconds before expiry at which the token is renewed.
+    """
+
+    def __init__(self, acquire: Callable[[], dict], refresh_margin: float = 300.0):
+        self.acquire = acquire
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self.acquisitions = 0
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    async def get_token(self) -> str:
+        if self._valid():
+            return self._token
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if self._valid():
+                return self._token
+            result = await asyncio.to_thread(self.acquire)
+            if "access_token" not in result:
+                raise RuntimeError(f"Token error: {result.get('error')} {result.get('error_description')}")
+            self.acquisitions += 1
+            self._token = result["access_token"]
+            self._expires_at = time.monotonic() + float(result.get("expires_in", 3600))
+            return self._token
+
+    def invalidate(self, token: Optional[str] = None):
+        """Drop the cached token (only if it is still `token`, when given), e.g. after a 401."""
+        if token is None or token == self._token:
+            self._token = None
+            self._expires_at = 0.0
+
+
+class GraphClient:
+    """
+    Microsoft Graph client sharing one pooled `httpx.AsyncClient` across tool calls.
+
+    A 401 drops the cached token and the request is retried once with a fresh one.
+    Requests go through `throttle` (token bucket + AIMD concurrency); 429 / 503 /
+    504 and connection failures are retried with backoff that honours `Retry-After`.
+
+    Args:
+        tokens: Token provider for the `Authorization` header.
+        base_url: Graph endpoint; relative paths are resolved against it.
+        timeout: Request timeout in seconds.
+        max_connections: Connection pool size.
+        throttle: Rate limit and retry policy, usually shared per tenant (see `throttle_for`).
+        transport: httpx transport (default: network), e.g. `httpx.MockTransport` in tests.
+    """
+
+    def __init__(
+        self,
+        tokens: TokenProvider,
+        base_url: str = GRAPH_BASE_URL,
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        throttle: Optional[GraphThrottle] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.tokens = tokens
+        self.throttle = throttle or GraphThrottle()
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the event loop the MCP server runs on
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url + "/",
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def _send(self, method: str, url: str, json=None, params=None) -> httpx.Response:
+        throttle = self.throttle
+        refreshed = False
+        attempt = 0
+        while True:
+            token = await self.tokens.get_token()
+            await throttle.acquire()
+            r = None
+            try:
+                r = await self.client.request(
+                    method, url.lstrip("/"), headers={"Authorization": f"Bearer {token}"}, json=json, params=params
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # The request never reached Graph, so even a POST is safe to retry
+                if attempt >= throttle.max_retries:
+                    throttle.gave_up += 1
+                    raise
+            finally:
+                throttled = r is not None and r.status_code in (429, 503)
+                await throttle.release(throttled)
+
+            if r is not None and r.status_code == 401 and not refreshed:
+                refreshed = True
+                self.tokens.invalidate(token)
+                continue
+            if r is not None and r.status_code not in GraphThrottle.RETRY_STATUSES:
+                return r
+            if attempt >= throttle.max_retries:
+                throttle.gave_up += 1
+                return r
+
+            delay = throttle.retry_delay(attempt, r.headers.get("Retry-After") if r is not None else None)
+            if throttled:
+                # Hold back every session of this tenant, not just this call
+                throttle.bucket.pause(delay)
+            throttle.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def request(self, method: str, url: str, json=None, params=None) -> dict:
+        r = await self._send(method, url, json=json, params=params)
+        # sendMail 可能回 202 且無 body，屬正常狀態
+        if r.status_code >= 400:
+            raise GraphError(r.status_code, r.text)
+        if r.text:
+            return r.json()
+        return {"status_code": r.status_code}
+
+    async def paginate(
+        self, url: str, params: Optional[dict] = None, max_items: Optional[int] = None
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Yield the `value` of each page as it arrives, following `@odata.nextLink`.
+
+        Stops once `max_items` items have been yielded, without fetching further pages.
+        """
+        remaining = max_items
+        while url:
+            page = await self.request("GET", url, params=params)
+            items = page.get("value", [])
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+            if items:
+                yield items
+            if remaining == 0:
+                return
+            # nextLink already carries the query parameters
+            url, params = page.get("@odata.nextLink"), None
+
+    async def batch(self, requests: list[dict]) -> list[dict]:
+        """
+        Run several Graph calls through JSON `$batch`, `MAX_BATCH_SIZE` per round trip.
+
+        Each request is `{"method", "url", "body"?, "headers"?}` with `url`
+        relative to the API version (e.g. `/me/messages/{id}`). Returns one
+        `{"status", "headers", "body"}` per request, in request order; failures
+        are reported per item rather than raised. Items throttled inside the
+        batch (429 / 503 / 504) are resent together in a new `$batch` once the
+        longest of their `Retry-After`s has passed.
+        """
+        throttle = self.throttle
+        responses: list[dict] = [{} for _ in requests]
+        # Chunks go one after another: Graph throttles concurrent requests per mailbox
+        for start in range(0, len(requests), MAX_BATCH_SIZE):
+            pending = {}
+            for index, request in enumerate(requests[start:start + MAX_BATCH_SIZE], start=start):
+                item = {"id": str(index), "method": request.get("method", "GET"), "url": request["url"]}
+                if request.get("body") is not None:
+                    item["body"] = request["body"]
+                    item["headers"] = {"Content-Type": "application/json", **request.get("headers", {})}
+                elif request.get("headers"):
+                    item["headers"] = request["headers"]
+                pending[item["id"]] = item
+
+            for attempt in range(throttle.max_retries + 1):
+                result = await self.request("POST", "/$batch", json={"requests": list(pending.values())})
+                by_id = {r["id"]: r for r in result.get("responses", [])}
+                retry_after = []
+                for id in list(pending):
+                    r = by_id.get(id, {"status": 500, "body": {"error": {"message": "Missing batch response"}}})
+                    headers = {k.lower(): v for k, v in r.get("headers", {}).items()}
+                    responses[int(id)] = {"status": r.get("status"), "headers": r.get("headers", {}), "body": r.get("body")}
+                    if r.get("status") in GraphThrottle.RETRY_STATUSES:
+                        retry_after.append(headers.get("retry-after"))
+                    else:
+                        del pending[id]
+                if not pending:
+                    break
+                if attempt == throttle.max_retries:
+                    throttle.gave_up += len(pending)
+                    break
+
+                delay = max(throttle.retry_delay(attempt, value) for value in retry_after)
+                throttle.throttles += 1
+                throttle.bucket.pause(delay)
+                throttle.retries += 1
+                await asyncio.sleep(delay)
+        return responses
+
+    async def delta(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        link: Optional[str] = None,
+        max_items: Optional[int] = None,
+    ) -> DeltaResult:
+        """
+        Run a delta query, or resume one from a stored `link`.
+
+        Without `link` this is a full sync of `url` (e.g.
+        `/me/mailFolders/Inbox/messages/delta`); with the link returned by the
+        previous call only changes since then are fetched. Removed items carry
+        an `@removed` annotation. With `max_items` the query stops after the
+        page that reaches it, and `link` resumes from the next page.
+        """
+        result = DeltaResult()
+        if link:
+            url, params = link, None
+        while url:
+            page = await self.request("GET", url, params=params)
+            result.items.extend(page.get("value", []))
+            if "@odata.deltaLink" in page:
+                result.link = page["@odata.deltaLink"]
+                result.complete = True
+                return result
+            url, params = page.get("@odata.nextLink"), None
+            result.link = url
+            if max_items is not None and len(result.items) >= max_items:
+                return result
+        return result
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
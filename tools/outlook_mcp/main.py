@@ -1,40 +1,80 @@
 import os
-import httpx
-import msal
-from fastmcp import FastMCP
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import urlsplit
 
-mcp = FastMCP("OutlookMCP")
+from fastmcp import Context, FastMCP
+
+from graph import GRAPH_BASE_URL, GraphClient, TokenProvider, msal_acquirer
+from throttle import all_stats, throttle_for
 
 TENANT_ID = os.getenv("TENANT_ID")
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")  # 若你用 client-credentials
-AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
+AUTHORITY = os.getenv("AUTHORITY", f"https://login.microsoftonline.com/{TENANT_ID}")
 
 # 方案 1：Client Credentials（適合 service / daemon；但 mail 操作通常要搭配應用權限與管理員同意）
 SCOPES = ["https://graph.microsoft.com/.default"]
 
-def get_access_token() -> str:
-    app = msal.ConfidentialClientApplication(
-        client_id=CLIENT_ID,
-        client_credential=CLIENT_SECRET,
-        authority=AUTHORITY,
-    )
-    result = app.acquire_token_for_client(scopes=SCOPES)
-    if "access_token" not in result:
-        raise RuntimeError(f"Token error: {result.get('error')} {result.get('error_description')}")
-    return result["access_token"]
+# Token 快取到過期前 TOKEN_REFRESH_MARGIN 秒；GRAPH_BASE_URL 可指向本機 fake server 測試
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+GRAPH_MAX_CONNECTIONS = int(os.getenv("GRAPH_MAX_CONNECTIONS", "20"))
+# Graph 節流：每個 tenant 共用一組 token bucket (每秒請求數 / burst) 與 AIMD 並行上限，429/503 依 Retry-After 重試
+GRAPH_RATE = float(os.getenv("GRAPH_RATE", "15"))
+GRAPH_BURST = int(os.getenv("GRAPH_BURST", "30"))
+GRAPH_CONCURRENCY = int(os.getenv("GRAPH_CONCURRENCY", "4"))
+GRAPH_MAX_CONCURRENCY = int(os.getenv("GRAPH_MAX_CONCURRENCY", "16"))
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "5"))
+
+tokens = TokenProvider(
+    msal_acquirer(CLIENT_ID, CLIENT_SECRET, AUTHORITY, SCOPES),
+    refresh_margin=TOKEN_REFRESH_MARGIN,
+)
+graph = GraphClient(
+    tokens,
+    base_url=os.getenv("GRAPH_BASE_URL", GRAPH_BASE_URL),
+    max_connections=GRAPH_MAX_CONNECTIONS,
+    throttle=throttle_for(
+        TENANT_ID or "default",
+        rate=GRAPH_RATE,
+        burst=GRAPH_BURST,
+        initial_concurrency=GRAPH_CONCURRENCY,
+        max_concurrency=GRAPH_MAX_CONCURRENCY,
+        max_retries=GRAPH_MAX_RETRIES,
+    ),
+)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    try:
+        yield
+    finally:
+        await graph.aclose()
+
+
+mcp = FastMCP("OutlookMCP", lifespan=lifespan)
+
 
 async def graph_request(method: str, url: str, json=None, params=None):
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.request(method, url, headers=headers, json=json, params=params)
-        # sendMail 可能回 202 且無 body，屬正常狀態 :contentReference[oaicite:6]{index=6}
-        if r.status_code >= 400:
-            raise RuntimeError(f"Graph error {r.status_code}: {r.text}")
-        if r.text:
-            return r.json()
-        return {"status_code": r.status_code}
+    return await graph.request(method, url, json=json, params=params)
+
+
+async def collect_pages(url: str, params: dict, max_items: int, ctx: Optional[Context] = None) -> dict:
+    """Follow @odata.nextLink up to `max_items`, reporting progress after each page."""
+    items = []
+    async for page in graph.paginate(url, params=params, max_items=max_items):
+        items.extend(page)
+        if ctx is not None:
+            await ctx.report_progress(progress=len(items), total=max_items)
+    return {"value": items, "count": len(items)}
+
+
+def check_delta_link(link: str):
+    """A delta link comes back from the caller: only follow messages delta queries on Graph (they get the bearer token)."""
+    path = urlsplit(link).path
+    if not link.startswith(graph.base_url + "/") or not path.endswith("/messages/delta"):
+        raise ValueError("delta_link must be a delta_link returned by outlook_sync_unread")
 
 @mcp.tool()
 async def outlook_send_mail(to: str, subject: str, body: str, content_type: str = "Text", save_to_sent: bool = True):
@@ -42,7 +82,7 @@ async def outlook_send_mail(to: str, subject: str, body: str, content_type: str
     Send an email via Microsoft Graph.
     content_type: "Text" or "HTML"
     """
-    url = "https://graph.microsoft.com/v1.0/me/sendMail"
+    url = "/me/sendMail"
     payload = {
         "message": {
             "subject": subject,
@@ -54,29 +94,82 @@ async def outlook_send_mail(to: str, subject: str, body: str, content_type: str
     return await graph_request("POST", url, json=payload)
 
 @mcp.tool()
-async def outlook_list_unread(top: int = 10):
+async def outlook_list_unread(top: int = 10, max_items: Optional[int] = None, ctx: Context = None):
     """
     List unread emails (basic fields).
+    top: page size; max_items: total across pages (default: top, i.e. the first page)
     """
-    url = "https://graph.microsoft.com/v1.0/me/mailFolders/Inbox/messages"
+    url = "/me/mailFolders/Inbox/messages"
     params = {
         "$filter": "isRead eq false",
         "$top": str(top),
         "$select": "id,subject,from,receivedDateTime,isRead",
         "$orderby": "receivedDateTime desc",
     }
-    return await graph_request("GET", url, params=params)
+    return await collect_pages(url, params, max_items or top, ctx)
 
 @mcp.tool()
-async def outlook_list_events(days: int = 7, top: int = 20):
+async def outlook_list_events(days: int = 7, top: int = 20, max_items: Optional[int] = None, ctx: Context = None):
     """
     List upcoming calendar events.
+    top: page size; max_items: total across pages (default: top, i.e. the first page)
     """
     # 簡化：用 calendarView 需要 start/end；你可自行補上以符合你的需求
     # 這裡先示範讀取 events（不同租戶/情境可能需要調整）
-    url = "https://graph.microsoft.com/v1.0/me/events"
+    url = "/me/events"
     params = {"$top": str(top), "$select": "subject,start,end,location", "$orderby": "start/dateTime"}
-    return await graph_request("GET", url, params=params)
+    return await collect_pages(url, params, max_items or top, ctx)
+
+@mcp.tool()
+async def outlook_sync_unread(folder: str = "Inbox", delta_link: Optional[str] = None, max_items: Optional[int] = None):
+    """
+    Incrementally sync unread emails with a delta query.
+    Without delta_link, returns all unread emails. Pass the delta_link of the
+    previous result (for the same folder) to get only the changes since then:
+    new unread emails, and ids of emails that were read, moved or deleted.
+    """
+    url = f"/me/mailFolders/{folder}/messages/delta"
+    params = {"$select": "id,subject,from,receivedDateTime,isRead"}
+    if delta_link:
+        check_delta_link(delta_link)
+
+    result = await graph.delta(url, params=params, link=delta_link, max_items=max_items)
+
+    unread, no_longer_unread = [], []
+    for message in result.items:
+        if "@removed" in message or message.get("isRead"):
+            no_longer_unread.append(message["id"])
+        else:
+            unread.append(message)
+    return {
+        "unread": unread,
+        "no_longer_unread": no_longer_unread,
+        "full_sync": delta_link is None,
+        "complete": result.complete,
+        # Resume point for the next call (the next page when max_items stopped this one)
+        "delta_link": result.link or delta_link,
+    }
+
+@mcp.tool()
+async def outlook_get_messages(ids: list[str], select: str = "id,subject,from,receivedDateTime,isRead,bodyPreview"):
+    """
+    Fetch several emails by id in one Graph $batch request (20 per round trip).
+    """
+    responses = await graph.batch([{"method": "GET", "url": f"/me/messages/{id}?$select={select}"} for id in ids])
+    return [r["body"] if r["status"] == 200 else {"id": id, "error": r["body"]} for id, r in zip(ids, responses)]
+
+@mcp.tool()
+async def outlook_mark_read(ids: list[str], is_read: bool = True):
+    """
+    Mark several emails as read (or unread) in one Graph $batch request.
+    """
+    responses = await graph.batch([{"method": "PATCH", "url": f"/me/messages/{id}", "body": {"isRead": is_read}} for id in ids])
+    return [{"id": id, "status": r["status"]} for id, r in zip(ids, responses)]
+
+@mcp.resource("outlook://graph/stats")
+def graph_stats() -> dict:
+    """Per-tenant Graph throttling counters: throttles, retries, queueing delay, concurrency limit."""
+    return {"tenants": all_stats(), "token_acquisitions": tokens.acquisitions}
 
 if __name__ == "__main__":
     # stdio 模式（最常用於本機 host，如 Claude Desktop / 本機 orchestrator）
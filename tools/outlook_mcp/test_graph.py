@@ -0,0 +1,239 @@
+"""
+Tests for the Graph client's token cache, retries and `$batch` handling,
+against `httpx.MockTransport` (no network):
+
+    uv run pytest test_graph.py
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import graph
+from graph import GraphClient, GraphError, TokenProvider
+from throttle import GraphThrottle, parse_retry_after
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of sleeping."""
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(graph.asyncio, "sleep", sleep)
+    return delays
+
+
+def make_client(handler, max_retries: int = 3) -> GraphClient:
+    tokens = TokenProvider(lambda: {"access_token": "token", "expires_in": 3600})
+    # base_delay=0: a Retry-After delay gets no jitter
+    throttle = GraphThrottle(rate=0, max_retries=max_retries, base_delay=0)
+    return GraphClient(tokens, base_url="https://graph.test/v1.0", throttle=throttle,
+                       transport=httpx.MockTransport(handler))
+
+
+def run(client: GraphClient, call):
+    async def main():
+        try:
+            return await call(client)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+def test_retry_after_is_honoured(sleeps):
+    statuses = iter([429, 503, 200])
+
+    def handler(request):
+        status = next(statuses)
+        if status == 200:
+            return httpx.Response(200, json={"id": "me"})
+        return httpx.Response(status, headers={"Retry-After": "7" if status == 429 else "2"})
+
+    client = make_client(handler)
+    assert run(client, lambda c: c.request("GET", "/me")) == {"id": "me"}
+    assert sleeps == [7.0, 2.0]
+    stats = client.throttle.stats()
+    assert (stats["throttles"], stats["retries"], stats["gave_up"]) == (2, 2, 0)
+
+
+def test_retry_after_pauses_the_tenant(sleeps):
+    responses = iter([httpx.Response(429, headers={"Retry-After": "30"}), httpx.Response(200, json={})])
+    client = make_client(lambda request: next(responses))
+    run(client, lambda c: c.request("GET", "/me"))
+    # Every other session of the tenant waits out the Retry-After too
+    assert client.throttle.bucket._paused_until > graph.time.monotonic() + 25
+
+
+def test_gives_up_after_max_retries(sleeps):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503, text="unavailable")
+
+    client = make_client(handler, max_retries=2)
+    with pytest.raises(GraphError) as error:
+        run(client, lambda c: c.request("GET", "/me"))
+    assert error.value.status_code == 503
+    assert len(calls) == 3 and len(sleeps) == 2
+    assert client.throttle.gave_up == 1
+
+
+def test_connection_errors_give_up(sleeps):
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client = make_client(handler, max_retries=1)
+    with pytest.raises(httpx.ConnectError):
+        run(client, lambda c: c.request("POST", "/me/sendMail", json={}))
+    assert len(sleeps) == 1 and client.throttle.gave_up == 1
+
+
+def batch_handler(status_of):
+    """$batch endpoint answering each item with `status_of(id, round)`; records the ids of each round."""
+    rounds = []
+
+    def handler(request):
+        assert request.url.path == "/v1.0/$batch"
+        ids = [item["id"] for item in json.loads(request.content)["requests"]]
+        rounds.append(ids)
+        responses = []
+        for id in ids:
+            status, headers = status_of(id, len(rounds) - 1)
+            responses.append({"id": id, "status": status, "headers": headers, "body": {"id": f"m{id}"}})
+        # Graph does not keep the request order in batch responses
+        return httpx.Response(200, json={"responses": responses[::-1]})
+
+    return handler, rounds
+
+
+def test_batch_resends_throttled_items_in_a_new_batch(sleeps):
+    def status_of(id, round):
+        if round == 0 and id == "1":
+            return 429, {"Retry-After": "3"}
+        if round == 0 and id == "2":
+            return 503, {"Retry-After": "1"}
+        return 200, {}
+
+    handler, rounds = batch_handler(status_of)
+    client = make_client(handler)
+    requests = [{"url": f"/me/messages/m{i}"} for i in range(4)]
+    responses = run(client, lambda c: c.batch(requests))
+
+    assert rounds == [["0", "1", "2", "3"], ["1", "2"]]
+    # One wait, for the longest Retry-After of the round
+    assert sleeps == [3.0]
+    assert [r["status"] for r in responses] == [200] * 4
+    assert [r["body"]["id"] for r in responses] == ["m0", "m1", "m2", "m3"]
+
+
+def test_batch_reports_items_still_throttled(sleeps):
+    handler, rounds = batch_handler(lambda id, round: (429, {"Retry-After": "1"}) if id == "0" else (200, {}))
+    client = make_client(handler, max_retries=2)
+    responses = run(client, lambda c: c.batch([{"url": "/me/messages/a"}, {"url": "/me/messages/b"}]))
+
+    assert rounds == [["0", "1"], ["0"], ["0"]]
+    assert [r["status"] for r in responses] == [429, 200]
+    assert client.throttle.gave_up == 1
+
+
+def test_batch_is_split_into_chunks_of_20(sleeps):
+    handler, rounds = batch_handler(lambda id, round: (200, {}))
+    client = make_client(handler)
+    responses = run(client, lambda c: c.batch([{"url": f"/me/messages/{i}"} for i in range(45)]))
+    assert [len(ids) for ids in rounds] == [20, 20, 5]
+    assert len(responses) == 45 and not sleeps
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_token_is_cached_until_the_refresh_margin():
+    results = iter([{"access_token": "t1", "expires_in": 3600}, {"access_token": "t2", "expires_in": 3600}])
+    tokens = TokenProvider(lambda: next(results), refresh_margin=300)
+
+    async def main():
+        first = [await tokens.get_token() for _ in range(3)]
+        # Within refresh_margin of expiry the token is renewed
+        tokens._expires_at = graph.time.monotonic() + 299
+        return first, await tokens.get_token()
+
+    first, renewed = asyncio.run(main())
+    assert first == ["t1"] * 3 and renewed == "t2"
+    assert tokens.acquisitions == 2
+
+
+def test_concurrent_callers_share_one_refresh():
+    calls = []
+
+    def acquire():
+        calls.append(1)
+        graph.time.sleep(0.05)
+        return {"access_token": f"t{len(calls)}", "expires_in": 3600}
+
+    tokens = TokenProvider(acquire)
+
+    async def main():
+        return await asyncio.gather(*(tokens.get_token() for _ in range(10)))
+
+    assert asyncio.run(main()) == ["t1"] * 10
+    assert len(calls) == 1
+
+
+def test_token_errors_are_raised():
+    tokens = TokenProvider(lambda: {"error": "invalid_client", "error_description": "bad secret"})
+    with pytest.raises(RuntimeError, match="invalid_client bad secret"):
+        asyncio.run(tokens.get_token())
+
+
+def test_a_401_refreshes_the_token_once():
+    results = iter([{"access_token": "old", "expires_in": 3600}, {"access_token": "new", "expires_in": 3600}])
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers["Authorization"])
+        return httpx.Response(200 if request.headers["Authorization"] == "Bearer new" else 401, json={})
+
+    client = GraphClient(TokenProvider(lambda: next(results)), base_url="https://graph.test/v1.0",
+                         throttle=GraphThrottle(rate=0), transport=httpx.MockTransport(handler))
+    run(client, lambda c: c.request("GET", "/me"))
+    assert seen == ["Bearer old", "Bearer new"]
+    assert client.tokens.acquisitions == 2
+
+
+def test_invalidate_only_drops_the_given_token():
+    tokens = TokenProvider(lambda: {"access_token": "current", "expires_in": 3600})
+    asyncio.run(tokens.get_token())
+    # A 401 for a token that was already replaced must not drop the new one
+    tokens.invalidate("stale")
+    assert tokens._valid()
+    tokens.invalidate("current")
+    assert not tokens._valid()
+
+
+def test_msal_client_is_created_once(monkeypatch):
+    import sys
+    import types
+
+    created = []
+
+    class ConfidentialClientApplication:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+        def acquire_token_for_client(self, scopes):
+            return {"access_token": "t", "scopes": scopes}
+
+    monkeypatch.setitem(sys.modules, "msal", types.SimpleNamespace(ConfidentialClientApplication=ConfidentialClientApplication))
+    acquire = graph.msal_acquirer("id", "secret", "https://login.test/tenant", ["scope"])
+    assert acquire() == acquire() == {"access_token": "t", "scopes": ["scope"]}
+    assert len(created) == 1
@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Client-side request rate limit: `rate` requests/s with bursts up to `burst`.
+
+    `pause(seconds)` blocks every caller, e.g. when Graph answers with a
+    `Retry-After`, so other sessions of the same tenant back off too instead
+    of each discovering the throttle on its own.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on concurrent requests.
+
+    Each success raises the limit by `1 / limit` (about +1 per window of
+    `limit` calls); a throttle halves it, at most once per `cooldown`
+    seconds so a burst of 429s from one window only counts once.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32, cooldown: float = 1.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.cooldown = cooldown
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, throttled: bool = False):
+        async with self._changed:
+            self.inflight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._changed.notify_all()
+
+
+class GraphThrottle:
+    """
+    Rate limit, adaptive concurrency and retry policy for one tenant.
+
+    Args:
+        rate: Requests per second (0 disables the token bucket).
+        burst: Token bucket size.
+        initial_concurrency / max_concurrency: AIMD starting point and ceiling.
+        max_retries: Retries for 429 / 503 / 504 and connection errors.
+        base_delay / max_delay: Backoff bounds when there is no `Retry-After`.
+    """
+
+    RETRY_STATUSES = (429, 503, 504)
+
+    def __init__(
+        self,
+        rate: float = 15.0,
+        burst: int = 30,
+        initial_concurrency: int = 4,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(initial=initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.requests = 0
+        self.throttles = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    async def acquire(self):
+        """Wait for a rate token and a concurrency slot; the wait counts as queueing delay."""
+        start = time.monotonic()
+        await self.bucket.acquire()
+        await self.concurrency.acquire()
+        waited = time.monotonic() - start
+        self.requests += 1
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+
+    async def release(self, throttled: bool = False):
+        if throttled:
+            self.throttles += 1
+        await self.concurrency.release(throttled)
+
+    def retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before retry `attempt` (0-based): `Retry-After` if given, else full-jitter backoff."""
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        else:
+            # Small jitter so sessions told the same Retry-After don't all retry at once
+            delay = min(self.max_delay, delay) + random.uniform(0, self.base_delay)
+        return delay
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttles": self.throttles,
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+            "queue_wait_avg_ms": round(self.queue_wait_total / self.requests * 1000, 3) if self.requests else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 3),
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "inflight": self.concurrency.inflight,
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a `Retry-After` header (delay in seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# One throttle per tenant, shared by every GraphClient in the process
+_tenant_throttles: dict[str, GraphThrottle] = {}
+
+
+def throttle_for(tenant: str, **kwargs) -> GraphThrottle:
+    """Get (or create with `kwargs`) the throttle for a tenant."""
+    if tenant not in _tenant_throttles:
+        _tenant_throttles[tenant] = GraphThrottle(**kwargs)
+    return _tenant_throttles[tenant]
+
+
+def all_stats() -> dict:
+    return {tenant: throttle.stats() for tenant, throttle in _tenant_throttles.items()}